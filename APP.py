@@ -3,13 +3,17 @@ import sys
 import argparse
 from datetime import datetime
 import time
-import json
 import logging
 
 # 从各个模块导入功能
 from step_1_homepage_monitor import HomepageMonitor
 from step_2_link_validator import LinkValidator
 from step_3_content_extraction import ContentExtractor
+from pipeline import StreamingPipeline
+from cassette import Cassette, CassetteFirecrawlApp, CassetteGeneration
+from rate_limiter import AdaptiveRateLimiter
+from metrics import REGISTRY, start_http_server, write_summary
+from tracing import TRACER, traced
 import config
 
 def setup_logging():
@@ -61,37 +65,66 @@ class AgriNewsApp:
         
         # 当前批次ID
         self.current_batch_id = None
+        self.cassette = None
         self.logger.info("应用初始化完成")
     
-    def run_homepage_monitor(self):
-        """运行步骤1：监控主页并提取链接"""
+    def use_cassette(self, path, mode, latency=None):
+        """让所有Firecrawl和通义千问调用经过录制/回放
+        
+        参数:
+            path: 录制文件路径
+            mode: 'record'（真实调用并录制）或'replay'（只从录制中返回，不发出网络请求）
+            latency: 回放时注入的延迟，见Cassette
+        """
+        self.cassette = Cassette(path, mode=mode, latency=latency)
+        for component in (self.homepage_monitor, self.content_extractor):
+            component.app = CassetteFirecrawlApp(component.app, self.cassette)
+        self.link_validator.llm = CassetteGeneration(self.link_validator.llm, self.cassette)
+        
+        # 批量抓取任务直接调用HTTP接口，不经过录制，改为逐个抓取
+        self.content_extractor.mode = 'scrape'
+        # 主页变化预检、订阅源发现和本地提取直接请求网站，不经过录制；录制/回放时只使用Firecrawl
+        self.homepage_monitor.change_detector = None
+        self.homepage_monitor.discovery = None
+        self.homepage_monitor.html_discovery = None
+        self.content_extractor.local_extraction = None
+        
+        if mode == 'replay':
+            # 回放不发出网络请求，不需要限流
+            unlimited = AdaptiveRateLimiter('Replay', None, 64, max_retries=0)
+            for component in (self.homepage_monitor, self.link_validator, self.content_extractor):
+                component.rate_limiter = unlimited
+            self.content_extractor.workers = max(self.content_extractor.workers, 8)
+            self.link_validator.workers = max(self.link_validator.workers, 8)
+        self.logger.info(f"录制/回放模式: {mode}，录制文件: {path}")
+    
+    def close_cassette(self):
+        """关闭录制文件并输出统计"""
+        if not self.cassette:
+            return
+        if self.cassette.mode == 'replay':
+            self.logger.info(f"回放命中 {self.cassette.hits} 次，未命中 {self.cassette.misses} 次")
+        else:
+            self.logger.info(f"本次录制 {self.cassette.recorded} 条记录")
+        self.cassette.close()
+    
+    @traced('AgriNewsApp.run_homepage_monitor')
+    def run_homepage_monitor(self, max_workers=None):
+        """运行步骤1：监控主页并提取链接
+
+        参数:
+            max_workers: 并发工作线程数，大于1时按域名并发检查主页
+        """
         self.logger.info("="*30)
         self.logger.info("步骤1: 开始监控主页并提取链接...")
         self.logger.info("="*30)
         
         try:
-            # 运行链接监控
-            self.homepage_monitor.check_for_new_links()
+            # 运行链接监控，使用本次运行写入的批次ID（日志中最新的批次可能来自其他进程或以前的运行）
+            self.current_batch_id = self.homepage_monitor.check_for_new_links(max_workers)
             
-            # 从结果中提取批次ID
-            with open(config.NEW_LINKS_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            # 获取最新的时间戳
-            if data:
-                latest_timestamp = max(data.keys())
-                latest_data = data[latest_timestamp]
-                
-                # 提取批次ID
-                for homepage_url, homepage_data in latest_data.items():
-                    if 'batch_id' in homepage_data:
-                        self.current_batch_id = homepage_data['batch_id']
-                        break
-                
-                if self.current_batch_id:
-                    self.logger.info(f"步骤1完成！提取到批次ID: {self.current_batch_id}")
-                else:
-                    self.logger.warning("步骤1完成，但未找到批次ID")
+            if self.current_batch_id:
+                self.logger.info(f"步骤1完成！提取到批次ID: {self.current_batch_id}")
             else:
                 self.logger.warning("步骤1完成，但没有发现新链接")
                 
@@ -100,6 +133,7 @@ class AgriNewsApp:
         
         return self.current_batch_id
     
+    @traced('AgriNewsApp.run_link_validator')
     def run_link_validator(self, batch_id=None):
         """运行步骤2：验证链接有效性"""
         self.logger.info("="*30)
@@ -126,6 +160,7 @@ class AgriNewsApp:
             self.logger.error(f"步骤2执行出错: {str(e)}", exc_info=True)
             return False
     
+    @traced('AgriNewsApp.run_content_extraction')
     def run_content_extraction(self, batch_id=None):
         """运行步骤3：提取内容"""
         self.logger.info("="*30)
@@ -150,7 +185,7 @@ class AgriNewsApp:
                 return False
             
             # 提取内容
-            results, results_dir = self.content_extractor.extract_content_from_urls(valid_links)
+            results, results_dir = self.content_extractor.extract_content_from_urls(valid_links, batch_id)
             
             self.logger.info(f"步骤3完成！结果保存在 {results_dir} 目录")
             return results_dir
@@ -159,7 +194,51 @@ class AgriNewsApp:
             self.logger.error(f"步骤3执行出错: {str(e)}", exc_info=True)
             return False
     
-    def run_full_pipeline(self, batch_id=None):
+    @traced('AgriNewsApp.resume_content_extraction')
+    def resume_content_extraction(self, batch_id=None, timestamp=None):
+        """恢复中断的步骤3：跳过已成功提取的链接，只处理失败或尚未处理的链接
+
+        参数:
+            batch_id: 只恢复处理该批次的运行
+            timestamp: 只恢复处理该时间戳验证结果的运行
+        """
+        self.logger.info("="*30)
+        self.logger.info("步骤3: 恢复内容提取...")
+        self.logger.info("="*30)
+        
+        try:
+            # 查找最近一次（或指定批次/时间戳最近一次）的运行
+            results_dir, header = self.content_extractor.find_resumable_run(batch_id, timestamp)
+            if not results_dir:
+                self.logger.warning("没有找到可以恢复的步骤3运行")
+                return False
+            
+            batch_id = header.get('batch_id')
+            timestamp = header.get('timestamp')
+            if not batch_id and not timestamp:
+                self.logger.warning(f"{results_dir} 的检查点日志没有记录批次ID或时间戳，无法恢复")
+                return False
+            self.logger.info(f"恢复运行: {results_dir}，批次ID: {batch_id}")
+            
+            # 重新加载该运行对应的有效链接
+            valid_links = self.content_extractor.load_valid_links(batch_id, timestamp)
+            if not valid_links:
+                self.logger.warning("没有找到有效的链接，步骤3无法恢复")
+                return False
+            
+            results, results_dir = self.content_extractor.extract_content_from_urls(
+                valid_links, batch_id, timestamp, results_dir=results_dir
+            )
+            
+            self.logger.info(f"步骤3恢复完成！结果保存在 {results_dir} 目录")
+            return results_dir
+            
+        except Exception as e:
+            self.logger.error(f"步骤3恢复执行出错: {str(e)}", exc_info=True)
+            return False
+    
+    @traced('AgriNewsApp.run_full_pipeline')
+    def run_full_pipeline(self, batch_id=None, max_workers=None):
         """运行完整的处理流程"""
         self.logger.info("="*50)
         self.logger.info("启动农业新闻处理流程...")
@@ -172,7 +251,7 @@ class AgriNewsApp:
             # 步骤1：监控主页
             if not batch_id:
                 self.logger.info("执行步骤1: 主页监控...")
-                batch_id = self.run_homepage_monitor()
+                batch_id = self.run_homepage_monitor(max_workers)
                 
                 # 如果步骤1没有发现新链接，停止流程
                 if not batch_id:
@@ -214,6 +293,34 @@ class AgriNewsApp:
             self.logger.error(f"执行过程中出错: {str(e)}", exc_info=True)
             return None
 
+    @traced('AgriNewsApp.run_streaming_pipeline')
+    def run_streaming_pipeline(self, max_workers=None):
+        """以流式方式运行完整流程：新链接一经发现就进入验证，有效链接验证后立即提取"""
+        self.logger.info("="*50)
+        self.logger.info("启动流式农业新闻处理流程...")
+        self.logger.info("="*50)
+        
+        start_time = datetime.now()
+        try:
+            pipeline = StreamingPipeline(self.homepage_monitor, self.link_validator, self.content_extractor)
+            batch_id, results_dir = pipeline.run(max_workers)
+            if not batch_id:
+                self.logger.warning("没有发现新链接，流程结束")
+                return None
+            
+            self.current_batch_id = batch_id
+            self.logger.info("="*50)
+            self.logger.info("流式处理流程已完成！")
+            self.logger.info(f"批次ID: {batch_id}")
+            self.logger.info(f"总耗时: {datetime.now() - start_time}")
+            self.logger.info(f"最终结果保存位置: {results_dir}")
+            self.logger.info("="*50)
+            return results_dir
+            
+        except Exception as e:
+            self.logger.error(f"流式处理过程中出错: {str(e)}", exc_info=True)
+            return None
+
 def main():
     """主函数"""
     parser = argparse.ArgumentParser(description="农业新闻处理应用")
@@ -222,30 +329,66 @@ def main():
     parser.add_argument("--batch", type=str, help="指定批次ID")
     parser.add_argument("--timestamp", type=str, help="指定时间戳")
     parser.add_argument("--all", action="store_true", help="运行完整流程")
+    parser.add_argument("--workers", type=int, help="步骤1并发检查主页的工作线程数(大于1时按域名并发)")
+    parser.add_argument("--stream", action="store_true", help="以流式方式运行完整流程(三个步骤同时进行)")
+    parser.add_argument("--resume", action="store_true", help="与--step 3一起使用，恢复中断的内容提取")
+    parser.add_argument("--record", type=str, metavar="FILE", help="真实调用API并把请求和响应录制到指定文件")
+    parser.add_argument("--replay", type=str, metavar="FILE", help="从录制文件回放API响应，不发出网络请求")
+    parser.add_argument("--replay-latency", type=str, help="回放时注入的延迟：秒数，或recorded表示录制时的实际耗时")
+    parser.add_argument("--metrics-port", type=int, help="在指定端口提供Prometheus格式的/metrics接口")
+    parser.add_argument("--trace", nargs="?", const="", metavar="FILE",
+                        help="记录API调用、等待、文件写入和各步骤的耗时，保存为Chrome/Perfetto trace JSON（默认trace_<时间戳>.json）")
     
     args = parser.parse_args()
     
+    if args.trace is not None:
+        TRACER.enable()
     app = AgriNewsApp()
+    metrics_port = args.metrics_port or getattr(config, 'METRICS_PORT', None)
+    if metrics_port:
+        start_http_server(metrics_port)
+    metrics_baseline = REGISTRY.snapshot()
+    if args.record:
+        app.use_cassette(args.record, 'record')
+    elif args.replay:
+        latency = args.replay_latency
+        if latency and latency != 'recorded':
+            latency = float(latency)
+        app.use_cassette(args.replay, 'replay', latency)
     
     # 根据命令行参数执行相应的步骤
-    if args.all:
-        app.run_full_pipeline(args.batch)
+    if args.stream:
+        app.run_streaming_pipeline(args.workers)
+    elif args.all:
+        app.run_full_pipeline(args.batch, args.workers)
     elif args.step == 1:
-        app.run_homepage_monitor()
+        app.run_homepage_monitor(args.workers)
     elif args.step == 2:
         app.run_link_validator(args.batch)
     elif args.step == 3:
-        if args.timestamp:
+        if args.resume:
+            app.resume_content_extraction(args.batch, args.timestamp)
+        elif args.timestamp:
             valid_links = app.content_extractor.load_valid_links(batch_id=args.batch, timestamp=args.timestamp)
             if valid_links:
-                app.content_extractor.extract_content_from_urls(valid_links)
+                app.content_extractor.extract_content_from_urls(valid_links, args.batch, args.timestamp)
             else:
                 print("没有找到有效的链接，无法提取内容。")
         else:
             app.run_content_extraction(args.batch)
     else:
         # 默认运行完整流程
-        app.run_full_pipeline(args.batch)
+        app.run_full_pipeline(args.batch, args.workers)
+    
+    app.close_cassette()
+    
+    # 保存本次运行的指标摘要（API延迟分位数、重试和限流次数、链接漏斗、写入字节数）
+    summary_name = app.current_batch_id or args.batch or datetime.now().strftime("run_%Y%m%d_%H%M%S")
+    app.logger.info(f"指标摘要已保存到: {write_summary(summary_name, metrics_baseline)}")
+    
+    if args.trace is not None:
+        trace_file = args.trace or datetime.now().strftime("trace_%Y%m%d_%H%M%S.json")
+        TRACER.save(trace_file)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,262 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+import config
+from metrics import BYTES_WRITTEN
+from tracing import traced
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+SEGMENT_PATTERN = re.compile(r'^segment_(\d{6})\.jsonl$')
+
+def _parse_line(line):
+    """解析日志中的一行，写入中途退出留下的残缺行返回None"""
+    try:
+        return json.loads(line.decode('utf-8'))
+    except ValueError:
+        print(f"跳过无法解析的批次日志行（{len(line)} 字节）")
+        return None
+
+def log_dir_for(json_file):
+    """旧的JSON文件对应的日志目录，例如 new_links.json -> new_links_log"""
+    return os.path.splitext(json_file)[0] + '_log'
+
+class BatchLog:
+    def __init__(self, log_dir, legacy_file=None, max_segment_bytes=None):
+        """初始化追加写入的分段批次日志
+
+        每个批次是一行JSON，写入时只追加当前批次，文件达到上限后切换到新的分段。
+        追加和分段切换都在文件锁内完成，同一台机器上多个进程同时写入也是安全的。
+        目录中的catalog.db记录每个批次的batch_id、时间戳和所在位置（分段、偏移、长度），
+        与写入同步维护，按批次ID或时间戳读取单个批次时无需扫描整个日志。
+
+        参数:
+            log_dir: 日志目录
+            legacy_file: 旧格式的JSON文件（以时间戳为键），日志为空时自动导入
+            max_segment_bytes: 单个分段文件的大小上限
+        """
+        if max_segment_bytes is None:
+            max_segment_bytes = getattr(config, 'BATCH_LOG_SEGMENT_BYTES', 16 * 1024 * 1024)
+        self.log_dir = log_dir
+        self.max_segment_bytes = max_segment_bytes
+        self._lock_path = os.path.join(log_dir, '.lock')
+        self._thread_lock = threading.Lock()
+        self._catalog_lock = threading.Lock()
+        os.makedirs(log_dir, exist_ok=True)
+
+        self._catalog = sqlite3.connect(os.path.join(log_dir, 'catalog.db'), check_same_thread=False)
+        with self._catalog_lock:
+            self._catalog.execute("""
+                CREATE TABLE IF NOT EXISTS batches (
+                    batch_id TEXT,
+                    timestamp TEXT,
+                    segment TEXT NOT NULL,
+                    offset INTEGER NOT NULL,
+                    length INTEGER NOT NULL
+                )
+            """)
+            self._catalog.execute("CREATE INDEX IF NOT EXISTS idx_batches_batch_id ON batches (batch_id)")
+            self._catalog.execute("CREATE INDEX IF NOT EXISTS idx_batches_timestamp ON batches (timestamp)")
+            self._catalog.execute("CREATE INDEX IF NOT EXISTS idx_batches_segment ON batches (segment, offset)")
+            # 每个分段已扫描登记到的位置，此前的完整行都已登记（或无法解析）
+            self._catalog.execute("""
+                CREATE TABLE IF NOT EXISTS segments (
+                    segment TEXT PRIMARY KEY,
+                    synced INTEGER NOT NULL
+                )
+            """)
+            self._catalog.commit()
+
+        with self._locked():
+            if legacy_file and os.path.exists(legacy_file) and not self._segments():
+                self._import_legacy(legacy_file)
+            self._sync_catalog()
+
+    @contextmanager
+    def _locked(self):
+        """线程锁 + 跨进程文件锁"""
+        with self._thread_lock:
+            with open(self._lock_path, 'a+b') as lock_file:
+                if fcntl:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                try:
+                    yield
+                finally:
+                    if fcntl:
+                        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                    else:
+                        lock_file.seek(0)
+                        msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _segments(self):
+        """按顺序返回所有分段文件名"""
+        names = [name for name in os.listdir(self.log_dir) if SEGMENT_PATTERN.match(name)]
+        return sorted(names)
+
+    def _segment_for_write(self, data_length):
+        """返回本次写入应使用的分段，必要时切换到新分段（需持有锁）"""
+        segments = self._segments()
+        if not segments:
+            return 'segment_000001.jsonl'
+        current = segments[-1]
+        size = os.path.getsize(os.path.join(self.log_dir, current))
+        if size > 0 and size + data_length > self.max_segment_bytes:
+            number = int(SEGMENT_PATTERN.match(current).group(1)) + 1
+            return f'segment_{number:06d}.jsonl'
+        return current
+
+    def _write(self, entry):
+        """写入一条记录（需持有锁），返回记录所在的位置"""
+        data = (json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8')
+        segment = self._segment_for_write(len(data))
+        # 其他进程写入后、登记前退出时留下的记录先补登记，登记位置才能连续推进
+        self._sync_segment(segment)
+        fd = os.open(os.path.join(self.log_dir, segment),
+                     os.O_RDWR | os.O_APPEND | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o644)
+        try:
+            offset = os.fstat(fd).st_size
+            # 上次写入中途退出留下了不完整的最后一行，新记录另起一行，读取时跳过这一行
+            if offset > 0:
+                os.lseek(fd, -1, os.SEEK_END)
+                if os.read(fd, 1) != b'\n':
+                    os.write(fd, b'\n')
+                    offset += 1
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+        self._index(entry, segment, offset, len(data))
+        self._mark_synced(segment, offset + len(data))
+        BYTES_WRITTEN.inc(len(data), target=os.path.basename(self.log_dir))
+        return {'segment': segment, 'offset': offset, 'length': len(data)}
+
+    def _index(self, entry, segment, offset, length):
+        """在目录中登记一条记录的位置"""
+        with self._catalog_lock:
+            self._catalog.execute(
+                "INSERT INTO batches (batch_id, timestamp, segment, offset, length) VALUES (?, ?, ?, ?, ?)",
+                (entry.get('batch_id'), entry.get('timestamp'), segment, offset, length)
+            )
+            self._catalog.commit()
+
+    def _mark_synced(self, segment, offset):
+        with self._catalog_lock:
+            self._catalog.execute(
+                "INSERT OR REPLACE INTO segments (segment, synced) VALUES (?, ?)", (segment, offset)
+            )
+            self._catalog.commit()
+
+    def _sync_segment(self, segment):
+        """补登记一个分段中尚未登记的记录（需持有锁）
+
+        从该分段已扫描到的位置开始，登记所有完整但不在目录中的行；没有扫描记录的分段
+        （旧版本的目录）从头扫描，已登记的位置跳过。
+        """
+        path = os.path.join(self.log_dir, segment)
+        if not os.path.exists(path):
+            return
+        with self._catalog_lock:
+            row = self._catalog.execute("SELECT synced FROM segments WHERE segment = ?", (segment,)).fetchone()
+            start = row[0] if row else 0
+            if os.path.getsize(path) <= start:
+                return
+            indexed = {offset for (offset,) in self._catalog.execute(
+                "SELECT offset FROM batches WHERE segment = ? AND offset >= ?", (segment, start)
+            )}
+
+        offset = start
+        with open(path, 'rb') as f:
+            f.seek(start)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                if offset not in indexed:
+                    entry = _parse_line(line)
+                    if entry is not None:
+                        self._index(entry, segment, offset, len(line))
+                offset += len(line)
+        self._mark_synced(segment, offset)
+
+    def _sync_catalog(self):
+        """补登记目录中缺失的记录（需持有锁）
+
+        正常情况下目录与写入同步；目录文件丢失，或写入后进程在登记前退出时（即使之后其他进程
+        又追加并登记了记录），按每个分段已扫描到的位置补齐。
+        """
+        for segment in self._segments():
+            self._sync_segment(segment)
+
+    def _import_legacy(self, legacy_file):
+        """导入旧格式的JSON文件（需持有锁）"""
+        try:
+            with open(legacy_file, 'r', encoding='utf-8') as f:
+                legacy_data = json.load(f)
+            for timestamp in sorted(legacy_data):
+                self._write(self._legacy_entry(timestamp, legacy_data[timestamp]))
+            print(f"已从 {legacy_file} 导入 {len(legacy_data)} 个批次到 {self.log_dir}")
+        except Exception as e:
+            print(f"导入旧批次文件时出错: {e}")
+
+    @staticmethod
+    def _legacy_entry(timestamp, value):
+        """把旧格式的一个时间戳条目转换为日志记录"""
+        if 'results' in value:
+            # new_links_valid.json的条目本身就是 {batch_id, timestamp, results}
+            return value
+        # new_links.json的条目是 {homepage_url: {..., batch_id}}
+        batch_id = next((data['batch_id'] for data in value.values() if 'batch_id' in data), None)
+        return {'timestamp': timestamp, 'batch_id': batch_id, 'data': value}
+
+    @traced('BatchLog.append', 'io')
+    def append(self, entry):
+        """追加一个批次记录，代价只与本批次的大小有关"""
+        with self._locked():
+            return self._write(entry)
+
+    def entries(self):
+        """按写入顺序遍历所有批次记录"""
+        for segment in self._segments():
+            with open(os.path.join(self.log_dir, segment), 'rb') as f:
+                for line in f:
+                    # 跳过正在写入、尚未完整的最后一行
+                    if not line.endswith(b'\n'):
+                        break
+                    entry = _parse_line(line)
+                    if entry is not None:
+                        yield entry
+
+    def _read(self, segment, offset, length):
+        """按位置读取一条记录"""
+        with open(os.path.join(self.log_dir, segment), 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.read(length).decode('utf-8'))
+
+    def find(self, batch_id=None, timestamp=None):
+        """按批次ID或时间戳查找记录（有多条时返回最后写入的一条）；都不指定时返回最新的记录
+
+        通过目录定位记录，只读取目标批次所在的那一行。
+        """
+        if timestamp is not None:
+            query = "SELECT segment, offset, length FROM batches WHERE timestamp = ? ORDER BY rowid DESC LIMIT 1"
+            params = (timestamp,)
+        elif batch_id is not None:
+            query = "SELECT segment, offset, length FROM batches WHERE batch_id = ? ORDER BY rowid DESC LIMIT 1"
+            params = (batch_id,)
+        else:
+            query = "SELECT segment, offset, length FROM batches ORDER BY timestamp DESC, rowid DESC LIMIT 1"
+            params = ()
+
+        with self._catalog_lock:
+            location = self._catalog.execute(query, params).fetchone()
+        if location is None:
+            return None
+        return self._read(*location)
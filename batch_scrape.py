@@ -0,0 +1,106 @@
+import time
+import requests
+import config
+from rate_limiter import firecrawl_limiter
+from url_filter import canonicalize_url
+from tracing import traced_sleep
+
+DEFAULT_API_URL = "https://api.firecrawl.dev"
+
+class BatchScrapeError(Exception):
+    """批量抓取任务失败或超时"""
+    pass
+
+class BatchScrapeClient:
+    def __init__(self, api_key=None, api_url=None, poll_interval=None, timeout=None, session=None):
+        """初始化Firecrawl批量抓取客户端
+
+        提交批量抓取任务（POST /v1/batch/scrape）后由服务端并发抓取，客户端只需定期查询任务状态
+        （GET /v1/batch/scrape/{id}），每次查询时把新完成的页面交给调用方处理。
+
+        参数:
+            api_key: Firecrawl API密钥，默认读取config.API_KEY
+            api_url: API地址，默认读取config.FIRECRAWL_API_URL，可指向本地模拟服务器
+            poll_interval: 查询任务状态的间隔（秒）
+            timeout: 单个任务的最长等待时间（秒）
+            session: 可选，复用的requests.Session（认证信息随每个请求发送，不修改其headers）
+        """
+        self.api_key = api_key or config.API_KEY
+        self.api_url = (api_url or getattr(config, 'FIRECRAWL_API_URL', DEFAULT_API_URL)).rstrip('/')
+        self.poll_interval = poll_interval or getattr(config, 'BATCH_SCRAPE_POLL_INTERVAL', 5)
+        self.timeout = timeout or getattr(config, 'BATCH_SCRAPE_TIMEOUT', 1800)
+        self.session = session or requests.Session()
+        self.headers = {
+            'Content-Type': 'application/json',
+            'Authorization': f'Bearer {self.api_key}'
+        }
+        self.rate_limiter = firecrawl_limiter()
+
+    def _request(self, method, url, **kwargs):
+        """发送请求并返回JSON，HTTP错误转换为异常（429的错误信息可被限流器识别）"""
+        response = self.session.request(method, url, headers=self.headers, timeout=config.REQUEST_TIMEOUT, **kwargs)
+        if response.status_code >= 400:
+            message = f"批量抓取请求失败，status code {response.status_code}: {response.text[:200]}"
+            retry_after = response.headers.get('Retry-After')
+            if retry_after and retry_after.isdigit():
+                message += f" (retry after {retry_after}s)"
+            raise Exception(message)
+        return response.json()
+
+    def start(self, urls, params=None):
+        """提交批量抓取任务，返回任务ID
+
+        参数:
+            urls: 要抓取的URL列表
+            params: 抓取参数，与scrape_url的params相同（formats、jsonOptions等）
+        """
+        payload = dict(params or {}, urls=list(urls))
+        data = self.rate_limiter.call(self._request, 'POST', f"{self.api_url}/v1/batch/scrape", json=payload)
+        if not data.get('success', True) or not data.get('id'):
+            raise BatchScrapeError(f"提交批量抓取任务失败: {data}")
+        return data['id']
+
+    def status(self, job_id):
+        """查询任务状态，自动跟随next合并分页返回的页面"""
+        data = self.rate_limiter.call(self._request, 'GET', f"{self.api_url}/v1/batch/scrape/{job_id}")
+        documents = list(data.get('data') or [])
+        next_url = data.get('next')
+        while next_url:
+            page = self.rate_limiter.call(self._request, 'GET', next_url)
+            documents.extend(page.get('data') or [])
+            next_url = page.get('next')
+        data['data'] = documents
+        return data
+
+    @staticmethod
+    def document_url(document):
+        """页面对应的原始URL"""
+        metadata = document.get('metadata') or {}
+        return metadata.get('sourceURL') or metadata.get('url') or document.get('url', '')
+
+    def iter_documents(self, job_id):
+        """等待任务完成，期间逐个返回新完成的页面 (规范化URL, 页面)
+
+        任务失败或超时时抛出BatchScrapeError；已返回的页面不受影响。
+        """
+        deadline = time.monotonic() + self.timeout
+        seen = set()
+        while True:
+            data = self.status(job_id)
+            for document in data['data']:
+                url = canonicalize_url(self.document_url(document))
+                if url not in seen:
+                    seen.add(url)
+                    yield url, document
+
+            status = data.get('status')
+            if status == 'completed':
+                return
+            if status == 'failed':
+                raise BatchScrapeError(f"批量抓取任务 {job_id} 失败: {data.get('error', '')}")
+            if time.monotonic() > deadline:
+                raise BatchScrapeError(f"批量抓取任务 {job_id} 超过 {self.timeout} 秒未完成")
+
+            print(f"批量抓取任务 {job_id}: 已完成 {data.get('completed', len(seen))}/{data.get('total', '?')}，"
+                  f"{self.poll_interval} 秒后再次查询...")
+            traced_sleep(self.poll_interval, 'batch_poll')
@@ -0,0 +1,305 @@
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from types import SimpleNamespace
+import config
+from rate_limiter import AdaptiveRateLimiter
+from metrics import REGISTRY
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+URL_PATTERN = re.compile(r'https?://[^\s"\'<>]+')
+
+def parse_latency(spec):
+    """解析延迟分布，返回 rng -> 秒数 的函数
+
+    支持: const:0.05 / uniform:0.02,0.1 / exp:0.05（均值） / lognormal:mu,sigma（秒的对数）
+    """
+    kind, _, args = spec.partition(':')
+    values = [float(value) for value in args.split(',')] if args else []
+    if kind == 'const':
+        return lambda rng: values[0]
+    if kind == 'uniform':
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == 'exp':
+        return lambda rng: rng.expovariate(1.0 / values[0]) if values[0] > 0 else 0.0
+    if kind == 'lognormal':
+        return lambda rng: rng.lognormvariate(values[0], values[1])
+    raise ValueError(f"不支持的延迟分布: {spec}")
+
+class FakeService:
+    def __init__(self, latency, error_rate, seed):
+        """模拟API的公共部分：按分布注入延迟，按比例注入错误（线程安全的随机数）"""
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.calls = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _simulate(self, name):
+        with self._lock:
+            self.calls += 1
+            delay = self.latency(self._rng)
+            failed = self._rng.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        time.sleep(delay)
+        if failed:
+            raise Exception(f"模拟的{name}错误: status code 500 Internal Server Error")
+
+class FakeFirecrawlApp(FakeService):
+    def __init__(self, latency, error_rate, seed, links_per_page, article_ratio):
+        """模拟FirecrawlApp：map_url返回一组文章链接和导航链接，scrape_url返回固定大小的页面"""
+        super().__init__(latency, error_rate, seed)
+        self.links_per_page = links_per_page
+        self.article_ratio = article_ratio
+
+    def map_url(self, url, params=None):
+        self._simulate('map_url')
+        base = url.rstrip('/')
+        articles = int(round(self.links_per_page * self.article_ratio))
+        links = [url]
+        for i in range(articles):
+            if i % 2:
+                # 带日期和长slug的文章链接，规则预判可以直接判定
+                links.append(f"{base}/news/2025/04/{i % 28 + 1:02d}/farm-prices-rise-in-region-report-{i}")
+            else:
+                # 只有编号的文章链接，需要大模型判断
+                links.append(f"{base}/p/{100000 + i}")
+        for i in range(self.links_per_page - articles):
+            links.append(f"{base}/section-{i}/")
+        return {'links': links}
+
+    def scrape_url(self, url, params=None):
+        self._simulate('scrape_url')
+        return {
+            'markdown': f"# {url}\n\n" + "农业新闻正文。" * 200,
+            'metadata': {'title': url, 'sourceURL': url, 'statusCode': 200},
+            'json': {'title': url, 'content': "农业新闻正文。" * 50, 'publish_date': '2025-04-01'}
+        }
+
+class FakeGeneration(FakeService):
+    """模拟dashscope.Generation：根据提示词中的URL给出确定的判断，支持单链接和批量提示词"""
+
+    @staticmethod
+    def _verdict(url):
+        is_article = '/news/' in url or '/p/' in url
+        digest = int(hashlib.md5(url.encode('utf-8')).hexdigest()[:4], 16)
+        score = 75 + digest % 20 if is_article else 10 + digest % 30
+        return {'score': score, 'is_valid': is_article, 'reason': '模拟判断'}
+
+    def call(self, **kwargs):
+        self._simulate('Generation.call')
+        prompt = kwargs.get('prompt', '')
+        urls = list(dict.fromkeys(URL_PATTERN.findall(prompt)))
+        if 'JSON 数组' in prompt:
+            items = [dict(self._verdict(url), index=i, url=url) for i, url in enumerate(urls, 1)]
+            text = json.dumps(items, ensure_ascii=False)
+        else:
+            text = json.dumps(self._verdict(urls[0] if urls else ''), ensure_ascii=False)
+        return SimpleNamespace(status_code=200, code='', message='', output=SimpleNamespace(text=text))
+
+def peak_rss_mb():
+    """当前进程的峰值常驻内存（MB），不支持的平台返回None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux单位为KB，macOS为字节
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+@contextlib.contextmanager
+def quiet(enabled):
+    """屏蔽各步骤的逐条输出，避免大规模测试时输出本身成为瓶颈"""
+    if not enabled:
+        yield
+        return
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+def configure(args):
+    """为基准测试调整配置：去掉固定的等待，按参数设置并发和缓存"""
+    config.BATCH_PAUSE_TIME = 0
+    config.DOMAIN_MIN_INTERVAL = 0
+    config.RETRY_DELAY = 0
+    config.RETRY_WAIT_TIME = 0
+    config.CHANGE_DETECTION_ENABLED = False
+    config.DISCOVERY_MODE = 'map'
+    config.EXTRACTION_ENGINE = 'firecrawl'
+    config.MONITOR_WORKERS = args.monitor_workers
+    config.VALIDATION_WORKERS = args.validation_workers
+    config.VALIDATION_BATCH_SIZE = args.batch_size
+    config.EXTRACTION_WORKERS = args.extraction_workers
+    config.EXTRACTION_MODE = 'scrape'
+    config.PRECLASSIFY_ENABLED = not args.no_preclassify
+    config.VERDICT_CACHE_ENABLED = args.with_caches
+    config.SCRAPE_CACHE_ENABLED = args.with_caches
+
+def run_scale(homepages, args):
+    """在临时目录中对指定数量的主页运行完整的三个步骤，返回统计结果"""
+    from step_1_homepage_monitor import HomepageMonitor
+    from step_2_link_validator import LinkValidator
+    from step_3_content_extraction import ContentExtractor
+
+    workdir = tempfile.mkdtemp(prefix='agrinews_bench_')
+    original_cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        firecrawl = FakeFirecrawlApp(args.firecrawl_latency, args.firecrawl_error_rate, args.seed,
+                                     args.links_per_page, args.article_ratio)
+        scrape_service = FakeFirecrawlApp(args.scrape_latency, args.firecrawl_error_rate, args.seed + 1,
+                                          args.links_per_page, args.article_ratio)
+        generation = FakeGeneration(args.llm_latency, args.llm_error_rate, args.seed + 2)
+
+        # 每个规模使用独立的限流器，速率为0时不限速
+        firecrawl_limiter = AdaptiveRateLimiter('Bench-Firecrawl', args.firecrawl_rpm,
+                                                max(args.monitor_workers, args.extraction_workers), max_retries=0)
+        llm_limiter = AdaptiveRateLimiter('Bench-DashScope', args.llm_rpm, args.validation_workers, max_retries=0)
+
+        monitor = HomepageMonitor('bench.xlsx', cache_file='link_cache.json', new_links_file='new_links.json')
+        monitor.app = firecrawl
+        monitor.rate_limiter = firecrawl_limiter
+        monitor.read_homepage_urls = lambda: {
+            f"https://site{i}.bench/": {'note': f'bench-{i}', 'source': 'benchmark'} for i in range(homepages)
+        }
+
+        validator = LinkValidator('new_links.json', 'new_links_valid.json')
+        validator.llm = generation
+        validator.rate_limiter = llm_limiter
+
+        extractor = ContentExtractor('new_links_valid.json', workers=args.extraction_workers)
+        extractor.workers = args.extraction_workers
+        extractor.app = scrape_service
+        extractor.rate_limiter = firecrawl_limiter
+
+        stages = {}
+        baseline = REGISTRY.snapshot()
+        with quiet(not args.verbose):
+            started = time.perf_counter()
+            batch_id = monitor.check_for_new_links(args.monitor_workers)
+            stages['monitor'] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            if batch_id:
+                validator.validate_links_by_batch(batch_id)
+            stages['validation'] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            valid_links = extractor.load_valid_links(batch_id) if batch_id else []
+            results = extractor.extract_content_from_urls(valid_links)[0] if valid_links else {}
+            stages['extraction'] = time.perf_counter() - started
+
+        new_links_entry = monitor.new_links_log.find(batch_id=batch_id) if batch_id else None
+        new_links = sum(
+            len(data.get('new_links', [])) for data in (new_links_entry or {}).get('data', {}).values()
+        )
+        articles = sum(1 for data in results.values() if 'error' not in data)
+        total = sum(stages.values())
+        return {
+            'homepages': homepages,
+            'new_links': new_links,
+            'valid_links': len(valid_links),
+            'articles': articles,
+            'stage_seconds': {name: round(seconds, 3) for name, seconds in stages.items()},
+            'total_seconds': round(total, 3),
+            'links_per_sec': round(new_links / total, 2) if total else None,
+            'articles_per_sec': round(articles / total, 2) if total else None,
+            'api_calls': {
+                'map_url': firecrawl.calls,
+                'scrape_url': scrape_service.calls,
+                'llm': generation.calls
+            },
+            'api_errors': {
+                'map_url': firecrawl.errors,
+                'scrape_url': scrape_service.errors,
+                'llm': generation.errors
+            },
+            'api_latency': REGISTRY.summary(baseline).get('agrinews_api_request_seconds', []),
+            'peak_rss_mb': peak_rss_mb()
+        }
+    finally:
+        os.chdir(original_cwd)
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+        else:
+            print(f"保留临时目录: {workdir}")
+
+def run_scale_isolated(homepages, args):
+    """在子进程中运行一个规模，峰值内存只反映该规模（ru_maxrss是整个进程的历史峰值）"""
+    configure(args)
+    return run_scale(homepages, args)
+
+def main():
+    parser = argparse.ArgumentParser(description="农业新闻处理流程基准测试（使用模拟的Firecrawl和通义千问）")
+    parser.add_argument("--homepages", type=int, nargs='+', default=[10, 100, 1000],
+                        help="测试的主页数量，可指定多个规模（例如 10 100 1000 10000）")
+    parser.add_argument("--links-per-page", type=int, default=40, help="每个主页map_url返回的链接数")
+    parser.add_argument("--article-ratio", type=float, default=0.5, help="链接中文章链接的比例")
+    parser.add_argument("--firecrawl-latency", default="lognormal:-2.5,0.5", help="map_url延迟分布")
+    parser.add_argument("--scrape-latency", default="lognormal:-2,0.5", help="scrape_url延迟分布")
+    parser.add_argument("--llm-latency", default="lognormal:-3,0.5", help="通义千问调用延迟分布")
+    parser.add_argument("--firecrawl-error-rate", type=float, default=0.0, help="Firecrawl调用的错误率")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="通义千问调用的错误率")
+    parser.add_argument("--firecrawl-rpm", type=float, default=0, help="Firecrawl每分钟请求数，0为不限速")
+    parser.add_argument("--llm-rpm", type=float, default=0, help="通义千问每分钟请求数，0为不限速")
+    parser.add_argument("--monitor-workers", type=int, default=8, help="步骤1工作线程数")
+    parser.add_argument("--validation-workers", type=int, default=8, help="步骤2工作线程数")
+    parser.add_argument("--extraction-workers", type=int, default=8, help="步骤3工作线程数")
+    parser.add_argument("--batch-size", type=int, default=1, help="步骤2每次请求验证的链接数")
+    parser.add_argument("--no-preclassify", action="store_true", help="关闭规则预判，所有链接都调用大模型")
+    parser.add_argument("--with-caches", action="store_true", help="启用验证结果缓存和抓取缓存")
+    parser.add_argument("--seed", type=int, default=42, help="随机数种子")
+    parser.add_argument("--output", default=None, help="结果JSON文件，默认 benchmark_results_<时间>.json")
+    parser.add_argument("--verbose", action="store_true", help="显示各步骤的输出")
+    parser.add_argument("--keep", action="store_true", help="保留临时工作目录")
+    args = parser.parse_args()
+
+    runs = []
+    context = multiprocessing.get_context('spawn')
+    for homepages in args.homepages:
+        print(f"运行基准测试: {homepages} 个主页...")
+        with context.Pool(1) as pool:
+            result = pool.apply(run_scale_isolated, (homepages, args))
+        runs.append(result)
+        stages = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in result['stage_seconds'].items())
+        print(f"  新链接 {result['new_links']}，文章 {result['articles']}，{stages}，"
+              f"{result['links_per_sec']} 链接/秒，{result['articles_per_sec']} 文章/秒，"
+              f"峰值内存 {result['peak_rss_mb']} MB")
+
+    report = {
+        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'revision': git_revision(),
+        'python': sys.version.split()[0],
+        'parameters': {key: value for key, value in vars(args).items() if key not in ('output', 'verbose', 'keep')},
+        'runs': runs
+    }
+    output = args.output or f"benchmark_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"基准测试结果已保存到: {output}")
+
+if __name__ == "__main__":
+    main()
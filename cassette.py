@@ -0,0 +1,204 @@
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+from cache_store import make_cache_key
+from url_filter import canonicalize_url
+
+# 参与匹配的通义千问调用参数（request_timeout等不影响结果的参数不参与）
+GENERATION_KEY_PARAMS = ('model', 'prompt', 'messages', 'temperature', 'max_tokens', 'top_p')
+
+class CassetteMiss(Exception):
+    """回放模式下录制中没有对应的请求"""
+    pass
+
+class Cassette:
+    def __init__(self, path, mode='replay', latency=None):
+        """初始化录制/回放文件
+
+        文件为gzip压缩的JSONL，每行一条记录 {kind, key, url, response | error, elapsed}。
+        key由请求类型和影响结果的请求参数生成，同一请求重复录制时以最后一次为准。
+
+        参数:
+            path: 录制文件路径（如 cassette.jsonl.gz）
+            mode: 'record'（真实调用并录制）或'replay'（只从录制中返回，不发出网络请求）
+            latency: 回放时注入的延迟，None为不延迟，数字为固定秒数，'recorded'为录制时的实际耗时
+        """
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"不支持的录制模式: {mode}")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._file = None
+        if os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        # 追加写入会产生多个gzip成员，gzip模块可以连续读取；跳过中断时不完整的最后一行
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    if line.endswith('\n'):
+                        entry = json.loads(line)
+                        self._entries[entry['key']] = entry
+        except (EOFError, OSError) as e:
+            print(f"读取录制文件 {self.path} 时出错（已加载 {len(self._entries)} 条记录）: {e}")
+        print(f"已加载录制文件 {self.path}，共 {len(self._entries)} 条记录")
+
+    def add(self, kind, key, url, response=None, error=None, elapsed=0.0):
+        """追加一条录制记录"""
+        entry = {'kind': kind, 'key': key, 'url': url, 'elapsed': round(elapsed, 3)}
+        if error is not None:
+            entry['error'] = error
+        else:
+            entry['response'] = response
+        with self._lock:
+            if self._file is None:
+                self._file = gzip.open(self.path, 'at', encoding='utf-8')
+            self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            # 每条记录写入后刷新，进程中断时已录制的记录不会丢失
+            self._file.flush()
+            self._entries[key] = entry
+            self.recorded += 1
+
+    def play(self, kind, key, url, func, serialize=None, deserialize=None):
+        """录制模式下调用func并录制结果；回放模式下返回录制的结果（或抛出录制的异常）"""
+        if self.mode == 'replay':
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+            if entry is None:
+                raise CassetteMiss(f"录制中没有该请求: {kind} {url}")
+            if self.latency == 'recorded':
+                time.sleep(entry.get('elapsed', 0))
+            elif self.latency:
+                time.sleep(self.latency)
+            if 'error' in entry:
+                raise Exception(entry['error'])
+            response = entry['response']
+            return deserialize(response) if deserialize else response
+
+        started = time.monotonic()
+        try:
+            result = func()
+        except Exception as e:
+            self.add(kind, key, url, error=str(e), elapsed=time.monotonic() - started)
+            raise
+        self.add(kind, key, url, response=serialize(result) if serialize else result,
+                 elapsed=time.monotonic() - started)
+        return result
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+def firecrawl_key(kind, url, params):
+    return make_cache_key(kind, canonicalize_url(url), params or {})
+
+def generation_key(kwargs):
+    return make_cache_key('dashscope.call', {name: kwargs.get(name) for name in GENERATION_KEY_PARAMS})
+
+class CassetteFirecrawlApp:
+    def __init__(self, app, cassette):
+        """包装FirecrawlApp，map_url和scrape_url经过录制/回放，其余属性直接转发"""
+        self._app = app
+        self._cassette = cassette
+
+    def map_url(self, url, params=None):
+        return self._cassette.play(
+            'firecrawl.map_url', firecrawl_key('firecrawl.map_url', url, params), url,
+            lambda: self._app.map_url(url, params=params)
+        )
+
+    def scrape_url(self, url, params=None):
+        return self._cassette.play(
+            'firecrawl.scrape_url', firecrawl_key('firecrawl.scrape_url', url, params), url,
+            lambda: self._app.scrape_url(url, params=params)
+        )
+
+    def __getattr__(self, name):
+        return getattr(self._app, name)
+
+def _serialize_generation(response):
+    output = getattr(response, 'output', None)
+    return {
+        'status_code': response.status_code,
+        'code': getattr(response, 'code', ''),
+        'message': getattr(response, 'message', ''),
+        'text': getattr(output, 'text', None) if output is not None else None
+    }
+
+def _deserialize_generation(data):
+    return SimpleNamespace(
+        status_code=data['status_code'],
+        code=data.get('code', ''),
+        message=data.get('message', ''),
+        output=SimpleNamespace(text=data.get('text'))
+    )
+
+class CassetteGeneration:
+    def __init__(self, generation, cassette):
+        """包装dashscope.Generation，call经过录制/回放"""
+        self._generation = generation
+        self._cassette = cassette
+
+    def call(self, **kwargs):
+        prompt = kwargs.get('prompt') or ''
+        return self._cassette.play(
+            'dashscope.call', generation_key(kwargs), prompt[:80],
+            lambda: self._generation.call(**kwargs),
+            serialize=_serialize_generation,
+            deserialize=_deserialize_generation
+        )
+
+def import_firecrawl_results(cassette, results_file, params):
+    """把旧的firecrawl_full_results_*.json导入为scrape_url的录制记录
+
+    参数:
+        cassette: 录制文件
+        results_file: 以URL为键的完整结果文件（test_firecrawl.py或步骤3的输出）
+        params: 这些记录对应的scrape_url参数，通常是当前步骤3使用的参数
+    """
+    with open(results_file, 'r', encoding='utf-8') as f:
+        results = json.load(f)
+
+    imported = 0
+    for url, data in results.items():
+        if 'error' in data:
+            continue
+        response = {
+            'markdown': data.get('markdown', ''),
+            'metadata': data.get('metadata', {}),
+            'json': (data.get('extract') or {}).get('data', {})
+        }
+        cassette.add('firecrawl.scrape_url', firecrawl_key('firecrawl.scrape_url', url, params), url, response=response)
+        imported += 1
+    print(f"已从 {results_file} 导入 {imported} 条抓取记录到 {cassette.path}")
+    return imported
+
+def main():
+    """导入旧结果作为初始录制: python cassette.py <firecrawl_full_results_*.json> <录制文件>"""
+    if len(sys.argv) != 3:
+        print("用法: python cassette.py <firecrawl_full_results_*.json> <录制文件>")
+        exit(1)
+
+    from step_3_content_extraction import ContentExtractor
+    cassette = Cassette(sys.argv[2], mode='record')
+    import_firecrawl_results(cassette, sys.argv[1], ContentExtractor.scrape_params())
+    cassette.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import hashlib
+import re
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from urllib.parse import urljoin
+import config
+from http_client import shared_session
+from url_filter import canonicalize_url
+from metrics import HOMEPAGE_CHANGES
+from tracing import span
+
+# 主页HTML中<a>标签的href
+HREF_PATTERN = re.compile(r'<a\s[^>]*?href\s*=\s*["\']?([^"\'\s>]+)', re.IGNORECASE)
+
+def link_set_hash(html, base_url):
+    """页面中所有链接（规范化、去重、排序后）的哈希
+
+    只看链接集合而不是整页HTML，页面上的时间、广告位、CSRF令牌等变化不会被当成有新内容。
+    """
+    links = set()
+    for href in HREF_PATTERN.findall(html):
+        if href.startswith(('javascript:', 'mailto:', 'tel:', '#')):
+            continue
+        links.add(canonicalize_url(urljoin(base_url, href)))
+    return hashlib.sha256('\n'.join(sorted(links)).encode('utf-8')).hexdigest(), len(links)
+
+class HomepageChangeDetector:
+    def __init__(self, db_file=None, max_age_hours=None, session=None):
+        """初始化主页变化检测器
+
+        调用map_url之前先直接请求主页：带上次的ETag/Last-Modified做条件请求，服务器返回304，
+        或页面链接集合的哈希与上次相同时认为主页没有变化，可以跳过map_url。
+        每个主页的状态保存在SQLite中（homepage_state表），只有map_url成功后才写入新状态。
+
+        参数:
+            db_file: SQLite数据库文件路径，默认读取config.HOMEPAGE_STATE_DB
+            max_age_hours: 距上次map_url超过该小时数时不再跳过（map_url还会读取站点地图，
+                           主页本身不变也可能有新链接），默认读取config.CHANGE_DETECTION_MAX_AGE_HOURS
+            session: 可选，requests.Session，默认使用共享的连接池
+        """
+        self.db_file = db_file or getattr(config, 'HOMEPAGE_STATE_DB', 'homepage_state.db')
+        hours = max_age_hours or getattr(config, 'CHANGE_DETECTION_MAX_AGE_HOURS', 24)
+        self.max_age = timedelta(hours=hours)
+        self.session = session or shared_session()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS homepage_state (
+                    homepage TEXT PRIMARY KEY,
+                    etag TEXT,
+                    last_modified TEXT,
+                    link_hash TEXT,
+                    link_count INTEGER,
+                    mapped_at TEXT NOT NULL
+                )
+            """)
+            self._conn.commit()
+
+    def _load(self, homepage_url):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, link_hash, mapped_at FROM homepage_state WHERE homepage = ?",
+                (homepage_url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'etag': row[0], 'last_modified': row[1], 'link_hash': row[2], 'mapped_at': row[3]}
+
+    def check(self, homepage_url):
+        """判断主页自上次map_url以来是否有变化
+
+        返回 (是否变化, 新状态)。请求失败、没有历史状态或状态已过期时都视为有变化；
+        map_url成功后用commit(新状态)保存。
+        """
+        previous = self._load(homepage_url)
+        if previous is not None:
+            mapped_at = datetime.strptime(previous['mapped_at'], "%Y-%m-%d %H:%M:%S")
+            if datetime.now() - mapped_at > self.max_age:
+                previous = None
+
+        headers = {}
+        if previous is not None:
+            if previous['etag']:
+                headers['If-None-Match'] = previous['etag']
+            if previous['last_modified']:
+                headers['If-Modified-Since'] = previous['last_modified']
+
+        try:
+            with span('HomepageChangeDetector.fetch', 'api', url=homepage_url):
+                response = self.session.get(homepage_url, headers=headers, timeout=config.REQUEST_TIMEOUT)
+        except Exception as e:
+            print(f"预检主页时出错 {homepage_url}: {e}")
+            HOMEPAGE_CHANGES.inc(result='error')
+            return True, None
+
+        if response.status_code == 304 and previous is not None:
+            HOMEPAGE_CHANGES.inc(result='not_modified')
+            return False, None
+        if response.status_code >= 400:
+            print(f"预检主页返回 {response.status_code}: {homepage_url}")
+            HOMEPAGE_CHANGES.inc(result='error')
+            return True, None
+
+        link_hash, link_count = link_set_hash(response.text, response.url or homepage_url)
+        state = {
+            'homepage': homepage_url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'link_hash': link_hash,
+            'link_count': link_count
+        }
+        if previous is not None and link_count and previous['link_hash'] == link_hash:
+            HOMEPAGE_CHANGES.inc(result='same_links')
+            return False, None
+
+        HOMEPAGE_CHANGES.inc(result='changed')
+        return True, state
+
+    def commit(self, state):
+        """map_url成功后保存主页的新状态"""
+        if not state:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO homepage_state "
+                "(homepage, etag, last_modified, link_hash, link_count, mapped_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (state['homepage'], state['etag'], state['last_modified'], state['link_hash'],
+                 state['link_count'], datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def open_change_detector():
+    """按配置创建主页变化检测器，CHANGE_DETECTION_ENABLED为False时返回None"""
+    if not getattr(config, 'CHANGE_DETECTION_ENABLED', True):
+        return None
+    return HomepageChangeDetector()
@@ -0,0 +1,296 @@
+import gzip
+import json
+import re
+import sqlite3
+import threading
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urljoin, urlsplit
+import config
+from http_client import shared_session
+from tracing import span
+
+# 主页<head>中声明的RSS/Atom订阅源
+FEED_LINK_PATTERN = re.compile(r'<link\s[^>]*type\s*=\s*["\']application/(?:rss|atom)\+xml["\'][^>]*>', re.IGNORECASE)
+HREF_ATTR_PATTERN = re.compile(r'href\s*=\s*["\']([^"\']+)["\']', re.IGNORECASE)
+
+# 解析日期时尝试的ISO 8601格式之外的写法
+ISO_DATE_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+def parse_date(text):
+    """解析站点地图的lastmod（ISO 8601）或RSS的pubDate（RFC 822），返回UTC时间，无法解析时返回None"""
+    if not text:
+        return None
+    text = text.strip()
+    try:
+        if ISO_DATE_PATTERN.match(text):
+            parsed = datetime.strptime(text, "%Y-%m-%d")
+        elif text[:4].isdigit():
+            parsed = datetime.fromisoformat(text.replace('Z', '+00:00'))
+        else:
+            parsed = parsedate_to_datetime(text)
+    except (ValueError, TypeError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1] if isinstance(tag, str) else ''
+
+def _child_text(element, *names):
+    """按不带命名空间的标签名查找第一个非空子元素文本"""
+    for child in element.iter():
+        if child is not element and _local_name(child.tag) in names and child.text and child.text.strip():
+            return child.text.strip()
+    return None
+
+def _atom_link(element):
+    for child in element:
+        if _local_name(child.tag) == 'link' and child.get('rel', 'alternate') == 'alternate' and child.get('href'):
+            return child.get('href')
+    return None
+
+class FeedDiscovery:
+    def __init__(self, db_file=None, session=None):
+        """初始化基于站点地图和RSS/Atom订阅源的链接发现
+
+        每个主页首次检查时自动查找订阅源：robots.txt中的Sitemap、主页声明的RSS/Atom链接、/sitemap.xml；
+        之后边下载边解析（iterparse），只取发布时间晚于上次所见时间（首次为最近DISCOVERY_INITIAL_DAYS天）的条目，
+        没有发布时间的条目无法判断新旧，一律跳过；站点地图索引中lastmod早于该时间的子站点地图不再下载。
+        每次最多返回DISCOVERY_MAX_ENTRIES个晚于上次所见时间的条目，超出的较新条目留到下次检查。没有可用订阅源的主页返回None，由调用方改用map_url。
+
+        参数:
+            db_file: SQLite数据库文件路径，默认与主页变化预检共用config.HOMEPAGE_STATE_DB
+            session: 可选，requests.Session，默认使用共享的连接池
+        """
+        self.db_file = db_file or getattr(config, 'HOMEPAGE_STATE_DB', 'homepage_state.db')
+        self.redetect_after = timedelta(days=getattr(config, 'DISCOVERY_REDETECT_DAYS', 7))
+        self.initial_window = timedelta(days=getattr(config, 'DISCOVERY_INITIAL_DAYS', 3))
+        self.overlap = timedelta(hours=getattr(config, 'DISCOVERY_OVERLAP_HOURS', 1))
+        self.max_sitemaps = getattr(config, 'DISCOVERY_MAX_SITEMAPS', 20)
+        self.max_entries = getattr(config, 'DISCOVERY_MAX_ENTRIES', 200)
+        self.session = session or shared_session()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS discovery_sources (
+                    homepage TEXT PRIMARY KEY,
+                    sources TEXT NOT NULL,
+                    detected_at TEXT NOT NULL,
+                    last_seen TEXT
+                )
+            """)
+            self._conn.commit()
+
+    def _load(self, homepage_url):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sources, detected_at, last_seen FROM discovery_sources WHERE homepage = ?", (homepage_url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            'sources': json.loads(row[0]),
+            'detected_at': datetime.fromisoformat(row[1]),
+            'last_seen': datetime.fromisoformat(row[2]) if row[2] else None
+        }
+
+    def _get(self, url, **kwargs):
+        with span('FeedDiscovery.fetch', 'api', url=url):
+            return self.session.get(url, timeout=config.REQUEST_TIMEOUT, **kwargs)
+
+    def detect_sources(self, homepage_url):
+        """查找主页的站点地图和订阅源URL列表
+
+        主页是网站根路径时才使用robots.txt和/sitemap.xml（它们覆盖整个网站）；
+        栏目主页只使用页面上声明的订阅源。
+        """
+        sources = []
+        try:
+            response = self._get(homepage_url)
+            if response.status_code < 400:
+                for tag in FEED_LINK_PATTERN.findall(response.text):
+                    href = HREF_ATTR_PATTERN.search(tag)
+                    if href:
+                        sources.append(urljoin(response.url or homepage_url, href.group(1)))
+        except Exception as e:
+            print(f"读取主页订阅源声明时出错 {homepage_url}: {e}")
+
+        parts = urlsplit(homepage_url)
+        if parts.path in ('', '/'):
+            root = f"{parts.scheme}://{parts.netloc}"
+            try:
+                response = self._get(f"{root}/robots.txt")
+                if response.status_code < 400:
+                    for line in response.text.splitlines():
+                        key, _, value = line.partition(':')
+                        if key.strip().lower() == 'sitemap' and value.strip():
+                            sources.append(urljoin(root, value.strip()))
+            except Exception as e:
+                print(f"读取robots.txt时出错 {root}: {e}")
+
+            if not any('sitemap' in source.lower() for source in sources):
+                candidate = f"{root}/sitemap.xml"
+                try:
+                    response = self._get(candidate, stream=True)
+                    head = next(response.iter_content(512), b'') if response.status_code < 400 else b''
+                    response.close()
+                    if b'<urlset' in head or b'<sitemapindex' in head or head.lstrip().startswith(b'<?xml'):
+                        sources.append(candidate)
+                except Exception as e:
+                    print(f"读取 {candidate} 时出错: {e}")
+
+        return list(dict.fromkeys(sources))
+
+    def sources_for(self, homepage_url):
+        """主页的订阅源列表（检测结果缓存DISCOVERY_REDETECT_DAYS天，没有订阅源的结果同样缓存）"""
+        state = self._load(homepage_url)
+        if state is not None and datetime.now() - state['detected_at'] < self.redetect_after:
+            return state['sources'], state['last_seen']
+
+        sources = self.detect_sources(homepage_url)
+        last_seen = state['last_seen'] if state else None
+        print(f"{homepage_url} 的订阅源/站点地图: {sources or '无'}")
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO discovery_sources (homepage, sources, detected_at, last_seen) VALUES (?, ?, ?, ?)",
+                (homepage_url, json.dumps(sources), datetime.now().isoformat(timespec='seconds'),
+                 last_seen.isoformat() if last_seen else None)
+            )
+            self._conn.commit()
+        return sources, last_seen
+
+    def iter_entries(self, source_url, since, depth=0):
+        """边下载边解析一个站点地图或订阅源，逐个返回 {url, date, title}
+
+        条目按原样返回（没有发布时间的date为None），由调用方按发布时间筛选；since只用于跳过站点地图索引中
+        lastmod较早的子站点地图，其余子站点地图按lastmod从新到旧最多读取DISCOVERY_MAX_SITEMAPS个。
+        """
+        child_sitemaps = []
+        response = self._get(source_url, stream=True)
+        try:
+            if response.status_code >= 400:
+                raise Exception(f"status code {response.status_code}")
+            response.raw.decode_content = True
+            stream = response.raw
+            if source_url.endswith('.gz') and 'gzip' not in response.headers.get('Content-Encoding', ''):
+                stream = gzip.GzipFile(fileobj=stream)
+
+            for _, element in ET.iterparse(stream, events=('end',)):
+                name = _local_name(element.tag)
+                if name == 'url':
+                    url = _child_text(element, 'loc')
+                    date = parse_date(_child_text(element, 'publication_date', 'lastmod'))
+                    title = _child_text(element, 'title')
+                elif name == 'item':
+                    url = _child_text(element, 'link')
+                    date = parse_date(_child_text(element, 'pubDate', 'date'))
+                    title = _child_text(element, 'title')
+                elif name == 'entry':
+                    url = _atom_link(element)
+                    date = parse_date(_child_text(element, 'published', 'updated'))
+                    title = _child_text(element, 'title')
+                elif name == 'sitemap':
+                    loc = _child_text(element, 'loc')
+                    lastmod = parse_date(_child_text(element, 'lastmod'))
+                    if loc and (lastmod is None or lastmod >= since):
+                        child_sitemaps.append((lastmod, urljoin(source_url, loc)))
+                    element.clear()
+                    continue
+                else:
+                    continue
+                element.clear()
+                if url:
+                    yield {'url': urljoin(source_url, url), 'date': date, 'title': title or ''}
+        finally:
+            response.close()
+
+        if depth < 2 and child_sitemaps:
+            oldest = datetime.min.replace(tzinfo=timezone.utc)
+            child_sitemaps.sort(key=lambda item: item[0] or oldest, reverse=True)
+            for _, loc in child_sitemaps[:self.max_sitemaps]:
+                yield from self.iter_entries(loc, since, depth + 1)
+
+    def discover(self, homepage_url):
+        """读取主页所有订阅源中的新条目
+
+        返回 (条目列表, 最新条目时间)，条目按发布时间从新到旧排列；主页没有订阅源、
+        所有订阅源都读取失败或只有不带发布时间的条目时返回None。
+        """
+        sources, last_seen = self.sources_for(homepage_url)
+        if not sources:
+            return None
+
+        now = datetime.now(timezone.utc)
+        since = last_seen - self.overlap if last_seen else now - self.initial_window
+        entries = {}
+        succeeded = 0
+        undated_sources = []
+        for source in sources:
+            dated = undated = 0
+            try:
+                for entry in self.iter_entries(source, since):
+                    if entry['date'] is None:
+                        undated += 1
+                        continue
+                    dated += 1
+                    if entry['date'] < since:
+                        continue
+                    entries.setdefault(entry['url'], entry)
+            except Exception as e:
+                print(f"解析订阅源时出错 {source}: {e}")
+                continue
+            if undated and not dated:
+                print(f"{source} 的 {undated} 个条目都没有发布时间，无法判断新旧，不使用该订阅源")
+                undated_sources.append(source)
+                continue
+            succeeded += 1
+
+        if undated_sources:
+            # 在重新查找订阅源之前不再下载这些订阅源
+            self._save_sources(homepage_url, [source for source in sources if source not in undated_sources])
+        if not succeeded:
+            return None
+        # 超过上限时保留较早的条目，最新条目时间取保留条目中的最大值，其余较新的条目留到下次检查
+        # 重叠时间段内（不晚于上次所见时间）的条目通常已在历史记录中，不计入上限，避免上次所见时间停滞
+        entries = sorted(entries.values(), key=lambda entry: entry['date'])
+        seen = [entry for entry in entries if last_seen and entry['date'] <= last_seen]
+        unseen = entries[len(seen):]
+        if len(unseen) > self.max_entries:
+            print(f"{len(unseen)} 个新条目超过每次上限 {self.max_entries}，本次只使用最早的 {self.max_entries} 个，其余留到下次检查")
+            unseen = unseen[:self.max_entries]
+        latest = max((entry['date'] for entry in unseen if entry['date'] <= now), default=last_seen)
+        entries = list(reversed(seen + unseen))
+        print(f"从 {succeeded} 个订阅源/站点地图中获得 {len(entries)} 个 {since:%Y-%m-%d %H:%M} 之后的条目")
+        return entries, latest
+
+    def _save_sources(self, homepage_url, sources):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE discovery_sources SET sources = ? WHERE homepage = ?", (json.dumps(sources), homepage_url)
+            )
+            self._conn.commit()
+
+    def commit(self, homepage_url, latest):
+        """新链接写入历史记录后保存最新条目时间，下次只读取此后的条目"""
+        if latest is None:
+            return
+        with self._lock:
+            self._conn.execute(
+                "UPDATE discovery_sources SET last_seen = ? WHERE homepage = ?", (latest.isoformat(), homepage_url)
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def open_feed_discovery():
+    """按配置创建订阅源发现，DISCOVERY_MODE为"feeds"或"auto"时启用，默认"map"时返回None（始终使用map_url）"""
+    if getattr(config, 'DISCOVERY_MODE', 'map') not in ('feeds', 'auto'):
+        return None
+    return FeedDiscovery()
@@ -0,0 +1,168 @@
+import re
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit
+import config
+from http_client import decode_html, shared_session
+from url_filter import canonicalize_url
+from tracing import span
+
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+# 链接文本的最大长度
+MAX_LINK_TEXT_LENGTH = 200
+
+def _host_without_www(url):
+    host = (urlsplit(url).hostname or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+class AnchorParser(HTMLParser):
+    def __init__(self, base_url):
+        """收集页面中的<a href>及其链接文本（文本为空时使用title、aria-label或图片的alt）"""
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.anchors = {}
+        self._href = None
+        self._text = []
+        self._fallback = ''
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'base' and self._href is None:
+            href = dict(attrs).get('href')
+            if href:
+                self.base_url = urljoin(self.base_url, href)
+        elif tag == 'a':
+            self._finish()
+            attrs = dict(attrs)
+            href = (attrs.get('href') or '').strip()
+            if href and not href.startswith(('#', 'javascript:', 'mailto:', 'tel:')):
+                self._href = href
+                self._text = []
+                self._fallback = attrs.get('title') or attrs.get('aria-label') or ''
+        elif tag == 'img' and self._href is not None and not self._fallback:
+            self._fallback = dict(attrs).get('alt') or ''
+
+    def handle_endtag(self, tag):
+        if tag == 'a':
+            self._finish()
+
+    def handle_data(self, data):
+        if self._href is not None:
+            self._text.append(data)
+
+    def _finish(self):
+        if self._href is None:
+            return
+        text = WHITESPACE_PATTERN.sub(' ', ''.join(self._text)).strip() or self._fallback.strip()
+        url = canonicalize_url(urljoin(self.base_url, self._href))
+        # 同一链接出现多次时保留最长的文本（标题链接通常比“阅读更多”长）
+        if len(text) >= len(self.anchors.get(url, '')):
+            self.anchors[url] = text[:MAX_LINK_TEXT_LENGTH]
+        self._href = None
+
+    def close(self):
+        super().close()
+        self._finish()
+
+def extract_anchors(html, base_url):
+    """返回页面中链接到链接文本的映射（链接已规范化，保持页面中的顺序）"""
+    parser = AnchorParser(base_url)
+    parser.feed(html)
+    parser.close()
+    return parser.anchors
+
+def _listed(homepage_url, sites):
+    host = _host_without_www(homepage_url)
+    for site in sites:
+        if site == homepage_url or ('://' not in site and _host_without_www(f"//{site}") == host):
+            return True
+    return False
+
+class HtmlLinkDiscovery:
+    def __init__(self, db_file=None, session=None):
+        """初始化直接抓取主页HTML的链接发现（不调用Firecrawl）
+
+        适用于服务端渲染的主页：直接下载HTML，解析出同站的<a href>和链接文本。
+        以下情况视为快速通道失败，返回None由调用方改用map_url，并在HTML_RETRY_DAYS天内不再尝试：
+        请求失败、返回的不是HTML、同站链接少于HTML_MIN_LINKS个（通常是需要JavaScript渲染的页面）。
+        JS_RENDERED_SITES中列出的主页或域名始终使用map_url。
+
+        参数:
+            db_file: SQLite数据库文件路径，默认与主页变化预检共用config.HOMEPAGE_STATE_DB
+            session: 可选，requests.Session，默认使用共享的连接池
+        """
+        self.db_file = db_file or getattr(config, 'HOMEPAGE_STATE_DB', 'homepage_state.db')
+        self.min_links = getattr(config, 'HTML_MIN_LINKS', 10)
+        self.retry_after = timedelta(days=getattr(config, 'HTML_RETRY_DAYS', 7))
+        self.js_rendered_sites = getattr(config, 'JS_RENDERED_SITES', [])
+        self.session = session or shared_session()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS html_fast_path (
+                    homepage TEXT PRIMARY KEY,
+                    failed_at TEXT NOT NULL,
+                    reason TEXT
+                )
+            """)
+            self._conn.commit()
+
+    def _recently_failed(self, homepage_url):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT failed_at FROM html_fast_path WHERE homepage = ?", (homepage_url,)
+            ).fetchone()
+        return row is not None and datetime.now() - datetime.fromisoformat(row[0]) < self.retry_after
+
+    def _mark_failed(self, homepage_url, reason):
+        print(f"HTML快速通道不可用（{reason}），改用map: {homepage_url}")
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO html_fast_path (homepage, failed_at, reason) VALUES (?, ?, ?)",
+                (homepage_url, datetime.now().isoformat(timespec='seconds'), reason)
+            )
+            self._conn.commit()
+
+    def discover(self, homepage_url):
+        """返回主页上同站链接到链接文本的映射；主页需要使用map_url时返回None"""
+        if _listed(homepage_url, self.js_rendered_sites) or self._recently_failed(homepage_url):
+            return None
+
+        try:
+            with span('HtmlLinkDiscovery.fetch', 'api', url=homepage_url):
+                response = self.session.get(homepage_url, timeout=config.REQUEST_TIMEOUT)
+        except Exception as e:
+            self._mark_failed(homepage_url, f"请求失败: {e}")
+            return None
+        if response.status_code >= 400:
+            self._mark_failed(homepage_url, f"status code {response.status_code}")
+            return None
+        if 'html' not in response.headers.get('Content-Type', 'text/html').lower():
+            self._mark_failed(homepage_url, f"不是HTML: {response.headers.get('Content-Type')}")
+            return None
+
+        host = _host_without_www(homepage_url)
+        anchors = {
+            url: text for url, text in extract_anchors(decode_html(response), response.url or homepage_url).items()
+            if url.startswith(('http://', 'https://')) and _host_without_www(url) == host
+        }
+        if len(anchors) < self.min_links:
+            self._mark_failed(homepage_url, f"只有 {len(anchors)} 个同站链接，可能需要JavaScript渲染")
+            return None
+
+        print(f"HTML快速通道从 {homepage_url} 解析出 {len(anchors)} 个同站链接")
+        return anchors
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def open_html_discovery():
+    """按配置创建HTML快速通道，DISCOVERY_MODE为"auto"时启用（默认"map"不启用）"""
+    if getattr(config, 'DISCOVERY_MODE', 'map') != 'auto':
+        return None
+    return HtmlLinkDiscovery()
@@ -0,0 +1,43 @@
+import re
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+import config
+
+DEFAULT_USER_AGENT = "Mozilla/5.0 (compatible; AgriNewsMonitor/1.0)"
+
+_session = None
+_session_lock = threading.Lock()
+
+def shared_session():
+    """直接请求新闻网站（主页、robots.txt、站点地图、订阅源、文章页）时共用的requests.Session
+
+    连接池按步骤1和步骤3的并发线程数设置，同一网站的多次请求复用连接。
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            pool_size = max(10, getattr(config, 'MONITOR_WORKERS', 1), getattr(config, 'EXTRACTION_WORKERS', 1))
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers['User-Agent'] = getattr(config, 'USER_AGENT', DEFAULT_USER_AGENT)
+            _session = session
+        return _session
+
+META_CHARSET_PATTERN = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?([\w-]+)', re.IGNORECASE)
+
+def decode_html(response):
+    """按响应头、页面<meta charset>、内容猜测的顺序确定编码并解码HTML
+
+    响应头没有charset时requests默认按ISO-8859-1解码，中文页面会变成乱码。
+    """
+    if 'charset' in response.headers.get('Content-Type', '').lower():
+        return response.text
+    match = META_CHARSET_PATTERN.search(response.content[:4096])
+    encoding = match.group(1).decode('ascii') if match else response.apparent_encoding
+    try:
+        return response.content.decode(encoding or 'utf-8', errors='replace')
+    except LookupError:
+        return response.content.decode('utf-8', errors='replace')
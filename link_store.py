@@ -0,0 +1,194 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+import config
+from url_filter import canonicalize_url
+
+# SQLite单条语句的参数个数有上限，分块查询
+SQLITE_CHUNK_SIZE = 500
+
+def _dedupe(links):
+    """去重并保持原有顺序"""
+    return list(dict.fromkeys(links))
+
+class JsonLinkHistoryStore:
+    def __init__(self, cache_file):
+        """基于link_cache.json的历史链接存储（旧格式，每次保存都会重写整个文件）"""
+        self.cache_file = cache_file
+        self._lock = threading.Lock()
+        self._links = {}
+        try:
+            if os.path.exists(cache_file):
+                with open(cache_file, 'r', encoding='utf-8') as f:
+                    # 旧文件中的链接未经规范化，按规范化后的形式比较
+                    self._links = {
+                        homepage: {canonicalize_url(link) for link in links}
+                        for homepage, links in json.load(f).items()
+                    }
+        except Exception as e:
+            print(f"加载历史链接缓存时出错: {e}")
+
+    def count(self, homepage_url):
+        """某个主页的历史链接数量"""
+        with self._lock:
+            return len(self._links.get(homepage_url, ()))
+
+    def diff(self, homepage_url, links):
+        """返回links中尚未出现在历史记录里的链接"""
+        with self._lock:
+            known = self._links.get(homepage_url, set())
+            return [link for link in _dedupe(links) if link not in known]
+
+    def add(self, homepage_url, links):
+        """把链接加入历史记录，返回实际新增的数量"""
+        with self._lock:
+            known = self._links.setdefault(homepage_url, set())
+            before = len(known)
+            known.update(links)
+            return len(known) - before
+
+    def arrivals(self, homepage_url, since):
+        """旧格式没有记录发现时间，无法统计新链接的出现速度"""
+        return 0, None
+
+    def save(self):
+        """保存历史链接缓存"""
+        try:
+            with self._lock:
+                data = {homepage: sorted(links) for homepage, links in self._links.items()}
+            with open(self.cache_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            print(f"保存历史链接缓存时出错: {e}")
+
+    def close(self):
+        self.save()
+
+class SqliteLinkHistoryStore:
+    def __init__(self, db_file, legacy_cache_file=None):
+        """基于SQLite的历史链接存储
+
+        以(homepage, url)为主键，成员判断走索引，写入时只插入新行，不会重写整个历史。
+
+        参数:
+            db_file: SQLite数据库文件路径
+            legacy_cache_file: 旧的link_cache.json，数据库为空时自动导入
+        """
+        self.db_file = db_file
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS links (
+                    homepage TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    first_seen TEXT NOT NULL,
+                    PRIMARY KEY (homepage, url)
+                ) WITHOUT ROWID
+            """)
+            self._conn.commit()
+            is_empty = self._conn.execute("SELECT 1 FROM links LIMIT 1").fetchone() is None
+
+        if is_empty and legacy_cache_file and os.path.exists(legacy_cache_file):
+            self.import_json(legacy_cache_file)
+
+    def import_json(self, cache_file):
+        """从旧的link_cache.json导入历史链接
+
+        旧文件中的链接未经规范化（带#片段、查询参数顺序不同等），导入时规范化，
+        与diff/add使用的规范化链接一致，避免首次运行时把这些链接当作新链接。
+        """
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            imported = sum(
+                self.add(homepage_url, [canonicalize_url(link) for link in links])
+                for homepage_url, links in data.items()
+            )
+            print(f"已从 {cache_file} 导入 {imported} 条历史链接到 {self.db_file}")
+        except Exception as e:
+            print(f"导入历史链接缓存时出错: {e}")
+
+    def count(self, homepage_url):
+        """某个主页的历史链接数量"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM links WHERE homepage = ?", (homepage_url,)
+            ).fetchone()
+        return row[0]
+
+    def diff(self, homepage_url, links):
+        """返回links中尚未出现在历史记录里的链接（保持原有顺序）"""
+        links = _dedupe(links)
+        known = set()
+        with self._lock:
+            for i in range(0, len(links), SQLITE_CHUNK_SIZE):
+                chunk = links[i:i + SQLITE_CHUNK_SIZE]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT url FROM links WHERE homepage = ? AND url IN ({placeholders})",
+                    [homepage_url] + chunk
+                )
+                known.update(row[0] for row in rows)
+        return [link for link in links if link not in known]
+
+    def add(self, homepage_url, links):
+        """把链接加入历史记录，已存在的链接会被忽略，返回实际新增的数量"""
+        first_seen = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO links (homepage, url, first_seen) VALUES (?, ?, ?)",
+                [(homepage_url, link, first_seen) for link in _dedupe(links)]
+            )
+            self._conn.commit()
+            return self._conn.total_changes - before
+
+    def arrivals(self, homepage_url, since):
+        """统计某个主页自since以来出现的新链接
+
+        第一次检查时写入的是主页上原有的链接，不代表发布速度，不计入统计。
+
+        返回:
+            (新链接数量, 统计的起始时间)；还没有第一次检查之后的历史时起始时间为None
+        """
+        with self._lock:
+            baseline = self._conn.execute(
+                "SELECT MIN(first_seen) FROM links WHERE homepage = ?", (homepage_url,)
+            ).fetchone()[0]
+            if baseline is None:
+                return 0, None
+            start = max(baseline, since.strftime("%Y-%m-%d %H:%M:%S"))
+            count = self._conn.execute(
+                "SELECT COUNT(*) FROM links WHERE homepage = ? AND first_seen > ? AND first_seen >= ?",
+                (homepage_url, baseline, start)
+            ).fetchone()[0]
+        return count, datetime.strptime(start, "%Y-%m-%d %H:%M:%S")
+
+    def save(self):
+        """每次add都已提交，无需额外保存"""
+        pass
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def open_link_history(cache_file, backend=None):
+    """根据配置打开历史链接存储
+
+    参数:
+        cache_file: 旧的link_cache.json路径；SQLite数据库默认放在同名的.db文件中
+        backend: 'sqlite'（默认）或'json'
+    """
+    if backend is None:
+        backend = getattr(config, 'LINK_HISTORY_BACKEND', 'sqlite')
+
+    if backend == 'json':
+        return JsonLinkHistoryStore(cache_file)
+    if backend == 'sqlite':
+        db_file = getattr(config, 'LINK_HISTORY_DB', os.path.splitext(cache_file)[0] + '.db')
+        return SqliteLinkHistoryStore(db_file, legacy_cache_file=cache_file)
+    raise ValueError(f"不支持的历史链接存储类型: {backend}")
@@ -0,0 +1,607 @@
+import json
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit
+import config
+from http_client import decode_html, shared_session
+from politeness import DomainPolitenessScheduler
+from metrics import EXTRACTIONS
+from tracing import span
+
+# 不含正文、直接丢弃的标签
+SKIPPED_TAGS = {'script', 'style', 'noscript', 'template', 'svg', 'iframe', 'form', 'button', 'select',
+                'nav', 'footer', 'aside'}
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+BLOCK_TAGS = {'p', 'div', 'section', 'article', 'main', 'figure', 'figcaption', 'ul', 'ol', 'li', 'blockquote',
+              'pre', 'table', 'tr', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'dl', 'dt', 'dd'}
+
+# class/id中表示正文或非正文的关键字（readability的做法）
+POSITIVE_PATTERN = re.compile(r'article|body|content|entry|main|news|post|story|text|detail|zhengwen', re.IGNORECASE)
+NEGATIVE_PATTERN = re.compile(
+    r'comment|header|footer|footnote|sidebar|side-bar|widget|nav|menu|breadcrumb|share|social|related|recommend|'
+    r'promo|sponsor|advert|\bad-|banner|popup|modal|cookie|subscribe|newsletter|copyright|tags?\b',
+    re.IGNORECASE
+)
+WHITESPACE_PATTERN = re.compile(r'\s+')
+PUNCTUATION_PATTERN = re.compile(r'[,，。、;；]')
+CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]')
+
+# 节点树的最大嵌套层数，更深的标签（通常是大量未闭合的<font>等）不再建立节点，其文本归入上层节点，
+# 转换markdown时的递归深度因此有上限
+MAX_NODE_DEPTH = 100
+
+# 元数据标签（meta的name或property，小写）
+TITLE_META = ('og:title', 'twitter:title')
+DATE_META = ('article:published_time', 'og:published_time', 'datepublished', 'pubdate', 'publishdate',
+             'publish_date', 'parsely-pub-date', 'sailthru.date', 'dc.date.issued', 'dc.date', 'date')
+AUTHOR_META = ('author', 'article:author', 'parsely-author', 'sailthru.author', 'dc.creator')
+DESCRIPTION_META = ('description', 'og:description', 'twitter:description')
+CATEGORY_META = ('article:section', 'parsely-section', 'category')
+
+# CONTENT_SCHEMA中的字段名与本地提取结果的对应关系
+SCHEMA_FIELD_ALIASES = {
+    'title': ('title', 'headline'),
+    'content': ('content', 'body', 'text', 'article', 'main_content'),
+    'publish_date': ('publish_date', 'published_date', 'date', 'publication_date', 'pub_date'),
+    'author': ('author', 'authors'),
+    'source': ('source', 'site_name', 'publisher'),
+    'category': ('category', 'section', 'categories'),
+    'summary': ('summary', 'description', 'abstract')
+}
+
+class LocalExtractionFailed(Exception):
+    """本地提取失败或结果未通过质量检查，需要改用Firecrawl"""
+    pass
+
+class _Node:
+    __slots__ = ('tag', 'attrs', 'children', 'parent', 'score', 'depth')
+
+    def __init__(self, tag, attrs=None, parent=None):
+        self.tag = tag
+        self.attrs = attrs or {}
+        self.children = []
+        self.parent = parent
+        self.score = None
+        self.depth = parent.depth + 1 if parent is not None else 0
+
+    def text(self):
+        parts = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, str):
+                parts.append(node)
+            else:
+                stack.extend(reversed(node.children))
+        return WHITESPACE_PATTERN.sub(' ', ''.join(parts)).strip()
+
+    def link_text_length(self):
+        return sum(len(node.text()) for node in self.iter('a'))
+
+    def iter(self, *tags):
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, _Node):
+                if not tags or node.tag in tags:
+                    yield node
+                stack.extend(reversed(node.children))
+
+class _DocumentParser(HTMLParser):
+    def __init__(self):
+        """把HTML解析为简单的节点树，同时收集meta标签、<title>和JSON-LD"""
+        super().__init__(convert_charrefs=True)
+        self.root = _Node('document')
+        self.current = self.root
+        self.meta = {}
+        self.title = ''
+        self.language = ''
+        self.json_ld = []
+        self._skip_tag = None
+        self._skip_depth = 0
+        self._capture = None
+        self._captured = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {name: value or '' for name, value in attrs}
+        if tag == 'html':
+            self.language = attrs.get('lang', '')
+        elif tag == 'meta':
+            key = (attrs.get('property') or attrs.get('name') or attrs.get('itemprop') or '').lower()
+            if key and attrs.get('content') and key not in self.meta:
+                self.meta[key] = attrs['content'].strip()
+            return
+        elif tag == 'title' and self._skip_tag is None:
+            self._capture, self._captured = 'title', []
+            return
+        elif tag == 'script' and 'ld+json' in attrs.get('type', ''):
+            self._capture, self._captured = 'json_ld', []
+
+        # 跳过模板内容时只需跟踪同名标签的嵌套层数
+        if self._skip_tag is not None:
+            if tag == self._skip_tag:
+                self._skip_depth += 1
+            return
+        if tag in SKIPPED_TAGS:
+            if tag not in VOID_TAGS:
+                self._skip_tag, self._skip_depth = tag, 1
+            return
+        # <p>中出现块级标签时隐式结束<p>
+        if tag in BLOCK_TAGS and self.current.tag == 'p':
+            self.current = self.current.parent
+        if self.current.depth >= MAX_NODE_DEPTH:
+            return
+        node = _Node(tag, attrs, self.current)
+        self.current.children.append(node)
+        if tag not in VOID_TAGS:
+            self.current = node
+
+    def handle_endtag(self, tag):
+        if self._capture == 'title' and tag == 'title':
+            self.title = WHITESPACE_PATTERN.sub(' ', ''.join(self._captured)).strip()
+            self._capture = None
+            return
+        if self._capture == 'json_ld' and tag == 'script':
+            self.json_ld.append(''.join(self._captured))
+            self._capture = None
+        if self._skip_tag is not None:
+            if tag == self._skip_tag:
+                self._skip_depth -= 1
+                if not self._skip_depth:
+                    self._skip_tag = None
+            return
+        node = self.current
+        while node is not self.root and node.tag != tag:
+            node = node.parent
+        if node is not self.root:
+            self.current = node.parent
+
+    def handle_data(self, data):
+        if self._capture:
+            self._captured.append(data)
+        elif self._skip_tag is None:
+            self.current.children.append(data)
+
+def _class_weight(node):
+    weight = 0
+    for value in (node.attrs.get('class', ''), node.attrs.get('id', '')):
+        if value:
+            if NEGATIVE_PATTERN.search(value):
+                weight -= 25
+            if POSITIVE_PATTERN.search(value):
+                weight += 25
+    return weight
+
+def _initial_score(node):
+    score = {'div': 5, 'article': 10, 'main': 5, 'pre': 3, 'td': 3, 'blockquote': 3,
+             'ol': -3, 'ul': -3, 'li': -3, 'dl': -3, 'dd': -3, 'dt': -3, 'th': -5}.get(node.tag, 0)
+    if node.tag in ('h1', 'h2', 'h3', 'h4', 'h5', 'h6'):
+        score = -5
+    return score + _class_weight(node)
+
+def _link_density(node):
+    length = len(node.text())
+    return node.link_text_length() / length if length else 1.0
+
+def _remove_unlikely(root):
+    """去掉class/id明显不是正文的节点（评论、侧栏、分享按钮等）"""
+    for node in list(root.iter()):
+        if node.tag in ('document', 'html', 'body', 'article', 'main') or node.parent is None:
+            continue
+        value = f"{node.attrs.get('class', '')} {node.attrs.get('id', '')}"
+        if NEGATIVE_PATTERN.search(value) and not POSITIVE_PATTERN.search(value):
+            if node in node.parent.children:
+                node.parent.children.remove(node)
+
+def find_main_content(root):
+    """按段落文本给祖先节点打分，返回得分最高的正文容器及其链接密度"""
+    candidates = []
+    for paragraph in root.iter('p', 'pre', 'td', 'div'):
+        # 没有块级子元素的<div>（很多中文网站用<div>和<br>排版正文）按段落处理
+        if paragraph.tag == 'div' and any(
+                isinstance(child, _Node) and child.tag in BLOCK_TAGS for child in paragraph.children):
+            continue
+        text = paragraph.text()
+        if len(text) < 25 or paragraph.parent is None:
+            continue
+        score = 1 + len(PUNCTUATION_PATTERN.findall(text)) + min(len(text) // 100, 3)
+        for level, ancestor in enumerate((paragraph.parent, getattr(paragraph.parent, 'parent', None))):
+            if ancestor is None or ancestor.tag == 'document':
+                continue
+            if ancestor.score is None:
+                ancestor.score = _initial_score(ancestor)
+                candidates.append(ancestor)
+            ancestor.score += score if level == 0 else score / 2
+
+    if not candidates:
+        return None, 1.0
+    best = max(candidates, key=lambda node: node.score * (1 - _link_density(node)))
+    return best, _link_density(best)
+
+def _inline(node, base_url):
+    """行内内容转为markdown"""
+    if isinstance(node, str):
+        return node
+    if node.tag == 'br':
+        return '\n'
+    if node.tag == 'img':
+        src = node.attrs.get('src') or node.attrs.get('data-src')
+        return f"![{node.attrs.get('alt', '')}]({urljoin(base_url, src)})" if src else ''
+    inner = ''.join(_inline(child, base_url) for child in node.children)
+    text = WHITESPACE_PATTERN.sub(' ', inner).strip() if node.tag != 'pre' else inner
+    if not text:
+        return inner if inner.isspace() else ''
+    if node.tag == 'a' and node.attrs.get('href', '').strip() and not node.attrs['href'].startswith('#'):
+        return f"[{text}]({urljoin(base_url, node.attrs['href'].strip())})"
+    if node.tag in ('strong', 'b'):
+        return f"**{text}**"
+    if node.tag in ('em', 'i'):
+        return f"*{text}*"
+    return inner
+
+def _blocks(node, base_url, out):
+    """块级内容转为markdown段落列表"""
+    buffer = []
+
+    def flush():
+        text = WHITESPACE_PATTERN.sub(' ', ''.join(buffer).replace('\n', '\x00')).replace('\x00', '  \n').strip()
+        if text:
+            out.append(text)
+        buffer.clear()
+
+    for child in node.children:
+        if isinstance(child, str) or child.tag not in BLOCK_TAGS:
+            buffer.append(_inline(child, base_url))
+            continue
+        flush()
+        tag = child.tag
+        if tag in ('h1', 'h2', 'h3', 'h4', 'h5', 'h6'):
+            text = child.text()
+            if text:
+                out.append(f"{'#' * int(tag[1])} {text}")
+        elif tag in ('ul', 'ol'):
+            items = [item for item in child.children if isinstance(item, _Node) and item.tag == 'li']
+            lines = []
+            for index, item in enumerate(items, 1):
+                text = WHITESPACE_PATTERN.sub(' ', _inline(item, base_url)).strip()
+                if text:
+                    lines.append(f"{index}. {text}" if tag == 'ol' else f"- {text}")
+            if lines:
+                out.append('\n'.join(lines))
+        elif tag == 'blockquote':
+            quoted = []
+            _blocks(child, base_url, quoted)
+            if quoted:
+                out.append('\n'.join(f"> {line}" for block in quoted for line in block.splitlines()))
+        elif tag == 'pre':
+            out.append(f"```\n{child.text()}\n```")
+        elif tag == 'hr':
+            out.append('---')
+        elif tag == 'table':
+            rows = []
+            for row in child.iter('tr'):
+                cells = [cell.text() for cell in row.children if isinstance(cell, _Node) and cell.tag in ('td', 'th')]
+                if any(cells):
+                    rows.append(' | '.join(cells))
+            if rows:
+                out.append('\n'.join(rows))
+        else:
+            _blocks(child, base_url, out)
+    flush()
+
+def to_markdown(node, base_url):
+    out = []
+    _blocks(node, base_url, out)
+    return '\n\n'.join(out)
+
+def to_text(node):
+    """正文纯文本，块级元素之间空一行（结构化数据中的content字段使用，与Firecrawl返回的正文格式一致）"""
+    paragraphs = []
+    buffer = []
+
+    def flush():
+        text = WHITESPACE_PATTERN.sub(' ', ''.join(buffer)).strip()
+        if text:
+            paragraphs.append(text)
+        buffer.clear()
+
+    # None标记块级元素结束
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        if item is None:
+            flush()
+        elif isinstance(item, str):
+            buffer.append(item)
+        else:
+            if item.tag in BLOCK_TAGS:
+                flush()
+                stack.append(None)
+            elif item.tag == 'br':
+                buffer.append(' ')
+            stack.extend(reversed(item.children))
+    flush()
+    return '\n\n'.join(paragraphs)
+
+def _first_meta(meta, keys):
+    for key in keys:
+        if meta.get(key):
+            return meta[key]
+    return ''
+
+def _json_ld_objects(scripts):
+    objects = []
+    for script in scripts:
+        try:
+            data = json.loads(script)
+        except ValueError:
+            continue
+        stack = [data]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, list):
+                stack.extend(item)
+            elif isinstance(item, dict):
+                objects.append(item)
+                if isinstance(item.get('@graph'), list):
+                    stack.extend(item['@graph'])
+    return objects
+
+def _json_ld_text(value):
+    """JSON-LD中的文本字段：列表取第一项，其他非字符串的值（数字、对象等）视为无效"""
+    if isinstance(value, list):
+        value = value[0] if value else ''
+    return value.strip() if isinstance(value, str) else ''
+
+def _json_ld_author(value):
+    if isinstance(value, list):
+        return ', '.join(filter(None, (_json_ld_author(item) for item in value)))
+    if isinstance(value, dict):
+        return _json_ld_text(value.get('name'))
+    return _json_ld_text(value)
+
+def extract_metadata(parser, root):
+    """从meta标签、JSON-LD、<time>和<h1>中提取标题、日期、作者等"""
+    meta = parser.meta
+    article = {}
+    for item in _json_ld_objects(parser.json_ld):
+        if item.get('headline') or item.get('datePublished'):
+            article = item
+            break
+
+    h1 = next(root.iter('h1'), None)
+    time_node = next((node for node in root.iter('time') if node.attrs.get('datetime')), None)
+    author = _first_meta(meta, AUTHOR_META)
+    if author.startswith('http'):
+        author = ''
+    publisher = article.get('publisher')
+    return {
+        'title': (_first_meta(meta, TITLE_META) or _json_ld_text(article.get('headline'))
+                  or (h1.text() if h1 is not None else '') or parser.title),
+        'publish_date': (_first_meta(meta, DATE_META) or _json_ld_text(article.get('datePublished'))
+                         or (time_node.attrs['datetime'] if time_node is not None else '')),
+        'author': author or _json_ld_author(article.get('author')),
+        'summary': _first_meta(meta, DESCRIPTION_META) or _json_ld_text(article.get('description')),
+        'source': meta.get('og:site_name', '') or (
+            _json_ld_text(publisher.get('name')) if isinstance(publisher, dict) else ''),
+        'category': _first_meta(meta, CATEGORY_META) or _json_ld_text(article.get('articleSection'))
+    }
+
+def map_to_schema(fields, schema):
+    """把本地提取的字段按CONTENT_SCHEMA的字段名输出，schema中没有的字段不输出"""
+    properties = (schema or {}).get('properties') or {}
+    if not properties:
+        return {key: value for key, value in fields.items() if value}
+    data = {}
+    for name in properties:
+        for field, aliases in SCHEMA_FIELD_ALIASES.items():
+            if name.lower() in aliases and fields.get(field):
+                value = fields[field]
+                if properties[name].get('type') == 'array' and isinstance(value, str):
+                    value = [part.strip() for part in value.split(',') if part.strip()]
+                data[name] = value
+                break
+    return data
+
+def _host_without_www(url):
+    host = (urlsplit(url).hostname or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+class LocalArticleExtractor:
+    def __init__(self, session=None, min_chars=None, max_link_density=None):
+        """初始化本地文章提取（不调用Firecrawl）
+
+        直接下载文章页HTML，按段落文本给容器节点打分找出正文（readability的做法），去掉导航、
+        评论、分享等模板内容后转换为markdown；标题、日期、作者等从meta标签和JSON-LD中读取。
+
+        参数:
+            session: 可选，requests.Session，默认使用共享的连接池
+            min_chars: 正文最少字符数（中日韩文字按两个字符计），默认读取config.LOCAL_MIN_CONTENT_CHARS
+            max_link_density: 正文中链接文本占比的上限，超过时通常是列表页而不是文章
+        """
+        self.session = session or shared_session()
+        self.min_chars = min_chars or getattr(config, 'LOCAL_MIN_CONTENT_CHARS', 400)
+        self.max_link_density = max_link_density or getattr(config, 'LOCAL_MAX_LINK_DENSITY', 0.5)
+        self.scheduler = DomainPolitenessScheduler()
+
+    def fetch(self, url):
+        with self.scheduler.slot(url):
+            with span('LocalArticleExtractor.fetch', 'api', url=url):
+                response = self.session.get(url, timeout=config.REQUEST_TIMEOUT)
+        if response.status_code >= 400:
+            raise LocalExtractionFailed(f"status code {response.status_code}")
+        content_type = response.headers.get('Content-Type', 'text/html').lower()
+        if 'html' not in content_type:
+            raise LocalExtractionFailed(f"不是HTML: {content_type}")
+        return response
+
+    def extract(self, url):
+        """提取文章，返回与Firecrawl相同形式的 (markdown, metadata, json数据)
+
+        请求失败或结果未通过质量检查时抛出LocalExtractionFailed。
+        """
+        try:
+            response = self.fetch(url)
+        except LocalExtractionFailed:
+            raise
+        except Exception as e:
+            raise LocalExtractionFailed(f"请求失败: {e}")
+
+        base_url = response.url or url
+        parser = _DocumentParser()
+        parser.feed(decode_html(response))
+        parser.close()
+        fields = extract_metadata(parser, parser.root)
+        _remove_unlikely(parser.root)
+        container, link_density = find_main_content(parser.root)
+
+        if container is None:
+            raise LocalExtractionFailed("没有找到正文段落")
+        content = to_text(container)
+        # 中日韩文字信息密度高，按两个字符计算长度
+        if len(content) + len(CJK_PATTERN.findall(content)) < self.min_chars:
+            raise LocalExtractionFailed(f"正文只有 {len(content)} 个字符")
+        if link_density > self.max_link_density:
+            raise LocalExtractionFailed(f"链接密度 {link_density:.2f} 过高")
+        if not fields['title']:
+            raise LocalExtractionFailed("没有找到标题")
+
+        fields['content'] = content
+        json_data = map_to_schema(fields, config.CONTENT_SCHEMA)
+        missing = [name for name in config.CONTENT_SCHEMA.get('required', []) if not json_data.get(name)]
+        if missing:
+            raise LocalExtractionFailed(f"缺少必填字段: {', '.join(missing)}")
+
+        metadata = {
+            'title': fields['title'],
+            'description': fields['summary'],
+            'language': parser.language,
+            'publishedTime': fields['publish_date'],
+            'author': fields['author'],
+            'ogSiteName': fields['source'],
+            'sourceURL': url,
+            'url': base_url,
+            'statusCode': response.status_code,
+            'extractor': 'local'
+        }
+        return to_markdown(container, base_url), metadata, json_data
+
+class ExtractionRouter:
+    def __init__(self, db_file=None):
+        """按网站记录本地提取的成功率，决定文章先用本地提取还是直接用Firecrawl
+
+        成功和失败次数按LOCAL_ROUTING_DECAY衰减，近期结果权重更高；成功率低于LOCAL_MIN_SUCCESS_RATE的网站
+        直接使用Firecrawl，但每LOCAL_PROBE_EVERY篇文章仍试一次本地提取，网站改版后可以恢复。
+        DYNAMIC_SITES中列出的网站（需要JavaScript渲染）始终使用Firecrawl。
+        """
+        self.db_file = db_file or getattr(config, 'EXTRACTION_ROUTING_DB', 'extraction_routing.db')
+        self.dynamic_sites = {
+            site.lower()[4:] if site.lower().startswith('www.') else site.lower()
+            for site in getattr(config, 'DYNAMIC_SITES', [])
+        }
+        self.min_attempts = getattr(config, 'LOCAL_MIN_ATTEMPTS', 5)
+        self.min_success_rate = getattr(config, 'LOCAL_MIN_SUCCESS_RATE', 0.6)
+        self.probe_every = getattr(config, 'LOCAL_PROBE_EVERY', 20)
+        self.decay = getattr(config, 'LOCAL_ROUTING_DECAY', 0.95)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS site_routing (
+                    site TEXT PRIMARY KEY,
+                    successes REAL NOT NULL DEFAULT 0,
+                    failures REAL NOT NULL DEFAULT 0,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    skipped INTEGER NOT NULL DEFAULT 0,
+                    updated_at TEXT
+                )
+            """)
+            self._conn.commit()
+
+    def use_local(self, url):
+        """这篇文章是否先尝试本地提取"""
+        site = _host_without_www(url)
+        if site in self.dynamic_sites:
+            return False
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT successes, failures, attempts, skipped FROM site_routing WHERE site = ?", (site,)
+            ).fetchone()
+            if row is None or row[2] < self.min_attempts:
+                return True
+            successes, failures, _, skipped = row
+            if successes / max(successes + failures, 1e-9) >= self.min_success_rate:
+                return True
+            skipped += 1
+            self._conn.execute("UPDATE site_routing SET skipped = ? WHERE site = ?", (skipped, site))
+            self._conn.commit()
+        return skipped % self.probe_every == 0
+
+    def record(self, url, success):
+        """记录一次本地提取的结果"""
+        site = _host_without_www(url)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO site_routing (site) VALUES (?)", (site,)
+            )
+            self._conn.execute(
+                "UPDATE site_routing SET successes = successes * ? + ?, failures = failures * ? + ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE site = ?",
+                (self.decay, 1 if success else 0, self.decay, 0 if success else 1,
+                 datetime.now().isoformat(timespec='seconds'), site)
+            )
+            self._conn.commit()
+
+    def stats(self):
+        """各网站的本地提取成功率"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT site, successes, failures, attempts FROM site_routing ORDER BY site"
+            ).fetchall()
+        return {
+            site: {'success_rate': round(successes / max(successes + failures, 1e-9), 3), 'attempts': attempts}
+            for site, successes, failures, attempts in rows
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class LocalExtractionEngine:
+    def __init__(self, extractor=None, router=None):
+        """本地提取和按网站路由的组合，供ContentExtractor使用"""
+        self.extractor = extractor or LocalArticleExtractor()
+        self.router = router or ExtractionRouter()
+
+    def try_extract(self, url):
+        """按路由尝试本地提取，返回 (markdown, metadata, json数据)；不适合本地提取或未通过检查时返回None"""
+        if not self.router.use_local(url):
+            EXTRACTIONS.inc(engine='local', outcome='skipped')
+            return None
+        try:
+            result = self.extractor.extract(url)
+        except LocalExtractionFailed as e:
+            print(f"本地提取未通过检查（{e}），改用Firecrawl")
+            self.router.record(url, False)
+            EXTRACTIONS.inc(engine='local', outcome='failed')
+            return None
+        except Exception as e:
+            # 解析异常的页面同样改用Firecrawl，不影响其他文章
+            print(f"本地提取出错（{type(e).__name__}: {e}），改用Firecrawl")
+            self.router.record(url, False)
+            EXTRACTIONS.inc(engine='local', outcome='failed')
+            return None
+        self.router.record(url, True)
+        EXTRACTIONS.inc(engine='local', outcome='success')
+        print("本地提取成功!")
+        return result
+
+def open_local_extraction():
+    """按配置创建本地提取，EXTRACTION_ENGINE为"auto"时启用，默认"firecrawl"时返回None"""
+    if getattr(config, 'EXTRACTION_ENGINE', 'firecrawl') != 'auto':
+        return None
+    return LocalExtractionEngine()
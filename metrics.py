@@ -0,0 +1,249 @@
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import config
+
+# 延迟直方图的默认分桶（秒）
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, '')) for name in labelnames)
+
+def _format_labels(labelnames, key, extra=()):
+    pairs = [(name, value) for name, value in zip(labelnames, key)] + list(extra)
+    if not pairs:
+        return ''
+    escaped = [(name, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for name, value in pairs]
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        with self._lock:
+            return {key: self._copy(value) for key, value in self._values.items()}
+
+    @staticmethod
+    def _copy(value):
+        return value
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self, values):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value:g}" for key, value in values.items()]
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self, values):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value:g}" for key, value in values.items()]
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    @staticmethod
+    def _copy(value):
+        return {'counts': list(value['counts']), 'sum': value['sum'], 'count': value['count']}
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            state['counts'][bisect.bisect_left(self.buckets, value)] += 1
+            state['sum'] += value
+            state['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """记录代码块的耗时"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def quantile(self, state, q):
+        """按分桶线性插值估计分位数"""
+        if not state['count']:
+            return None
+        rank = q * state['count']
+        cumulative = 0
+        for i, count in enumerate(state['counts']):
+            if count and cumulative + count >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else lower
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def render(self, values):
+        lines = []
+        for key, state in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), state['counts']):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {state['sum']:g}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {state['count']}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        """指标注册表：计数器、仪表和延迟直方图，可导出为Prometheus文本或JSON摘要"""
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def snapshot(self):
+        """当前所有指标的原始值，用于计算某个批次期间的增量"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    def render_prometheus(self):
+        """Prometheus文本格式"""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render(metric.snapshot()))
+        return '\n'.join(lines) + '\n'
+
+    def summary(self, baseline=None):
+        """JSON摘要：计数器和直方图为相对baseline的增量，仪表为当前值，直方图给出次数、平均值和分位数"""
+        baseline = baseline or {}
+        summary = {}
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            before = baseline.get(metric.name, {})
+            entries = []
+            for key, value in metric.snapshot().items():
+                labels = dict(zip(metric.labelnames, key))
+                if metric.kind == 'counter':
+                    delta = value - before.get(key, 0)
+                    if delta:
+                        entries.append(dict(labels, value=delta))
+                elif metric.kind == 'gauge':
+                    entries.append(dict(labels, value=value))
+                else:
+                    previous = before.get(key, {'counts': [0] * len(value['counts']), 'sum': 0.0, 'count': 0})
+                    state = {
+                        'counts': [now - then for now, then in zip(value['counts'], previous['counts'])],
+                        'sum': value['sum'] - previous['sum'],
+                        'count': value['count'] - previous['count']
+                    }
+                    if state['count']:
+                        entries.append(dict(
+                            labels,
+                            count=state['count'],
+                            mean=round(state['sum'] / state['count'], 4),
+                            p50=round(metric.quantile(state, 0.5), 4),
+                            p90=round(metric.quantile(state, 0.9), 4),
+                            p99=round(metric.quantile(state, 0.99), 4)
+                        ))
+            if entries:
+                summary[metric.name] = entries
+        return summary
+
+REGISTRY = Registry()
+
+# 各步骤共用的指标
+API_REQUESTS = REGISTRY.counter('agrinews_api_requests_total', 'API调用次数', ('api', 'method', 'outcome'))
+API_LATENCY = REGISTRY.histogram('agrinews_api_request_seconds', 'API调用耗时', ('api', 'method'))
+API_RETRIES = REGISTRY.counter('agrinews_api_retries_total', '因速率限制重试的次数', ('api',))
+API_RATE_LIMITED = REGISTRY.counter('agrinews_api_rate_limited_total', '遇到速率限制的次数', ('api',))
+API_CONCURRENCY_LIMIT = REGISTRY.gauge('agrinews_api_concurrency_limit', '限流器当前的并发上限', ('api',))
+LINK_FUNNEL = REGISTRY.counter('agrinews_links_total', '链接漏斗：mapped -> filtered -> new -> valid -> extracted',
+                               ('stage', 'homepage'))
+HOMEPAGE_LATENCY = REGISTRY.histogram('agrinews_homepage_seconds', '检查单个主页的耗时', ('homepage',))
+VERDICTS = REGISTRY.counter('agrinews_verdicts_total', '链接验证结果的来源', ('source',))
+BYTES_WRITTEN = REGISTRY.counter('agrinews_bytes_written_total', '写入的字节数', ('target',))
+EXTRACTIONS = REGISTRY.counter('agrinews_extractions_total', '步骤3各提取方式的结果', ('engine', 'outcome'))
+HOMEPAGE_CHANGES = REGISTRY.counter('agrinews_homepage_checks_total', '主页变化预检的结果（未变化时跳过map_url）', ('result',))
+
+def homepage_label(homepage_url):
+    """按主页区分的标签值；METRICS_PER_HOMEPAGE为False时不区分主页，避免主页很多时序列过多"""
+    return homepage_url if getattr(config, 'METRICS_PER_HOMEPAGE', True) else ''
+
+def record_funnel(stage, count, homepage_url=''):
+    if count:
+        LINK_FUNNEL.inc(count, stage=stage, homepage=homepage_label(homepage_url))
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = REGISTRY.render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_http_server(port, host='127.0.0.1'):
+    """在后台线程中启动/metrics接口，返回服务器对象"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"指标接口已启动: http://{host}:{server.server_port}/metrics")
+    return server
+
+def write_summary(name, baseline=None, directory=None):
+    """把本批次期间的指标摘要写入 <METRICS_DIR>/<name>.json，返回文件路径"""
+    directory = directory or getattr(config, 'METRICS_DIR', 'metrics')
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{name}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(REGISTRY.summary(baseline), f, ensure_ascii=False, indent=2)
+    return path
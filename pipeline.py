@@ -0,0 +1,222 @@
+import queue
+import threading
+import time
+from datetime import datetime
+import config
+from run_journal import RunJournal, journal_path
+from tracing import traced
+
+# 队列结束标记
+_DONE = object()
+
+class StreamingPipeline:
+    def __init__(self, homepage_monitor, link_validator, content_extractor,
+                 queue_size=None, validation_workers=None, extraction_workers=None):
+        """初始化流式处理流水线
+
+        步骤1每发现一个主页的新链接，就立即放入链接队列；步骤2的工作线程从链接队列取出链接验证，
+        有效链接放入文章队列；步骤3的工作线程从文章队列取出链接提取内容。
+        队列有容量上限，下游处理不过来时上游会阻塞等待（背压）。
+        三个步骤的批次文件仍然照常写入，便于追溯。
+
+        参数:
+            queue_size: 每个队列的容量上限
+            validation_workers: 步骤2的工作线程数
+            extraction_workers: 步骤3的工作线程数
+        """
+        self.homepage_monitor = homepage_monitor
+        self.link_validator = link_validator
+        self.content_extractor = content_extractor
+        self.queue_size = queue_size or getattr(config, 'PIPELINE_QUEUE_SIZE', 100)
+        self.validation_workers = validation_workers or getattr(config, 'VALIDATION_WORKERS', 1)
+        self.extraction_workers = extraction_workers or content_extractor.workers
+
+        self._lock = threading.Lock()
+
+    def _on_new_links(self, homepage_url, record):
+        """步骤1的回调：把新链接放入链接队列（队列满时阻塞）"""
+        with self._lock:
+            if self._first_link_at is None:
+                self._first_link_at = time.monotonic()
+            self._homepage_order.append(homepage_url)
+            self._validations[homepage_url] = {
+                'note': record.get('note', ''),
+                'source': record.get('source', ''),
+                'validated_links': [None] * len(record['new_links']),
+                'original_timestamp': record.get('timestamp', '')
+            }
+        for index, link in enumerate(record['new_links']):
+            self._link_queue.put((homepage_url, record, index, link))
+
+    def _validation_worker(self):
+        """步骤2的工作线程"""
+        try:
+            while True:
+                item = self._link_queue.get()
+                if item is _DONE:
+                    break
+                homepage_url, record, index, link = item
+                try:
+                    self._validate_item(homepage_url, record, index, link)
+                except Exception as e:
+                    # 单个链接出错不影响其余链接
+                    print(f"流式验证链接时出错 {link}: {e}")
+        finally:
+            # 最后一个验证线程结束时通知所有提取线程（线程异常退出时也要通知，否则提取线程会一直等待）
+            with self._lock:
+                self._active_validators -= 1
+                last_validator = self._active_validators == 0
+            if last_validator:
+                for _ in range(self.extraction_workers):
+                    self._article_queue.put(_DONE)
+
+    def _validate_item(self, homepage_url, record, index, link):
+        """验证单个链接，有效链接放入文章队列"""
+        result = self.link_validator.resolve_link(link, homepage_url, record.get('link_texts', {}).get(link, ""))
+        if not result:
+            return
+        with self._lock:
+            self._validations[homepage_url]['validated_links'][index] = {
+                'url': link,
+                'validation': result
+            }
+        if self.content_extractor.is_extractable(result):
+            order_key = (self._homepage_rank.get(homepage_url, len(self._homepage_rank)), index)
+            self._article_queue.put((order_key, {
+                'url': link,
+                'source': record.get('source', ''),
+                'note': record.get('note', ''),
+                'score': result.get('score', 0),
+                'reason': result.get('reason', ''),
+                'homepage': homepage_url
+            }))
+
+    def _extraction_worker(self):
+        """步骤3的工作线程"""
+        while True:
+            item = self._article_queue.get()
+            if item is _DONE:
+                break
+            order_key, link_data = item
+            print(f"\n流式提取: {link_data['url']}")
+            try:
+                result = self.content_extractor.extract_single(link_data)
+            except Exception as e:
+                # 单篇文章出错时记录错误结果，继续处理队列中的其余文章
+                print(f"流式提取内容时出错 {link_data['url']}: {e}")
+                result = {
+                    "error": str(e),
+                    "source": link_data.get('source', ''),
+                    "note": link_data.get('note', ''),
+                    "validation_score": link_data.get('score', 0),
+                    "validation_reason": link_data.get('reason', '')
+                }
+            with self._lock:
+                if self._first_article_at is None and 'error' not in result:
+                    self._first_article_at = time.monotonic()
+                self._extractions[link_data['url']] = (order_key, result)
+                journal = self._open_journal()
+            if journal is not None:
+                try:
+                    journal.record(link_data['url'], result)
+                except Exception as e:
+                    print(f"写入检查点日志时出错 {link_data['url']}: {e}")
+
+    def _open_journal(self):
+        """第一篇文章提取完成时才创建结果目录和检查点日志（调用方需持有self._lock）
+
+        创建失败时返回None，下一篇文章再重试；结果仍保存在内存中，运行结束时照常写入最终结果。
+        """
+        if self._journal is None:
+            try:
+                if self._results_dir is None:
+                    self._results_dir = self.content_extractor.new_results_dir()
+                self._journal = RunJournal(journal_path(self._results_dir), header={
+                    'mode': 'stream',
+                    'batch_id': self._batch_id
+                })
+            except Exception as e:
+                print(f"创建检查点日志时出错: {e}")
+        return self._journal
+
+    @traced('StreamingPipeline.run')
+    def run(self, max_workers=None):
+        """运行流式处理流水线
+
+        参数:
+            max_workers: 步骤1并发检查主页的工作线程数
+
+        返回:
+            (批次ID, 结果目录)，没有发现新链接时批次ID为None
+        """
+        batch_id = self.homepage_monitor.new_batch_id()
+        urls_info = self.homepage_monitor.read_homepage_urls()
+        # 结果按主页在Excel中的顺序排列（并发检查时主页发现新链接的先后顺序不固定）
+        self._homepage_rank = {homepage_url: rank for rank, homepage_url in enumerate(urls_info)}
+        self._link_queue = queue.Queue(maxsize=self.queue_size)
+        self._article_queue = queue.Queue(maxsize=self.queue_size)
+        self._validations = {}
+        self._homepage_order = []
+        self._extractions = {}
+        self._active_validators = self.validation_workers
+        self._first_link_at = None
+        self._first_article_at = None
+        self._results_dir = None
+        self._journal = None
+        self._batch_id = batch_id
+        started_at = time.monotonic()
+        print(f"启动流式处理，批次ID: {batch_id}，验证线程 {self.validation_workers} 个，"
+              f"提取线程 {self.extraction_workers} 个，队列容量 {self.queue_size}")
+
+        workers = [threading.Thread(target=self._validation_worker, daemon=True)
+                   for _ in range(self.validation_workers)]
+        workers += [threading.Thread(target=self._extraction_worker, daemon=True)
+                    for _ in range(self.extraction_workers)]
+        for worker in workers:
+            worker.start()
+
+        try:
+            saved_batch_id = self.homepage_monitor.check_for_new_links(
+                max_workers, on_new_links=self._on_new_links, batch_id=batch_id, urls_info=urls_info
+            )
+        finally:
+            for _ in range(self.validation_workers):
+                self._link_queue.put(_DONE)
+            for worker in workers:
+                worker.join()
+            if self._journal is not None:
+                self._journal.close()
+
+        if not self._homepage_order:
+            return None, None
+        if not saved_batch_id:
+            # 新链接没有写入批次日志，已完成的验证和提取结果仍按预先生成的批次ID保存
+            print(f"新链接保存失败，验证和提取结果仍按批次ID {batch_id} 保存")
+            saved_batch_id = batch_id
+
+        # 写入与分步运行相同格式的批次文件
+        validation_results = {}
+        homepage_order = sorted(self._homepage_order,
+                                key=lambda url: self._homepage_rank.get(url, len(self._homepage_rank)))
+        for homepage_url in homepage_order:
+            entry = self._validations[homepage_url]
+            entry['validated_links'] = [link for link in entry['validated_links'] if link]
+            validation_results[homepage_url] = entry
+        self.link_validator._save_valid_links(validation_results, saved_batch_id)
+
+        # 按主页和链接的原有顺序整理提取结果
+        results = {
+            url: result
+            for url, (order_key, result) in sorted(self._extractions.items(), key=lambda item: item[1][0])
+        }
+        results_dir = self._results_dir
+        if results and results_dir is None:
+            results_dir = self.content_extractor.new_results_dir()
+        if results:
+            self.content_extractor.save_final_results(results, results_dir)
+
+        print(f"流式处理完成，共提取 {len(results)} 篇文章，总耗时 {time.monotonic() - started_at:.1f} 秒")
+        if self._first_link_at is not None and self._first_article_at is not None:
+            print(f"从发现首个新链接到提取首篇文章耗时 {self._first_article_at - self._first_link_at:.1f} 秒")
+        print(f"完成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        return saved_batch_id, results_dir
@@ -0,0 +1,61 @@
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+import config
+from tracing import traced_sleep
+
+class DomainPolitenessScheduler:
+    def __init__(self, min_interval=None):
+        """初始化按域名的礼貌访问调度器
+
+        参数:
+            min_interval: 同一域名两次请求之间的最小间隔（秒）
+
+        全局并发上限由rate_limiter中的共享限流器负责，这里只处理同一域名的访问间隔。
+        """
+        if min_interval is None:
+            min_interval = getattr(config, 'DOMAIN_MIN_INTERVAL', config.BATCH_PAUSE_TIME)
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._domain_locks = {}
+        self._last_access = {}
+
+    @staticmethod
+    def domain_of(url):
+        """提取URL的域名（忽略www前缀）"""
+        host = urlparse(url).netloc.lower()
+        if host.startswith('www.'):
+            host = host[4:]
+        return host
+
+    def group_by_domain(self, urls):
+        """按域名分组URL，保持原有顺序"""
+        groups = {}
+        for url in urls:
+            groups.setdefault(self.domain_of(url), []).append(url)
+        return groups
+
+    def _get_domain_lock(self, domain):
+        with self._lock:
+            if domain not in self._domain_locks:
+                self._domain_locks[domain] = threading.Lock()
+            return self._domain_locks[domain]
+
+    @contextmanager
+    def slot(self, url):
+        """获取访问某个URL的许可
+
+        同一域名的请求串行执行且间隔不小于min_interval，不同域名的请求互不影响。
+        """
+        domain = self.domain_of(url)
+        with self._get_domain_lock(domain):
+            last_access = self._last_access.get(domain)
+            if last_access is not None:
+                wait_time = last_access + self.min_interval - time.monotonic()
+                if wait_time > 0:
+                    traced_sleep(wait_time, 'domain_interval')
+            try:
+                yield
+            finally:
+                self._last_access[domain] = time.monotonic()
@@ -0,0 +1,143 @@
+import heapq
+import time
+from datetime import datetime, timedelta
+import config
+from metrics import REGISTRY, write_summary
+from tracing import traced_sleep
+
+class AdaptivePollScheduler:
+    def __init__(self, monitor, default_minutes=None, min_minutes=None, max_minutes=None,
+                 target_new_links=None, lookback_days=None):
+        """初始化按主页自适应间隔的定时检查
+
+        每个主页的下次检查时间按它最近的新链接出现速度计算：预计出现target_new_links个新链接所需的时间，
+        限制在[min_minutes, max_minutes]之间，且每次最多变为上次间隔的两倍。所有主页按下次检查时间放在优先队列（堆）中，
+        守护进程每次只在最早到期的主页到期时醒来，同时到期的主页合并为一个批次检查。
+        下次检查时间从本次的计划时间而不是检查结束时间算起，检查耗时不会让计划逐渐推迟。
+
+        参数:
+            monitor: HomepageMonitor
+            default_minutes: 还没有足够历史的主页使用的间隔，默认读取config.POLL_DEFAULT_MINUTES
+            min_minutes: 间隔下限，默认读取config.POLL_MIN_MINUTES
+            max_minutes: 间隔上限，默认读取config.POLL_MAX_MINUTES
+            target_new_links: 希望每次检查平均发现的新链接数，默认读取config.POLL_TARGET_NEW_LINKS
+            lookback_days: 统计新链接出现速度的时间范围（天），默认读取config.POLL_LOOKBACK_DAYS
+        """
+        self.monitor = monitor
+        self.min_interval = (min_minutes or getattr(config, 'POLL_MIN_MINUTES', 15)) * 60
+        self.max_interval = (max_minutes or getattr(config, 'POLL_MAX_MINUTES', 24 * 60)) * 60
+        default = (default_minutes or getattr(config, 'POLL_DEFAULT_MINUTES', 60)) * 60
+        self.default_interval = min(max(default, self.min_interval), self.max_interval)
+        self.target_new_links = target_new_links or getattr(config, 'POLL_TARGET_NEW_LINKS', 1)
+        self.lookback = timedelta(days=lookback_days or getattr(config, 'POLL_LOOKBACK_DAYS', 14))
+        # 堆中的元素为 (计划时间, 序号, 主页URL)，计划时间为time.monotonic()的时间
+        self._heap = []
+        self._due = {}
+        self._intervals = {}
+        self._counter = 0
+
+    def interval_for(self, homepage_url):
+        """根据最近的新链接出现速度计算主页的检查间隔（秒）
+
+        速度按 新链接数 / 观察时间 估计，分母加一平滑：刚开始观察、还没有新链接的主页不会立即降到最长间隔，
+        观察时间越长而一直没有新链接，间隔才逐渐变长。
+        """
+        now = datetime.now()
+        count, start = self.monitor.link_store.arrivals(homepage_url, now - self.lookback)
+        if start is None:
+            return self.default_interval
+        observed = (now - start).total_seconds()
+        # 观察时间不到一个默认间隔时速度估计不可靠
+        if observed < self.default_interval:
+            return self.default_interval
+        interval = self.target_new_links * observed / (count + 1)
+        previous = self._intervals.get(homepage_url)
+        if previous is not None:
+            interval = min(interval, previous * 2)
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def _push(self, homepage_url, due):
+        self._counter += 1
+        self._due[homepage_url] = due
+        heapq.heappush(self._heap, (due, self._counter, homepage_url))
+
+    def sync(self, urls_info, now=None):
+        """与Excel中的主页列表同步：新增的主页立即到期，已删除的主页出队时丢弃"""
+        now = time.monotonic() if now is None else now
+        for homepage_url in urls_info:
+            if homepage_url not in self._due:
+                self._push(homepage_url, now)
+
+    def pop_due(self, urls_info, now=None):
+        """取出所有已到期且仍在Excel中的主页，返回 {主页URL: 信息}"""
+        now = time.monotonic() if now is None else now
+        due_urls = {}
+        while self._heap and self._heap[0][0] <= now:
+            due, _, homepage_url = heapq.heappop(self._heap)
+            if self._due.get(homepage_url) != due:
+                continue
+            if homepage_url not in urls_info:
+                del self._due[homepage_url]
+                self._intervals.pop(homepage_url, None)
+                continue
+            due_urls[homepage_url] = urls_info[homepage_url]
+        return due_urls
+
+    def reschedule(self, homepage_urls, now=None):
+        """检查完成后按新的间隔安排下次检查
+
+        下次时间 = 本次计划时间 + 间隔；如果因为检查耗时已经错过，顺延到下一个未错过的时间点。
+        """
+        now = time.monotonic() if now is None else now
+        for homepage_url in homepage_urls:
+            try:
+                interval = self.interval_for(homepage_url)
+            except Exception as e:
+                print(f"计算 {homepage_url} 的检查间隔时出错: {e}")
+                interval = self._intervals.get(homepage_url, self.default_interval)
+            self._intervals[homepage_url] = interval
+            due = self._due.get(homepage_url, now) + interval
+            if due <= now:
+                due += interval * ((now - due) // interval + 1)
+            self._push(homepage_url, due)
+            print(f"{homepage_url} 下次检查间隔 {interval / 60:.0f} 分钟")
+
+    def next_wakeup(self):
+        """距离最早到期的主页还有多少秒，队列为空时返回None"""
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - time.monotonic())
+
+    def run_once(self, urls_info):
+        """检查所有已到期的主页（合并为一个批次），返回批次ID"""
+        self.sync(urls_info)
+        due_urls = self.pop_due(urls_info)
+        if not due_urls:
+            return None
+
+        print(f"\n开始检查 {len(due_urls)} 个到期的主页 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        baseline = REGISTRY.snapshot()
+        try:
+            batch_id = self.monitor.check_for_new_links(urls_info=due_urls)
+        except Exception as e:
+            # 出错的主页照常安排下次检查，守护进程继续运行
+            print(f"检查主页时出错: {e}")
+            batch_id = None
+        self.reschedule(due_urls)
+        if batch_id:
+            print(f"本批次指标摘要已保存到: {write_summary(batch_id, baseline)}")
+        print(f"检查完成 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        return batch_id
+
+    def run_forever(self):
+        """守护进程：每次在最早到期的主页到期时醒来检查，每轮重新读取Excel中的主页列表"""
+        while True:
+            urls_info = self.monitor.read_homepage_urls()
+            self.run_once(urls_info)
+            wait_time = self.next_wakeup()
+            if wait_time is None:
+                wait_time = self.default_interval
+                print(f"没有要监控的主页，{wait_time / 60:.0f} 分钟后重新读取")
+            else:
+                print(f"下一个主页 {wait_time / 60:.1f} 分钟后到期...")
+            traced_sleep(wait_time, 'poll_schedule')
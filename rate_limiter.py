@@ -0,0 +1,206 @@
+import re
+import threading
+import time
+import config
+from metrics import API_REQUESTS, API_LATENCY, API_RETRIES, API_RATE_LIMITED, API_CONCURRENCY_LIMIT
+from tracing import TRACER
+
+# 判断速率限制错误的关键字（Firecrawl返回"Rate limit exceeded"，DashScope返回Throttling错误码）
+RATE_LIMIT_MARKERS = ('rate limit exceeded', 'too many requests', 'status code 429', 'throttling')
+
+RETRY_AFTER_PATTERN = re.compile(r'retry after (\d+(?:\.\d+)?)\s*s', re.IGNORECASE)
+
+def is_rate_limit_error(error):
+    """判断异常或错误信息是否为速率限制"""
+    text = str(error).lower()
+    return any(marker in text for marker in RATE_LIMIT_MARKERS)
+
+def parse_retry_after(error):
+    """从错误信息中提取建议的等待秒数，无法提取时返回None"""
+    match = RETRY_AFTER_PATTERN.search(str(error))
+    if match:
+        return float(match.group(1))
+    return None
+
+def is_dashscope_throttled(response):
+    """判断DashScope响应是否被限流"""
+    return response.status_code == 429 or 'throttling' in str(getattr(response, 'code', '') or '').lower()
+
+class AdaptiveRateLimiter:
+    def __init__(self, name, requests_per_minute, max_concurrency, min_concurrency=1,
+                 max_retries=None, increase_step=1.0, decrease_factor=0.5, backoff_time=15):
+        """初始化自适应限流器
+
+        令牌桶控制请求速率，AIMD算法控制并发数：
+        调用成功时并发上限缓慢增加，遇到速率限制时并发上限减半并暂停发放令牌。
+
+        参数:
+            name: 限流器名称，用于日志输出
+            requests_per_minute: 每分钟允许的请求数，为None或0时不限速
+            max_concurrency: 并发上限的最大值（通常为套餐的并发限制）
+            min_concurrency: 并发上限的最小值
+            max_retries: 遇到速率限制时的最大重试次数
+            increase_step: 每一轮成功调用后并发上限的增量
+            decrease_factor: 遇到速率限制时并发上限的缩减系数
+            backoff_time: 无法从错误信息中获取等待时间时的基础退避时间（秒）
+        """
+        self.name = name
+        self.rate = requests_per_minute / 60.0 if requests_per_minute else None
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.min_concurrency = max(1, min(int(min_concurrency), self.max_concurrency))
+        self.max_retries = config.MAX_RETRIES if max_retries is None else max_retries
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.backoff_time = backoff_time
+
+        # 令牌桶容量等于并发上限，允许短时间的突发请求
+        self.capacity = float(self.max_concurrency)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+
+        self.concurrency_limit = float(self.max_concurrency)
+        self._in_flight = 0
+        self._cond = threading.Condition()
+
+        self.stats = {'calls': 0, 'successes': 0, 'rate_limited': 0, 'retries': 0}
+
+    def _refill(self, now):
+        if self.rate is None:
+            self._tokens = self.capacity
+        else:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def acquire(self):
+        """等待直到获得一个令牌和一个并发名额"""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._blocked_until:
+                    wait_time = self._blocked_until - now
+                elif self._in_flight >= int(self.concurrency_limit):
+                    wait_time = None  # 等待其他调用释放名额
+                elif self._tokens < 1:
+                    wait_time = (1 - self._tokens) / self.rate
+                else:
+                    self._tokens -= 1
+                    self._in_flight += 1
+                    self.stats['calls'] += 1
+                    return
+                self._cond.wait(wait_time)
+
+    def release(self, outcome='success', retry_after=None):
+        """释放并发名额，并根据调用结果调整并发上限
+
+        参数:
+            outcome: 'success'（成功）、'throttled'（被限流）或'error'（其他错误）
+            retry_after: 被限流时服务端建议的等待秒数
+        """
+        with self._cond:
+            self._in_flight -= 1
+            if outcome == 'success':
+                self.stats['successes'] += 1
+                # 加性增：每完成一轮（约concurrency_limit次）成功调用，上限增加increase_step
+                self.concurrency_limit = min(
+                    float(self.max_concurrency),
+                    self.concurrency_limit + self.increase_step / self.concurrency_limit
+                )
+            elif outcome == 'throttled':
+                self.stats['rate_limited'] += 1
+                API_RATE_LIMITED.inc(api=self.name)
+                # 乘性减：并发上限缩减，同时暂停发放令牌
+                self.concurrency_limit = max(
+                    float(self.min_concurrency),
+                    self.concurrency_limit * self.decrease_factor
+                )
+                if retry_after is not None:
+                    self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+                self._tokens = 0
+            API_CONCURRENCY_LIMIT.set(int(self.concurrency_limit), api=self.name)
+            self._cond.notify_all()
+
+    def _observe(self, method, started, outcome):
+        """记录一次API调用的耗时和结果"""
+        API_LATENCY.observe(time.perf_counter() - started, api=self.name, method=method)
+        API_REQUESTS.inc(api=self.name, method=method, outcome=outcome)
+
+    def call(self, func, *args, is_throttled=None, **kwargs):
+        """在限流控制下调用func，遇到速率限制时自动退避重试
+
+        参数:
+            func: 要调用的API函数
+            is_throttled: 可选，判断返回值是否表示被限流的函数（用于不抛出异常的客户端）
+        """
+        retry_count = 0
+        method = getattr(func, '__name__', 'call')
+        url = next((arg for arg in args if isinstance(arg, str) and arg.startswith('http')), '')
+        while True:
+            with TRACER.span(f"{self.name}.acquire", 'wait'):
+                self.acquire()
+            started = time.perf_counter()
+            try:
+                with TRACER.span(f"{self.name}.{method}", 'api', url=url, attempt=retry_count):
+                    result = func(*args, **kwargs)
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    self._observe(method, started, 'error')
+                    self.release('error')
+                    raise
+                self._observe(method, started, 'throttled')
+                retry_after = parse_retry_after(e)
+                if retry_count >= self.max_retries:
+                    self.release('throttled', retry_after)
+                    print(f"[{self.name}] 达到最大重试次数，放弃请求")
+                    raise
+            else:
+                if is_throttled is None or not is_throttled(result):
+                    self._observe(method, started, 'success')
+                    self.release('success')
+                    return result
+                self._observe(method, started, 'throttled')
+                retry_after = None
+                if retry_count >= self.max_retries:
+                    self.release('throttled')
+                    print(f"[{self.name}] 达到最大重试次数，放弃请求")
+                    return result
+
+            retry_count += 1
+            self.stats['retries'] += 1
+            API_RETRIES.inc(api=self.name)
+            if retry_after is None:
+                retry_after = self.backoff_time * retry_count  # 15, 30, 45 秒等
+            self.release('throttled', retry_after)
+            print(f"[{self.name}] 达到速率限制，并发上限降至 {int(self.concurrency_limit)}，"
+                  f"{retry_after:g} 秒后进行第 {retry_count} 次重试...")
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(api_key, name, requests_per_minute, max_concurrency):
+    """获取某个服务和API密钥对应的限流器，同一服务的同一密钥在所有步骤间共享同一个实例
+
+    按 (服务名, 密钥) 区分：不同服务即使密钥相同，速率和并发限制也互不影响。
+    """
+    key = (name, api_key)
+    with _limiters_lock:
+        if key not in _limiters:
+            _limiters[key] = AdaptiveRateLimiter(name, requests_per_minute, max_concurrency)
+        return _limiters[key]
+
+def firecrawl_limiter():
+    """Firecrawl API的共享限流器"""
+    return get_limiter(
+        config.API_KEY, 'Firecrawl',
+        getattr(config, 'FIRECRAWL_REQUESTS_PER_MINUTE', 10),
+        getattr(config, 'FIRECRAWL_MAX_CONCURRENCY', 2)
+    )
+
+def dashscope_limiter():
+    """DashScope（通义千问）API的共享限流器"""
+    return get_limiter(
+        config.DASHSCOPE_API_KEY, 'DashScope',
+        getattr(config, 'DASHSCOPE_REQUESTS_PER_MINUTE', 60),
+        getattr(config, 'DASHSCOPE_MAX_CONCURRENCY', 5)
+    )
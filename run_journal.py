@@ -0,0 +1,86 @@
+import json
+import os
+import threading
+from datetime import datetime
+from metrics import BYTES_WRITTEN
+from tracing import traced
+
+# 结果目录中的检查点日志文件名
+JOURNAL_FILE_NAME = 'journal.jsonl'
+
+def journal_path(results_dir):
+    """结果目录对应的检查点日志路径"""
+    return os.path.join(results_dir, JOURNAL_FILE_NAME)
+
+class RunJournal:
+    def __init__(self, path, header=None):
+        """初始化追加写入的检查点日志
+
+        第一行是运行信息（type为run），之后每处理完一个URL追加一行结果（type为result）。
+        每条记录写入后立即刷新，代价只与这一条结果的大小有关，与已处理的数量无关。
+
+        参数:
+            path: 日志文件路径
+            header: 运行信息，新建日志时写入第一行
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            self._truncate_partial_line(path)
+        is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, 'a', encoding='utf-8')
+        if is_new and header is not None:
+            header = dict(header, type='run', started_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            self._append(header)
+
+    @staticmethod
+    def _truncate_partial_line(path):
+        """去掉进程中断时留下的不完整最后一行，避免恢复运行时追加的记录与其拼在一起"""
+        with open(path, 'r+b') as f:
+            data = f.read()
+            if data and not data.endswith(b'\n'):
+                f.truncate(data.rfind(b'\n') + 1)
+
+    def _append(self, record):
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+        BYTES_WRITTEN.inc(len(line.encode('utf-8')), target='journal')
+
+    @traced('RunJournal.record', 'io')
+    def record(self, url, result):
+        """追加一个URL的处理结果"""
+        self._append({'type': 'result', 'url': url, 'result': result})
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+def read_journal_header(path):
+    """只读取检查点日志的运行信息（第一行）"""
+    with open(path, 'r', encoding='utf-8') as f:
+        line = f.readline()
+    if not line.endswith('\n'):
+        return {}
+    record = json.loads(line)
+    return record if record.get('type') == 'run' else {}
+
+def read_journal(path):
+    """读取检查点日志，返回 (运行信息, 按URL整理的结果)
+
+    同一URL出现多次时以最后一次为准（例如恢复运行时重试成功），位置保持第一次出现的顺序。
+    进程中断时可能留下不完整的最后一行，读取时跳过。
+    """
+    header = {}
+    results = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.endswith('\n'):
+                break
+            record = json.loads(line)
+            if record.get('type') == 'run':
+                header = record
+            elif record.get('type') == 'result':
+                results[record['url']] = record['result']
+    return header, results
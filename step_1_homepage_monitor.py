@@ -1,67 +1,63 @@
 from firecrawl.firecrawl import FirecrawlApp
 import config
-import json
 import pandas as pd
 from datetime import datetime
-import time
-import os
 import random
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from politeness import DomainPolitenessScheduler
+from rate_limiter import firecrawl_limiter, is_rate_limit_error
+from link_store import open_link_history
+from change_detector import open_change_detector
+from discovery import open_feed_discovery
+from html_links import open_html_discovery
+from batch_log import BatchLog, log_dir_for
+from url_filter import canonicalize_url, filter_for_homepage
+from metrics import REGISTRY, HOMEPAGE_LATENCY, homepage_label, record_funnel, start_http_server, write_summary
+from tracing import traced, traced_sleep
+from poll_scheduler import AdaptivePollScheduler
 
 class HomepageMonitor:
     def __init__(self, excel_path, cache_file="link_cache.json", new_links_file="new_links.json"):
         """初始化监控器"""
         self.app = FirecrawlApp(api_key=config.API_KEY)
+        self.rate_limiter = firecrawl_limiter()
         self.excel_path = excel_path
         self.cache_file = cache_file
         self.new_links_file = new_links_file
-        self.link_history = self._load_link_history()
+        self.new_links_log = BatchLog(log_dir_for(new_links_file), legacy_file=new_links_file)
+        self.link_store = open_link_history(cache_file)
+        self.change_detector = open_change_detector()
+        self.discovery = open_feed_discovery()
+        self.html_discovery = open_html_discovery()
 
-    def _load_link_history(self):
-        """加载历史链接缓存"""
-        try:
-            if os.path.exists(self.cache_file):
-                with open(self.cache_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            return {}
-        except Exception as e:
-            print(f"加载历史链接缓存时出错: {e}")
-            return {}
+    @staticmethod
+    def new_batch_id():
+        """生成batch_id"""
+        return f"batch_{datetime.now().strftime('%Y%m%d%H%M%S')}"
 
-    def _save_link_history(self):
-        """保存历史链接缓存"""
+    @traced('HomepageMonitor.save_new_links', 'io')
+    def _save_new_links(self, new_links_data, batch_id=None):
+        """保存新发现的链接（追加到批次日志），返回批次ID"""
         try:
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(self.link_history, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"保存历史链接缓存时出错: {e}")
+            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            if batch_id is None:
+                batch_id = self.new_batch_id()
 
-    def _save_new_links(self, new_links_data):
-        """保存新发现的链接"""
-        try:
-            # 读取现有的新链接数据（如果存在）
-            existing_data = {}
-            if os.path.exists(self.new_links_file):
-                with open(self.new_links_file, 'r', encoding='utf-8') as f:
-                    existing_data = json.load(f)
+            # 为每个homepage_url的数据添加batch_id
+            for homepage_url in new_links_data:
+                new_links_data[homepage_url]['batch_id'] = batch_id
+
+            self.new_links_log.append({
+                'timestamp': timestamp,
+                'batch_id': batch_id,
+                'data': new_links_data
+            })
 
-            # 更新数据
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            # 生成batch_id
-            batch_id = f"batch_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-            
-            if timestamp not in existing_data:
-                # 为每个homepage_url的数据添加batch_id
-                for homepage_url in new_links_data:
-                    new_links_data[homepage_url]['batch_id'] = batch_id
-                existing_data[timestamp] = new_links_data
-
-            # 保存更新后的数据
-            with open(self.new_links_file, 'w', encoding='utf-8') as f:
-                json.dump(existing_data, f, ensure_ascii=False, indent=2)
-                
             print(f"新链接已保存，批次ID: {batch_id}")
+            return batch_id
         except Exception as e:
             print(f"保存新链接时出错: {e}")
+            return None
 
     def read_homepage_urls(self):
         """从Excel文件读取主页URL"""
@@ -96,180 +92,276 @@ class HomepageMonitor:
                 if retry_count > 0:
                     wait_time = config.RETRY_DELAY * (1 + retry_count)
                     print(f"第 {retry_count} 次重试，等待 {wait_time} 秒...")
-                    time.sleep(wait_time)
+                    traced_sleep(wait_time, 'retry_delay')
                 
                 print(f"正在使用map方法获取 {url} 的链接...")
                 
                 # 使用map_url功能获取所有可访问的链接
                 # 根据正确的API文档修改参数
-                result = self.app.map_url(url, params={
+                result = self.rate_limiter.call(self.app.map_url, url, params={
                     'includeSubdomains': False,  # 包含子域名
                     'limit': 500,  # 增加链接获取上限
                     'timeout': 60000  # 超时时间（毫秒）
                 })
                 
                 if result and 'links' in result:
-                    # 移除自引用链接
-                    links = [link for link in result['links'] if link != url]
-                    
-                    # 过滤掉一些不需要的路径
-                    excluded_patterns = [
-                        '/tag/', '/category/', '/author/',
-                        '/search/', '/page/', '/wp-content/',
-                        '/wp-admin/', '/wp-includes/',
-                        '/login', '/register', '/account',
-                        '.jpg', '.jpeg', '.png', '.gif',
-                        '.css', '.js', '.xml', '.pdf',
-                        'javascript:'
-                    ]
-                    
-                    filtered_links = []
-                    for link in links:
-                        exclude = False
-                        for pattern in excluded_patterns:
-                            if pattern in link:
-                                exclude = True
-                                break
-                        if not exclude:
-                            filtered_links.append(link)
-                    
-                    if len(links) != len(result['links']):
-                        print(f"移除了自引用链接: {url}")
-                    
-                    print(f"原始链接数量: {len(result['links'])}, 去除自引用后: {len(links)}, 过滤后: {len(filtered_links)}")
-                    return filtered_links
+                    return self._filter_links(url, result['links'])
                 
                 print("没有找到链接或返回结果为空")
                 return []
                 
             except Exception as e:
                 print(f"从页面提取链接时出错 {url}: {e}")
-                if "Rate limit exceeded" in str(e):
+                if is_rate_limit_error(e):
+                    # 速率限制已由共享限流器退避重试，到这里说明重试次数已用尽
+                    print(f"达到最大重试次数，放弃获取链接")
+                    return []
+                # 对于非速率限制错误，尝试一次重试
+                if "timeout" in str(e).lower() and retry_count < max_retries:
                     retry_count += 1
-                    if retry_count <= max_retries:
-                        # 从错误消息中提取等待时间
-                        try:
-                            error_str = str(e)
-                            wait_info = error_str.split("please retry after ")[1].split("s,")[0]
-                            wait_seconds = int(float(wait_info)) 
-                            print(f"达到速率限制，等待 {wait_seconds} 秒后重试...")
-                            time.sleep(wait_seconds)
-                        except:
-                            # 如果无法提取具体等待时间，使用递增等待
-                            wait_time = 15 * retry_count  # 15, 30, 45 秒等
-                            print(f"达到速率限制，等待 {wait_time} 秒后重试...")
-                            time.sleep(wait_time)
-                    else:
-                        print(f"达到最大重试次数，放弃获取链接")
-                        return []
+                    wait_time = 10
+                    print(f"请求超时，等待 {wait_time} 秒后重试...")
+                    traced_sleep(wait_time, 'timeout_retry')
                 else:
-                    # 对于非速率限制错误，尝试一次重试
-                    if "timeout" in str(e).lower() and retry_count < max_retries:
-                        retry_count += 1
-                        wait_time = 10
-                        print(f"请求超时，等待 {wait_time} 秒后重试...")
-                        time.sleep(wait_time)
-                    else:
-                        print(f"无法处理的错误，放弃获取链接")
-                        return []
+                    print(f"无法处理的错误，放弃获取链接")
+                    return []
         
         return []
 
-    def check_for_new_links(self):
-        """检查新链接"""
-        urls_info = self.read_homepage_urls()
-        if not urls_info:
-            print("没有找到要监控的URL")
-            return
+    def _filter_links(self, homepage_url, links):
+        """规范化链接，并按站点规则一次性去除自引用、重复和不需要的路径"""
+        filtered_links, stats = filter_for_homepage(homepage_url).apply(links, homepage_url=homepage_url)
+        record_funnel('mapped', stats['total'], homepage_url)
+        record_funnel('filtered', len(filtered_links), homepage_url)
+
+        if stats['self']:
+            print(f"移除了自引用链接: {homepage_url}")
+
+        print(f"原始链接数量: {stats['total']}, 去除自引用和重复后: "
+              f"{stats['total'] - stats['self'] - stats['duplicate']}, 过滤后: {len(filtered_links)}")
+        return filtered_links
+
+    def _discover_links(self, homepage_url):
+        """获取主页当前的链接
+
+        依次尝试：站点地图或RSS/Atom订阅源（只读取新条目）、直接解析主页HTML中的链接，
+        都不可用时先做变化预检，主页有变化才调用map_url。
 
+        返回:
+            (链接列表, 链接文本映射, 新链接写入历史记录后调用的提交函数)；主页没有变化时链接列表为None
+        """
+        if self.discovery is not None:
+            discovered = self.discovery.discover(homepage_url)
+            if discovered is not None:
+                entries, latest = discovered
+                link_texts = {canonicalize_url(entry['url']): entry['title'] for entry in entries if entry['title']}
+                links = self._filter_links(homepage_url, [entry['url'] for entry in entries])
+                return links, link_texts, lambda: self.discovery.commit(homepage_url, latest)
+
+        if self.html_discovery is not None:
+            anchors = self.html_discovery.discover(homepage_url)
+            if anchors is not None:
+                return self._filter_links(homepage_url, list(anchors)), anchors, None
+
+        # 先做廉价的变化预检，主页没有变化时跳过map_url，历史记录保持不变
+        homepage_state = None
+        if self.change_detector is not None:
+            changed, homepage_state = self.change_detector.check(homepage_url)
+            if not changed:
+                print(f"主页自上次检查后没有变化，跳过map: {homepage_url}")
+                return None, {}, None
+
+        links = self.extract_links_from_page(homepage_url)
+        if links and self.change_detector is not None:
+            return links, {}, lambda: self.change_detector.commit(homepage_state)
+        return links, {}, None
+
+    @traced('HomepageMonitor.check_homepage')
+    def _check_homepage(self, homepage_url, info, position, total_urls):
+        """检查单个主页，返回新链接记录（没有新链接时返回None）"""
+        print(f"\n正在检查主页 [{position}/{total_urls}]: {homepage_url}")
+        print(f"备注: {info['note']}")
+
+        # 获取当前页面的所有链接
+        with HOMEPAGE_LATENCY.time(homepage=homepage_label(homepage_url)):
+            current_links, link_texts, commit = self._discover_links(homepage_url)
+        if current_links is None:
+            return None
+        print(f"发现 {len(current_links)} 个链接")
+
+        # 获取这个主页的历史链接数量
+        historical_count = self.link_store.count(homepage_url)
+        print(f"历史链接数量: {historical_count}")
+
+        # 找出新链接
+        new_links = self.link_store.diff(homepage_url, current_links)
+
+        if not new_links:
+            print(f"没有发现新链接: {homepage_url}")
+            if commit:
+                commit()
+            return None
+
+        record_funnel('new', len(new_links), homepage_url)
+
+        # 更新历史记录（只写入新链接）
+        added = self.link_store.add(homepage_url, new_links)
+        print(f"历史链接更新至 {historical_count + added} 个")
+        if commit:
+            commit()
+
+        print(f"{homepage_url} 发现 {len(new_links)} 个新链接:")
+        # 限制显示的链接数量，避免输出过长
+        display_limit = min(10, len(new_links))
+        for link in new_links[:display_limit]:
+            print(f"  - {link}")
+
+        if len(new_links) > display_limit:
+            print(f"  ... 还有 {len(new_links) - display_limit} 个新链接未显示")
+
+        # 记录新链接
+        return {
+            'note': info['note'],
+            'source': info['source'],
+            'new_links': new_links,
+            'link_texts': {link: link_texts[link] for link in new_links if link_texts.get(link)},
+            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+
+    def _check_serially(self, urls_info, on_new_links=None):
+        """逐个检查主页，每个主页之间暂停"""
         new_links_found = {}
-        
-        # 统计信息
         total_urls = len(urls_info)
-        processed_urls = 0
-        total_new_links = 0
-        
-        for homepage_url, info in urls_info.items():
-            processed_urls += 1
-            print(f"\n正在检查主页 [{processed_urls}/{total_urls}]: {homepage_url}")
-            print(f"备注: {info['note']}")
-            
+
+        for position, (homepage_url, info) in enumerate(urls_info.items(), 1):
             try:
-                # 获取当前页面的所有链接
-                current_links = self.extract_links_from_page(homepage_url)
-                print(f"发现 {len(current_links)} 个链接")
-                
-                # 获取这个主页的历史链接
-                historical_links = self.link_history.get(homepage_url, [])
-                print(f"历史链接数量: {len(historical_links)}")
-                
-                # 找出新链接
-                new_links = [link for link in current_links if link not in historical_links]
-                
-                if new_links:
-                    print(f"发现 {len(new_links)} 个新链接:")
-                    # 限制显示的链接数量，避免输出过长
-                    display_limit = min(10, len(new_links))
-                    for i, link in enumerate(new_links[:display_limit]):
-                        print(f"  - {link}")
-                    
-                    if len(new_links) > display_limit:
-                        print(f"  ... 还有 {len(new_links) - display_limit} 个新链接未显示")
-                    
-                    # 更新历史记录
-                    self.link_history[homepage_url] = list(set(historical_links + current_links))
-                    print(f"历史链接更新至 {len(self.link_history[homepage_url])} 个")
-                    
-                    # 记录新链接
-                    new_links_found[homepage_url] = {
-                        'note': info['note'],
-                        'source': info['source'],
-                        'new_links': new_links,
-                        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    }
-                    
-                    total_new_links += len(new_links)
-                else:
-                    print("没有发现新链接")
-                
+                record = self._check_homepage(homepage_url, info, position, total_urls)
+                if record:
+                    new_links_found[homepage_url] = record
+                    if on_new_links:
+                        on_new_links(homepage_url, record)
+
                 # 每次检查后暂停较长时间，避免请求过于频繁
-                if processed_urls < total_urls:  # 最后一个URL不需要等待
+                if position < total_urls:  # 最后一个URL不需要等待
                     wait_time = config.BATCH_PAUSE_TIME + random.randint(5, 15)
                     print(f"等待 {wait_time} 秒后继续下一个URL...")
-                    time.sleep(wait_time)
-                
+                    traced_sleep(wait_time, 'homepage_interval')
+
             except Exception as e:
                 print(f"处理主页时出错 {homepage_url}: {e}")
                 continue
 
+        return new_links_found
+
+    def _check_concurrently(self, urls_info, max_workers, on_new_links=None):
+        """按域名并发检查主页
+
+        同一域名的主页由同一个任务依次处理，并由调度器保证访问间隔；
+        不同域名并发处理，总并发受Firecrawl共享限流器约束。
+        """
+        scheduler = DomainPolitenessScheduler()
+        positions = {url: position for position, url in enumerate(urls_info, 1)}
+        total_urls = len(urls_info)
+        domain_groups = scheduler.group_by_domain(urls_info)
+        print(f"并发模式: {len(domain_groups)} 个域名, 最多 {max_workers} 个工作线程, "
+              f"全局并发上限 {self.rate_limiter.max_concurrency}")
+
+        records = {}
+
+        def check_domain(homepage_urls):
+            for homepage_url in homepage_urls:
+                try:
+                    with scheduler.slot(homepage_url):
+                        record = self._check_homepage(
+                            homepage_url, urls_info[homepage_url],
+                            positions[homepage_url], total_urls
+                        )
+                    if record:
+                        records[homepage_url] = record
+                        if on_new_links:
+                            on_new_links(homepage_url, record)
+                except Exception as e:
+                    print(f"处理主页时出错 {homepage_url}: {e}")
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(domain_groups))) as executor:
+            futures = [executor.submit(check_domain, urls) for urls in domain_groups.values()]
+            for future in as_completed(futures):
+                future.result()
+
+        # 按Excel中的顺序整理结果
+        return {url: records[url] for url in urls_info if url in records}
+
+    @traced('HomepageMonitor.check_for_new_links')
+    def check_for_new_links(self, max_workers=None, on_new_links=None, batch_id=None, urls_info=None):
+        """检查新链接
+
+        参数:
+            max_workers: 并发工作线程数，大于1时按域名并发检查，否则逐个检查
+            on_new_links: 可选回调 on_new_links(homepage_url, record)，每个主页发现新链接后立即调用
+            batch_id: 可选，预先指定的批次ID
+            urls_info: 可选，只检查这些主页（{主页URL: 信息}），默认检查Excel中的所有主页
+
+        返回:
+            保存新链接所用的批次ID，没有发现新链接时返回None
+        """
+        if urls_info is None:
+            urls_info = self.read_homepage_urls()
+        if not urls_info:
+            print("没有找到要监控的URL")
+            return None
+
+        if max_workers is None:
+            max_workers = getattr(config, 'MONITOR_WORKERS', 1)
+
+        if max_workers > 1:
+            new_links_found = self._check_concurrently(urls_info, max_workers, on_new_links)
+        else:
+            new_links_found = self._check_serially(urls_info, on_new_links)
+
+        total_new_links = sum(len(record['new_links']) for record in new_links_found.values())
+
         # 保存更新后的历史记录
-        self._save_link_history()
+        self.link_store.save()
         
         # 如果发现了新链接，保存它们
         if new_links_found:
-            self._save_new_links(new_links_found)
+            batch_id = self._save_new_links(new_links_found, batch_id)
             print(f"\n总计发现 {total_new_links} 个新链接，来自 {len(new_links_found)} 个网站")
-        else:
-            print("\n未发现任何新链接")
+            return batch_id
+
+        print("\n未发现任何新链接")
+        return None
 
 def main(interval_minutes=None):
-    """主函数，可选择定时运行"""
+    """主函数，可选择定时运行
+
+    定时运行时每个主页按自己的新链接出现速度决定检查间隔（见poll_scheduler.py），
+    interval_minutes用于还没有足够历史的主页；POLL_ADAPTIVE为False时所有主页固定按interval_minutes检查。
+    """
     excel_path = "C:\\Python\\github\\firecrawl\\testhomepage.xlsx"
     monitor = HomepageMonitor(excel_path)
-    
-    def run_check():
-        print(f"\n开始检查 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        monitor.check_for_new_links()
-        print(f"检查完成 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
     if interval_minutes:
-        print(f"设置为每 {interval_minutes} 分钟运行一次")
-        while True:
-            run_check()
-            print(f"等待 {interval_minutes} 分钟后进行下一次检查...")
-            time.sleep(interval_minutes * 60)
+        if getattr(config, 'POLL_ADAPTIVE', True):
+            scheduler = AdaptivePollScheduler(monitor, default_minutes=interval_minutes)
+            print(f"设置为按主页自适应间隔运行（{scheduler.min_interval / 60:.0f}-{scheduler.max_interval / 60:.0f} 分钟，"
+                  f"没有历史的主页每 {interval_minutes} 分钟）")
+        else:
+            scheduler = AdaptivePollScheduler(monitor, default_minutes=interval_minutes,
+                                              min_minutes=interval_minutes, max_minutes=interval_minutes)
+            print(f"设置为每 {interval_minutes} 分钟运行一次")
+        # 定时运行时通过HTTP接口导出Prometheus指标
+        metrics_port = getattr(config, 'METRICS_PORT', None)
+        if metrics_port:
+            start_http_server(metrics_port)
+        scheduler.run_forever()
     else:
-        run_check()
+        print(f"\n开始检查 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        baseline = REGISTRY.snapshot()
+        batch_id = monitor.check_for_new_links()
+        if batch_id:
+            print(f"本批次指标摘要已保存到: {write_summary(batch_id, baseline)}")
+        print(f"检查完成 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
 if __name__ == "__main__":
     # 设置为None表示只运行一次，或者设置分钟数进行定时运行
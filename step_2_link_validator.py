@@ -1,30 +1,158 @@
 import os
 import json
+import re
 import sys
 from datetime import datetime
 from urllib.parse import urlparse
 import dashscope
 from dashscope import Generation
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import config
+from rate_limiter import dashscope_limiter, is_dashscope_throttled
+from batch_log import BatchLog, log_dir_for
+from cache_store import PersistentCache, make_cache_key, text_hash
+from url_filter import canonicalize_url
+from metrics import VERDICTS, record_funnel
+from tracing import traced
 
 # 设置环境变量和API密钥
 os.environ['DASHSCOPE_API_KEY'] = config.DASHSCOPE_API_KEY
 dashscope.api_key = config.DASHSCOPE_API_KEY
 MODEL_ID = config.DASHSCOPE_MODEL_ID  # 从配置中使用模型ID
 
+# API响应无法解析时的默认结果原因，这类结果不写入缓存
+PARSE_FAILURE_REASONS = ("无法解析API响应", "JSON解析失败")
+
+# 常见的非文章路径片段
+NON_ARTICLE_SEGMENTS = {
+    'component', 'banners', 'click', 'tag', 'tags', 'category', 'categoria', 'author', 'autor',
+    'search', 'buscar', 'page', 'login', 'register', 'account', 'contact', 'contacto',
+    'about', 'privacy', 'privacidad', 'terms', 'newsletter', 'suscripcion', 'subscribe',
+    'feed', 'rss', 'share', 'sharer', 'print', 'cart', 'checkout'
+}
+
+# 路径中的日期片段，例如 /2025/04/02/、/2025-04-02、/20250402
+DATE_PATTERN = re.compile(r'/(?:19|20)\d{2}/(?:0?[1-9]|1[0-2])(?:/|$)|/(?:19|20)\d{2}-\d{2}-\d{2}|/(?:19|20)\d{6}(?:\D|$)')
+
+# 路径中的文章编号，例如 /noticia/33660-...、/article-id-123456（排除年份）
+ARTICLE_ID_PATTERN = re.compile(r'^(?!(?:19|20)\d{2}$)\d{4,}$')
+
+# 国家顶级域名下常见的二级域名（如 com.br、gob.ar、co.uk），可注册域名为最后三段
+COUNTRY_SECOND_LEVEL = {'com', 'co', 'org', 'net', 'gov', 'gob', 'edu', 'ac', 'mil', 'nic', 'or', 'ne'}
+
+def _host_without_www(url):
+    host = (urlparse(url).hostname or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+def _registrable_domain(host):
+    """近似的可注册域名（eTLD+1），例如 valor.globo.com -> globo.com，noticias.uol.com.br -> uol.com.br"""
+    labels = host.split('.')
+    if len(labels) >= 3 and len(labels[-1]) == 2 and labels[-2] in COUNTRY_SECOND_LEVEL:
+        return '.'.join(labels[-3:])
+    return '.'.join(labels[-2:])
+
+class LinkPreClassifier:
+    def __init__(self, auto_accept=None, min_slug_words=None):
+        """初始化基于URL结构的预分类器
+
+        对明显不是文章的链接直接拒绝，对结构上明显是文章的链接直接通过，
+        其余无法确定的链接交给大模型判断。
+
+        参数:
+            auto_accept: 是否允许直接通过，默认读取config.PRECLASSIFY_AUTO_ACCEPT
+            min_slug_words: 带文章编号的链接直接通过所需的最少slug单词数
+        """
+        if auto_accept is None:
+            auto_accept = getattr(config, 'PRECLASSIFY_AUTO_ACCEPT', True)
+        if min_slug_words is None:
+            min_slug_words = getattr(config, 'PRECLASSIFY_MIN_SLUG_WORDS', 6)
+        self.auto_accept = auto_accept
+        self.min_slug_words = min_slug_words
+
+    @staticmethod
+    def _verdict(score, is_valid, reason):
+        return {"score": score, "is_valid": is_valid, "reason": f"规则预判: {reason}"}
+
+    def classify(self, url, homepage_url):
+        """预分类单个链接，无法确定时返回None"""
+        parsed_url = urlparse(url)
+        if parsed_url.scheme not in ('http', 'https'):
+            return self._verdict(0, False, "非网页链接")
+
+        # 站外链接（允许子域名）；同一可注册域名下的其他子站（如valor.globo.com与globorural.globo.com）
+        # 可能是同一媒体的其他栏目，交给大模型判断
+        host = _host_without_www(url)
+        homepage_host = _host_without_www(homepage_url)
+        if host != homepage_host and not host.endswith('.' + homepage_host):
+            if _registrable_domain(host) == _registrable_domain(homepage_host):
+                return None
+            return self._verdict(5, False, f"站外链接（{host}），不属于主页所在网站")
+
+        segments = [segment for segment in parsed_url.path.split('/') if segment]
+        lowered = [segment.lower() for segment in segments]
+        non_article = NON_ARTICLE_SEGMENTS.intersection(lowered)
+        if non_article:
+            return self._verdict(10, False, f"路径包含非文章片段 /{sorted(non_article)[0]}/")
+
+        # 去掉跟踪参数后仍有查询参数时（如 /?p=123、/noticias?codigo=33660），文章可能由参数决定，交给大模型判断
+        if urlparse(canonicalize_url(url)).query:
+            return None
+
+        if not segments:
+            return self._verdict(10, False, "网站首页，不是具体文章")
+
+        slug = segments[-1].rsplit('.', 1)[0]
+        slug_words = [word for word in re.split(r'[-_]+', slug) if word and not word.isdigit()]
+
+        if len(segments) == 1 and len(slug_words) <= 2:
+            return self._verdict(20, False, f"一级短路径 /{segments[0]}，通常是栏目页")
+
+        if not self.auto_accept:
+            return None
+
+        # 只有带日期或文章编号的链接才直接通过，单靠长slug无法区分文章与隐私政策、使用条款等页面
+        if DATE_PATTERN.search(parsed_url.path) and len(slug_words) >= 3:
+            return self._verdict(85, True, "路径包含日期且带有描述性slug，符合新闻文章特征")
+
+        has_article_id = any(
+            ARTICLE_ID_PATTERN.match(word)
+            for segment in segments for word in re.split(r'[-_.]+', segment)
+        )
+        if has_article_id and len(slug_words) >= self.min_slug_words:
+            return self._verdict(80, True, f"路径包含文章编号且带有长描述性slug（{len(slug_words)}个词），符合新闻文章特征")
+
+        return None
+
 class LinkValidator:
-    def __init__(self, new_links_file=config.NEW_LINKS_FILE, valid_links_file=config.VALID_LINKS_FILE):
-        """初始化链接验证器"""
+    def __init__(self, new_links_file=config.NEW_LINKS_FILE, valid_links_file=config.VALID_LINKS_FILE,
+                 batch_size=None, workers=None):
+        """初始化链接验证器
+
+        参数:
+            batch_size: 每次请求验证的链接数，大于1时启用批量验证，默认读取config.VALIDATION_BATCH_SIZE
+            workers: 并发验证的工作线程数，默认读取config.VALIDATION_WORKERS
+        """
         self.new_links_file = new_links_file
         self.valid_links_file = valid_links_file
-        self.validation_prompt = """
-你是一个专门评估链接是否为有效农业新闻链接的 AI 助手。请基于以下信息判断：
-
-URL: {url}
-链接文本: {link_text}
-URL 路径: {url_path}
-
-任务：判断此链接是否指向有效的农业新闻文章，并给出 0-100 的分数。
+        self.new_links_log = BatchLog(log_dir_for(new_links_file), legacy_file=new_links_file)
+        self.valid_links_log = BatchLog(log_dir_for(valid_links_file), legacy_file=valid_links_file)
+        self.rate_limiter = dashscope_limiter()
+        # 大模型客户端，可替换为录制/回放等包装（需提供与Generation.call相同的call方法）
+        self.llm = Generation
+        self.batch_size = batch_size if batch_size is not None else getattr(config, 'VALIDATION_BATCH_SIZE', 1)
+        self.workers = workers if workers is not None else getattr(config, 'VALIDATION_WORKERS', 1)
+        # 单次API调用的超时时间（秒）
+        self.call_timeout = getattr(config, 'VALIDATION_CALL_TIMEOUT', 60)
+        self.pre_classifier = LinkPreClassifier() if getattr(config, 'PRECLASSIFY_ENABLED', True) else None
+        self.verdict_cache = None
+        if getattr(config, 'VERDICT_CACHE_ENABLED', True):
+            self.verdict_cache = PersistentCache(
+                getattr(config, 'VERDICT_CACHE_FILE', 'verdict_cache.db'),
+                ttl=getattr(config, 'VERDICT_CACHE_TTL_DAYS', 30) * 24 * 3600,
+                max_entries=getattr(config, 'VERDICT_CACHE_MAX_ENTRIES', 100000)
+            )
+        # 单链接和批量验证共用的判断标准
+        self.validation_criteria = """任务：判断此链接是否指向有效的农业新闻文章，并给出 0-100 的分数。
 有效农业新闻链接的特征：
 1. 指向具体新闻文章（而非主页、栏目页或聚合页）
 2. URL 路径通常包含日期（例如 /2023/04/02/）或文章标识符（例如 /article-id-123）
@@ -36,9 +164,26 @@ URL 路径: {url_path}
 - 完全符合特征：80-100 分
 - 部分符合（如有标题但路径不明确）：50-79 分
 - 不符合或无法判断：0-49 分
+"""
+        self.validation_prompt = """
+你是一个专门评估链接是否为有效农业新闻链接的 AI 助手。请基于以下信息判断：
 
+URL: {url}
+链接文本: {link_text}
+URL 路径: {url_path}
+
+""" + self.validation_criteria + """
 直接返回以下 JSON 格式结果：
 {{"score": 分数值(0-100), "is_valid": true/false, "reason": "简要分析原因"}}
+"""
+        self.batch_validation_prompt = """
+你是一个专门评估链接是否为有效农业新闻链接的 AI 助手。以下是来自同一网站的 {count} 个链接，请逐个判断：
+
+{links}
+
+""" + self.validation_criteria + """
+请对每个链接分别判断，直接返回以下 JSON 数组（按编号顺序，每个链接一项，不要输出其他内容）：
+[{{"index": 编号, "url": "链接", "score": 分数值(0-100), "is_valid": true/false, "reason": "简要分析原因"}}]
 """
 
     def _load_new_links(self, batch_id=None):
@@ -48,39 +193,29 @@ URL 路径: {url_path}
             batch_id: 如果指定，则加载特定批次的链接；否则加载最新的一批
         """
         try:
-            with open(self.new_links_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                
-                if batch_id:
-                    # 查找特定批次ID的数据
-                    for timestamp, batch_data in data.items():
-                        # 检查每个主页的数据
-                        for homepage_url, homepage_data in batch_data.items():
-                            if 'batch_id' in homepage_data and homepage_data['batch_id'] == batch_id:
-                                print(f"找到批次 {batch_id} 的数据，时间戳: {timestamp}")
-                                return timestamp, batch_data
-                    
+            if batch_id:
+                # 查找特定批次ID的数据
+                entry = self.new_links_log.find(batch_id=batch_id)
+                if entry is None:
                     print(f"未找到批次ID为 {batch_id} 的数据")
                     return None, None
-                else:
-                    # 获取最新的时间戳
-                    latest_timestamp = max(data.keys())
-                    print(f"加载最新批次的数据，时间戳: {latest_timestamp}")
-                    return latest_timestamp, data[latest_timestamp]
+                print(f"找到批次 {batch_id} 的数据，时间戳: {entry['timestamp']}")
+            else:
+                # 获取最新的批次
+                entry = self.new_links_log.find()
+                if entry is None:
+                    print("没有任何批次数据")
+                    return None, None
+                print(f"加载最新批次的数据，时间戳: {entry['timestamp']}")
+            return entry['timestamp'], entry['data']
         except Exception as e:
             print(f"加载新链接文件时出错: {e}")
             return None, None
 
+    @traced('LinkValidator.save_valid_links', 'io')
     def _save_valid_links(self, validation_results, batch_id=None):
-        """保存验证结果"""
+        """保存验证结果（追加到批次日志）"""
         try:
-            # 读取现有的验证结果（如果存在）
-            existing_data = {}
-            if os.path.exists(self.valid_links_file):
-                with open(self.valid_links_file, 'r', encoding='utf-8') as f:
-                    existing_data = json.load(f)
-
-            # 添加新的验证结果
             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             
             # 构建结果条目
@@ -90,18 +225,21 @@ URL 路径: {url_path}
                 'results': validation_results
             }
             
-            # 使用时间戳作为键保存结果
-            existing_data[timestamp] = result_entry
-
-            # 保存更新后的数据
-            with open(self.valid_links_file, 'w', encoding='utf-8') as f:
-                json.dump(existing_data, f, ensure_ascii=False, indent=2)
-            print(f"验证结果已保存到 {self.valid_links_file}")
+            self.valid_links_log.append(result_entry)
+            print(f"验证结果已保存到 {self.valid_links_log.log_dir}")
             if batch_id:
                 print(f"已完成批次 {batch_id} 的验证")
         except Exception as e:
             print(f"保存验证结果时出错: {e}")
 
+    def _verdict_cache_key(self, url, link_text=""):
+        """验证结果的缓存键：规范化URL + 链接文本 + 单链接和批量验证提示词以及模型的哈希
+
+        缓存中的结果可能来自任一种验证方式，修改任一提示词都会使已有缓存失效。
+        """
+        return make_cache_key(canonicalize_url(url), link_text, text_hash(self.validation_prompt),
+                              text_hash(self.batch_validation_prompt), MODEL_ID)
+
     def validate_link(self, url, link_text=""):
         """使用Qwen API验证单个链接"""
         try:
@@ -116,13 +254,16 @@ URL 路径: {url_path}
             )
 
             print(f"正在验证链接: {url}")
-            # 使用更简单的方式调用通义千问API
-            response = Generation.call(
+            # 使用更简单的方式调用通义千问API（通过共享限流器，被限流时自动退避重试）
+            response = self.rate_limiter.call(
+                self.llm.call,
+                is_throttled=is_dashscope_throttled,
                 model=MODEL_ID,
                 prompt=prompt,
                 temperature=0.1,
                 max_tokens=1500,
-                top_p=0.8
+                top_p=0.8,
+                request_timeout=self.call_timeout
             )
 
             if response.status_code == 200:
@@ -138,7 +279,14 @@ URL 路径: {url_path}
                         end = content.rfind('}') + 1
                         if start != -1 and end != 0:
                             json_str = content[start:end]
-                            result = json.loads(json_str)
+                            result = self._normalize_verdict(json.loads(json_str))
+                            if result is None:
+                                print("响应中的验证结果字段缺失或类型错误")
+                                return {
+                                    "score": 0,
+                                    "is_valid": False,
+                                    "reason": PARSE_FAILURE_REASONS[0]
+                                }
                             return result
                         else:
                             print("响应中没有找到JSON格式的内容")
@@ -146,7 +294,7 @@ URL 路径: {url_path}
                             return {
                                 "score": 0,
                                 "is_valid": False,
-                                "reason": "无法解析API响应"
+                                "reason": PARSE_FAILURE_REASONS[0]
                             }
                     except json.JSONDecodeError as e:
                         print(f"JSON解析错误: {str(e)}")
@@ -155,7 +303,7 @@ URL 路径: {url_path}
                         return {
                             "score": 0,
                             "is_valid": False,
-                            "reason": "JSON解析失败"
+                            "reason": PARSE_FAILURE_REASONS[1]
                         }
                 except Exception as e:
                     print(f"处理API响应时出错: {str(e)}")
@@ -172,6 +320,160 @@ URL 路径: {url_path}
             print(f"验证链接时出错 {url}: {str(e)}")
             return None
 
+    @staticmethod
+    def _normalize_verdict(item):
+        """检查单个验证结果的字段是否完整，返回规范化后的结果，格式错误时返回None"""
+        if not isinstance(item, dict):
+            return None
+        score = item.get('score')
+        is_valid = item.get('is_valid')
+        if isinstance(score, bool) or not isinstance(score, (int, float)) or not isinstance(is_valid, bool):
+            return None
+        return {"score": score, "is_valid": is_valid, "reason": str(item.get('reason', ''))}
+
+    def validate_links_batch(self, links, link_texts=None):
+        """在一次请求中验证多个链接
+
+        参数:
+            links: 来自同一主页的链接列表
+            link_texts: 可选，链接到链接文本的映射
+
+        返回:
+            与links一一对应的结果列表，缺失或格式错误的项为None
+        """
+        link_texts = link_texts or {}
+        results = [None] * len(links)
+        link_lines = []
+        for i, url in enumerate(links, 1):
+            link_lines.append(
+                f"{i}. URL: {url}\n   链接文本: {link_texts.get(url, '')}\n   URL 路径: {urlparse(url).path}"
+            )
+        prompt = self.batch_validation_prompt.format(count=len(links), links="\n".join(link_lines))
+
+        print(f"正在批量验证 {len(links)} 个链接...")
+        try:
+            response = self.rate_limiter.call(
+                self.llm.call,
+                is_throttled=is_dashscope_throttled,
+                model=MODEL_ID,
+                prompt=prompt,
+                temperature=0.1,
+                # 每条结果只有几十个token，按链接数预留输出长度
+                max_tokens=min(8000, 200 + 150 * len(links)),
+                top_p=0.8,
+                request_timeout=self.call_timeout
+            )
+            if response.status_code != 200:
+                print(f"批量验证API调用失败: {response.status_code}")
+                return results
+
+            content = response.output.text
+            start = content.find('[')
+            end = content.rfind(']') + 1
+            if start == -1 or end <= start:
+                print("批量验证响应中没有找到JSON数组")
+                return results
+            items = json.loads(content[start:end])
+            if not isinstance(items, list):
+                return results
+        except Exception as e:
+            print(f"批量验证链接时出错: {str(e)}")
+            return results
+
+        # 把结果映射回链接：优先按URL匹配，其次按编号，最后在数量一致时按顺序
+        positions = {canonicalize_url(url): i for i, url in enumerate(links)}
+        for position, item in enumerate(items):
+            verdict = self._normalize_verdict(item)
+            if verdict is None:
+                continue
+            item_url = item.get('url')
+            index = item.get('index')
+            if isinstance(item_url, str) and canonicalize_url(item_url) in positions:
+                target = positions[canonicalize_url(item_url)]
+            elif isinstance(index, int) and not isinstance(index, bool) and 1 <= index <= len(links):
+                target = index - 1
+            elif len(items) == len(links):
+                target = position
+            else:
+                continue
+            if results[target] is None:
+                results[target] = verdict
+
+        print(f"批量验证返回 {sum(result is not None for result in results)}/{len(links)} 个有效结果")
+        return results
+
+    @traced('LinkValidator.validate_chunk')
+    def _validate_chunk(self, links, link_texts=None):
+        """调用大模型验证同一主页的一组链接
+
+        多个链接时合并为一次批量请求，批量结果中缺失或格式错误的链接再逐个验证。
+        """
+        link_texts = link_texts or {}
+        if len(links) == 1:
+            return [self.validate_link(links[0], link_texts.get(links[0], ""))]
+
+        results = []
+        for link, result in zip(links, self.validate_links_batch(links, link_texts)):
+            if result is None:
+                print(f"批量结果缺失或格式错误，单独验证: {link}")
+                result = self.validate_link(link, link_texts.get(link, ""))
+            results.append(result)
+        return results
+
+    def _run_llm_tasks(self, tasks):
+        """执行一组大模型验证任务，返回与tasks顺序一致的结果
+
+        每个任务为 (链接列表, 链接文本映射)。workers大于1时使用有界线程池并发执行，
+        调用速率和并发仍受共享限流器约束。
+        """
+        if self.workers <= 1 or len(tasks) <= 1:
+            return [self._validate_chunk(links, link_texts) for links, link_texts in tasks]
+
+        print(f"使用 {min(self.workers, len(tasks))} 个工作线程并发验证 {len(tasks)} 个任务")
+        task_results = [None] * len(tasks)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self._validate_chunk, *task): i for i, task in enumerate(tasks)}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    task_results[i] = future.result()
+                except Exception as e:
+                    print(f"验证任务出错: {str(e)}")
+                    task_results[i] = [None] * len(tasks[i][0])
+        return task_results
+
+    def _lookup_without_llm(self, link, homepage_url, link_text=""):
+        """不调用大模型的验证：先规则预判，再查验证缓存，都无法确定时返回None"""
+        # 先用规则预判，只有无法确定的链接才调用大模型
+        result = self.pre_classifier.classify(link, homepage_url) if self.pre_classifier else None
+        if result:
+            print(f"规则预判链接: {link}")
+            return result, 'rule'
+        if self.verdict_cache:
+            # 再查验证缓存，同一链接在不同批次、不同主页下重复出现时不再调用API
+            result = self.verdict_cache.get(self._verdict_cache_key(link, link_text))
+            if result:
+                print(f"命中验证缓存: {link}")
+                return result, 'cache'
+        return None, None
+
+    def _remember_verdict(self, link, result, link_text=""):
+        """把大模型成功解析的验证结果写入缓存"""
+        if self.verdict_cache and result and result.get('reason') not in PARSE_FAILURE_REASONS:
+            self.verdict_cache.set(self._verdict_cache_key(link, link_text), result)
+
+    def resolve_link(self, link, homepage_url, link_text=""):
+        """验证单个链接：规则预判 -> 验证缓存 -> 大模型，供流式处理使用"""
+        result, origin = self._lookup_without_llm(link, homepage_url, link_text)
+        if origin is None:
+            result = self.validate_link(link, link_text)
+            self._remember_verdict(link, result, link_text)
+        VERDICTS.inc(source=origin or 'llm')
+        if result and result.get('is_valid'):
+            record_funnel('valid', 1, homepage_url)
+        return result
+
+    @traced('LinkValidator.validate_links_by_batch')
     def validate_links_by_batch(self, batch_id=None):
         """验证特定批次的链接
         
@@ -195,21 +497,61 @@ URL 路径: {url_path}
                     break
         
         validation_results = {}
+        rule_decided = 0
+        cache_hits = 0
+        llm_checked = 0
+
+        # 第一步：规则预判和缓存查询，剩余的链接按主页分组为大模型验证任务
+        homepage_plans = []
+        tasks = []
+        task_targets = []
+        chunk_size = max(1, self.batch_size)
 
         for homepage_url, data in links_data.items():
-            print(f"\n检查来自 {data.get('note', '未知来源')} 的链接:")
-            valid_links = []
-            
             # 确保new_links字段存在
             if 'new_links' not in data:
                 print(f"警告: {homepage_url} 没有 'new_links' 字段")
                 continue
-                
-            for link in data['new_links']:
-                result = self.validate_link(link)
-                
+
+            links = data['new_links']
+            # 步骤1从订阅源标题或主页HTML中得到的链接文本（map_url得到的链接没有）
+            link_texts = data.get('link_texts', {})
+            results = [None] * len(links)
+            pending = []
+
+            for i, link in enumerate(links):
+                result, origin = self._lookup_without_llm(link, homepage_url, link_texts.get(link, ""))
+                if origin == 'rule':
+                    rule_decided += 1
+                elif origin == 'cache':
+                    cache_hits += 1
                 if result:
-                    print(f"验证结果: 分数={result['score']}, 有效={result['is_valid']}")
+                    results[i] = result
+                else:
+                    pending.append(i)
+
+            llm_checked += len(pending)
+            for start in range(0, len(pending), chunk_size):
+                indexes = pending[start:start + chunk_size]
+                tasks.append(([links[i] for i in indexes], link_texts))
+                task_targets.append((results, indexes, link_texts))
+            homepage_plans.append((homepage_url, data, links, results))
+
+        # 第二步：剩余的链接交给大模型验证（可并发）
+        for (task_links, _), (results, indexes, link_texts), task_results in zip(
+                tasks, task_targets, self._run_llm_tasks(tasks)):
+            for link, i, result in zip(task_links, indexes, task_results):
+                results[i] = result
+                self._remember_verdict(link, result, link_texts.get(link, ""))
+
+        # 第三步：按原有顺序整理结果
+        for homepage_url, data, links, results in homepage_plans:
+            print(f"\n来自 {data.get('note', '未知来源')} 的链接验证结果:")
+            valid_links = []
+
+            for link, result in zip(links, results):
+                if result:
+                    print(f"{link} 验证结果: 分数={result['score']}, 有效={result['is_valid']}")
                     print(f"原因: {result['reason']}")
                     
                     valid_links.append({
@@ -217,7 +559,7 @@ URL 路径: {url_path}
                         'validation': result
                     })
                 else:
-                    print(f"链接验证失败")
+                    print(f"链接验证失败: {link}")
 
             validation_results[homepage_url] = {
                 'note': data.get('note', ''),
@@ -225,6 +567,14 @@ URL 路径: {url_path}
                 'validated_links': valid_links,
                 'original_timestamp': timestamp
             }
+            record_funnel('valid', sum(1 for link in valid_links if link['validation'].get('is_valid')), homepage_url)
+
+        print(f"\n规则预判 {rule_decided} 个链接，命中验证缓存 {cache_hits} 个链接，调用大模型验证 {llm_checked} 个链接")
+        VERDICTS.inc(rule_decided, source='rule')
+        VERDICTS.inc(cache_hits, source='cache')
+        VERDICTS.inc(llm_checked, source='llm')
+        if cache_hits + llm_checked:
+            print(f"验证缓存命中率: {cache_hits / (cache_hits + llm_checked):.1%}")
 
         # 保存验证结果
         self._save_valid_links(validation_results, current_batch_id)
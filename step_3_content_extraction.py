@@ -3,16 +3,55 @@ import config
 import json
 import pandas as pd
 from datetime import datetime
-import time
 import os
 import sys
+import glob
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from rate_limiter import firecrawl_limiter
+from batch_log import BatchLog, log_dir_for
+from cache_store import PersistentCache, make_cache_key, text_hash
+from url_filter import canonicalize_url
+from batch_scrape import BatchScrapeClient
+from metrics import BYTES_WRITTEN, EXTRACTIONS, record_funnel
+from run_journal import RunJournal, journal_path, read_journal, read_journal_header
+from tracing import traced, traced_sleep
+from local_extractor import open_local_extraction
+
+# 结构化数据提取的提示词
+EXTRACTION_PROMPT = "提取这篇农业新闻文章的完整内容，包括标题、正文、发布日期、来源、分类、作者和摘要。"
 
 class ContentExtractor:
-    def __init__(self, valid_links_file=config.VALID_LINKS_FILE):
-        """初始化内容提取器"""
+    def __init__(self, valid_links_file=config.VALID_LINKS_FILE, workers=None, mode=None):
+        """初始化内容提取器
+        
+        参数:
+            valid_links_file: 验证后的链接文件
+            workers: 并发提取的工作线程数，不超过Firecrawl套餐的并发浏览器数(FIRECRAWL_MAX_CONCURRENCY)
+            mode: 'scrape'（默认，逐个调用scrape_url）或'batch'（提交Firecrawl批量抓取任务）
+        """
         self.app = FirecrawlApp(api_key=config.API_KEY)
         self.valid_links_file = valid_links_file
+        self.valid_links_log = BatchLog(log_dir_for(valid_links_file), legacy_file=valid_links_file)
+        self.rate_limiter = firecrawl_limiter()
+        self.workers = min(workers or getattr(config, 'EXTRACTION_WORKERS', 1), self.rate_limiter.max_concurrency)
+        self.mode = mode or getattr(config, 'EXTRACTION_MODE', 'scrape')
+        self.batch_chunk_size = getattr(config, 'BATCH_SCRAPE_CHUNK_SIZE', 100)
+        # 抓取结果缓存，重新运行步骤3时已抓取过的页面不再请求Firecrawl
+        self.scrape_cache = None
+        if getattr(config, 'SCRAPE_CACHE_ENABLED', True):
+            self.scrape_cache = PersistentCache(
+                getattr(config, 'SCRAPE_CACHE_FILE', 'scrape_cache.db'),
+                ttl=getattr(config, 'SCRAPE_CACHE_TTL_DAYS', 7) * 24 * 3600,
+                max_entries=getattr(config, 'SCRAPE_CACHE_MAX_ENTRIES', 20000)
+            )
+        # 本地提取：服务端渲染的文章直接下载HTML提取正文，未通过质量检查或动态网站才调用Firecrawl
+        self.local_extraction = open_local_extraction()
         
+    @staticmethod
+    def is_extractable(validation):
+        """验证结果是否达到提取内容的标准"""
+        return validation.get('is_valid', False) and validation.get('score', 0) >= config.MIN_VALID_SCORE
+
     def load_valid_links(self, batch_id=None, timestamp=None):
         """加载已验证的有效链接
         
@@ -24,37 +63,22 @@ class ContentExtractor:
             有效链接列表，每个元素为字典 {url, source, note}
         """
         try:
-            if not os.path.exists(self.valid_links_file):
-                print(f"验证链接文件 {self.valid_links_file} 不存在")
-                return []
-                
-            with open(self.valid_links_file, 'r', encoding='utf-8') as f:
-                validation_data = json.load(f)
-            
-            if not validation_data:
-                print("验证链接文件为空")
-                return []
-            
-            # 确定要处理的时间戳
-            target_timestamp = None
-            if timestamp and timestamp in validation_data:
-                target_timestamp = timestamp
-            elif batch_id:
-                # 查找包含指定batch_id的时间戳
-                for ts, entry in validation_data.items():
-                    if entry.get('batch_id') == batch_id:
-                        target_timestamp = ts
-                        break
-            else:
-                # 使用最新的时间戳
-                target_timestamp = max(validation_data.keys())
+            # 确定要处理的批次
+            validation_entry = self.valid_links_log.find(timestamp=timestamp) if timestamp else None
+            if validation_entry is None:
+                if batch_id:
+                    # 查找包含指定batch_id的批次
+                    validation_entry = self.valid_links_log.find(batch_id=batch_id)
+                else:
+                    # 使用最新的批次
+                    validation_entry = self.valid_links_log.find()
             
-            if not target_timestamp:
+            if not validation_entry:
                 print(f"找不到指定的批次ID或时间戳")
                 return []
             
+            target_timestamp = validation_entry['timestamp']
             print(f"使用时间戳 {target_timestamp} 的验证结果")
-            validation_entry = validation_data[target_timestamp]
             validation_results = validation_entry.get('results', {})
             
             valid_links = []
@@ -68,13 +92,14 @@ class ContentExtractor:
                     validation = link_data.get('validation', {})
                     
                     # 只提取有效的链接（is_valid为True且score较高的）
-                    if validation.get('is_valid', False) and validation.get('score', 0) >= config.MIN_VALID_SCORE:
+                    if self.is_extractable(validation):
                         valid_links.append({
                             'url': url,
                             'source': source,
                             'note': note,
                             'score': validation.get('score', 0),
-                            'reason': validation.get('reason', '')
+                            'reason': validation.get('reason', ''),
+                            'homepage': homepage_url
                         })
             
             print(f"找到 {len(valid_links)} 个有效链接")
@@ -86,177 +111,314 @@ class ContentExtractor:
             traceback.print_exc()
             return []
             
-    def extract_content_from_urls(self, valid_links):
-        """从有效链接中提取内容"""
-        if not valid_links:
-            print("没有有效链接可处理")
-            return {}
-            
-        results = {}
+    def new_results_dir(self):
+        """创建本次运行的结果目录"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        
-        # 创建结果目录
         results_dir = f"extracted_content_{timestamp}"
         os.makedirs(results_dir, exist_ok=True)
-        
-        for i, link_data in enumerate(valid_links):
-            url = link_data['url']
-            print(f"\n[{i+1}/{len(valid_links)}] 正在处理: {url}")
-            print(f"来源: {link_data['source']}, 备注: {link_data['note']}")
-            print(f"验证分数: {link_data['score']}")
-            
-            try:
-                # 使用config中的schema
-                schema = config.CONTENT_SCHEMA
-                
-                try:
-                    # 先尝试只获取markdown格式
-                    print(f"尝试获取markdown格式内容...")
-                    scrape_result = self.app.scrape_url(
-                        url, 
-                        params={'formats': ['markdown']}
-                    )
-                    
-                    print(f"成功获取markdown内容!")
-                    
-                    # 保存markdown结果
-                    markdown_content = scrape_result.get("markdown", "")
-                    metadata = scrape_result.get("metadata", {})
-                    
-                    # 然后尝试使用jsonOptions提取结构化数据
-                    print(f"尝试提取结构化数据...")
-                    json_result = self.app.scrape_url(
-                        url, 
-                        params={
-                            'formats': ['json'],
-                            'jsonOptions': {
-                                'schema': schema,
-                                'prompt': "提取这篇农业新闻文章的完整内容，包括标题、正文、发布日期、来源、分类、作者和摘要。"
-                            }
-                        }
-                    )
-                    
-                    print(f"成功提取结构化数据!")
-                    
-                    # 获取json数据
-                    json_data = json_result.get("json", {})
-                    
-                    # 保存结果
-                    results[url] = {
-                        "extract": {
-                            "data": json_data
-                        },
-                        "markdown": markdown_content,
-                        "metadata": metadata,
-                        "source": link_data['source'],
-                        "note": link_data['note'],
-                        "validation_score": link_data['score'],
-                        "validation_reason": link_data['reason']
-                    }
-                    
-                except Exception as scrape_error:
-                    print(f"scrape_url出错: {str(scrape_error)}")
-                    # 如果超时，等待一段时间后重试
-                    if "timeout" in str(scrape_error).lower():
-                        print(f"请求超时，等待{config.RETRY_WAIT_TIME}秒后重试...")
-                        time.sleep(config.RETRY_WAIT_TIME)
-                        
-                        # 重试，只获取markdown
-                        print(f"重试获取markdown...")
-                        scrape_result = self.app.scrape_url(
-                            url, 
-                            params={'formats': ['markdown']}
-                        )
-                        
-                        results[url] = {
-                            "extract": {
-                                "data": {}  # 空数据，因为提取失败
-                            },
-                            "markdown": scrape_result.get("markdown", ""),
-                            "metadata": scrape_result.get("metadata", {}),
-                            "source": link_data['source'],
-                            "note": link_data['note'],
-                            "validation_score": link_data['score'],
-                            "validation_reason": link_data['reason']
-                        }
-                    else:
-                        raise scrape_error
-                
-                print(f"成功处理URL!")
-                
-            except Exception as e:
-                results[url] = {
-                    "error": str(e),
-                    "source": link_data['source'],
-                    "note": link_data['note'],
-                    "validation_score": link_data['score'],
-                    "validation_reason": link_data['reason']
-                }
-                print(f"处理失败: {str(e)}")
-                import traceback
-                traceback.print_exc()
+        return results_dir
+
+    def _scrape_cache_key(self, url):
+        """抓取结果的缓存键：规范化URL + schema和提示词的哈希"""
+        schema_hash = text_hash(json.dumps(config.CONTENT_SCHEMA, ensure_ascii=False, sort_keys=True))
+        return make_cache_key('scrape', canonicalize_url(url), schema_hash, text_hash(EXTRACTION_PROMPT))
+
+    @staticmethod
+    def scrape_params():
+        """一次请求同时获取markdown和结构化数据的抓取参数"""
+        return {
+            'formats': ['markdown', 'json'],
+            'jsonOptions': {
+                'schema': config.CONTENT_SCHEMA,
+                'prompt': EXTRACTION_PROMPT
+            }
+        }
+
+    def _cached_scrape(self, url):
+        """查询抓取缓存，命中时返回 (markdown, metadata, json数据)，否则返回None"""
+        if not self.scrape_cache:
+            return None
+        cached = self.scrape_cache.get(self._scrape_cache_key(url))
+        if not cached:
+            return None
+        return cached['markdown'], cached['metadata'], cached['json']
+
+    def _remember_scrape(self, url, markdown_content, metadata, json_data):
+        """把完整的抓取结果写入缓存"""
+        if self.scrape_cache:
+            self.scrape_cache.set(self._scrape_cache_key(url), {
+                'markdown': markdown_content,
+                'metadata': metadata,
+                'json': json_data
+            })
+
+    def _local_scrape(self, url):
+        """按网站路由尝试本地提取，成功时写入抓取缓存并返回 (markdown, metadata, json数据)，否则返回None"""
+        if self.local_extraction is None:
+            return None
+        result = self.local_extraction.try_extract(url)
+        if result is not None:
+            self._remember_scrape(url, *result)
+        return result
+
+    def scrape(self, url):
+        """一次请求同时获取markdown和结构化数据，返回 (markdown, metadata, json数据)
+
+        先查抓取缓存，再尝试本地提取，都没有结果时才请求Firecrawl；完整结果写入抓取缓存，
+        同一页面再次提取时不再请求。Firecrawl超时时退回只获取markdown，这种不完整的结果不写入缓存。
+        """
+        cached = self._cached_scrape(url)
+        if cached:
+            print(f"命中抓取缓存!")
+            return cached
+
+        local_result = self._local_scrape(url)
+        if local_result is not None:
+            return local_result
+
+        try:
+            print(f"获取markdown和结构化数据...")
+            scrape_result = self.rate_limiter.call(
+                self.app.scrape_url,
+                url, 
+                params=self.scrape_params()
+            )
+        except Exception as scrape_error:
+            print(f"scrape_url出错: {str(scrape_error)}")
+            # 如果超时，等待一段时间后重试
+            if "timeout" not in str(scrape_error).lower():
+                raise scrape_error
+            print(f"请求超时，等待{config.RETRY_WAIT_TIME}秒后重试...")
+            traced_sleep(config.RETRY_WAIT_TIME, 'timeout_retry')
             
-            print("-" * 50)
+            # 重试，只获取markdown
+            print(f"重试获取markdown...")
+            scrape_result = self.rate_limiter.call(
+                self.app.scrape_url,
+                url, 
+                params={'formats': ['markdown']}
+            )
+            # 空数据，因为提取失败
+            return scrape_result.get("markdown", ""), scrape_result.get("metadata", {}), {}
+
+        print(f"成功获取markdown和结构化数据!")
+        EXTRACTIONS.inc(engine='firecrawl', outcome='success')
+        markdown_content = scrape_result.get("markdown", "")
+        metadata = scrape_result.get("metadata", {})
+        json_data = scrape_result.get("json", {})
+        self._remember_scrape(url, markdown_content, metadata, json_data)
+        return markdown_content, metadata, json_data
+
+    @staticmethod
+    def build_result(link_data, markdown_content, metadata, json_data):
+        """组装单个链接的提取结果"""
+        return {
+            "extract": {
+                "data": json_data
+            },
+            "markdown": markdown_content,
+            "metadata": metadata,
+            "source": link_data['source'],
+            "note": link_data['note'],
+            "validation_score": link_data['score'],
+            "validation_reason": link_data['reason']
+        }
+
+    @traced('ContentExtractor.extract_single')
+    def extract_single(self, link_data):
+        """提取单个链接的内容，返回结果字典（失败时包含error字段）"""
+        url = link_data['url']
+        try:
+            result = self.build_result(link_data, *self.scrape(url))
+            record_funnel('extracted', 1, link_data.get('homepage', ''))
             
-            # 每处理一个URL就保存一次结果
-            self.save_interim_results(results, results_dir, i+1, len(valid_links))
+            print(f"成功处理URL!")
+            return result
             
-            # 每处理N个URL后暂停一下，避免API限制
-            if (i + 1) % config.BATCH_SIZE == 0 and i + 1 < len(valid_links):
-                print(f"已处理 {i+1} 个URL，暂停 {config.BATCH_PAUSE_TIME} 秒...")
-                time.sleep(config.BATCH_PAUSE_TIME)
+        except Exception as e:
+            result = {
+                "error": str(e),
+                "source": link_data['source'],
+                "note": link_data['note'],
+                "validation_score": link_data['score'],
+                "validation_reason": link_data['reason']
+            }
+            print(f"处理失败: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            record_funnel('extract_failed', 1, link_data.get('homepage', ''))
+            return result
+
+    @traced('ContentExtractor.batch_jobs')
+    def _extract_with_batch_jobs(self, pending_links, journal):
+        """以Firecrawl批量抓取任务提取内容，返回任务中没有成功返回、需要逐个抓取的链接
         
-        # 保存最终结果
-        self.save_final_results(results, results_dir)
+        命中抓取缓存或本地提取成功的链接直接记录；其余链接按BATCH_SCRAPE_CHUNK_SIZE分块，全部提交后
+        逐个等待任务完成，每个页面一完成就写入检查点日志。
+        """
+        uncached = []
+        for link_data in pending_links:
+            cached = self._cached_scrape(link_data['url'])
+            if cached:
+                print(f"命中抓取缓存: {link_data['url']}")
+                journal.record(link_data['url'], self.build_result(link_data, *cached))
+                record_funnel('extracted', 1, link_data.get('homepage', ''))
+            else:
+                uncached.append(link_data)
+
+        # 按规范化URL分组：批量任务按规范化URL返回页面，规范化后相同的链接只提交一次，结果分别记录
+        remaining = {}
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as executor:
+            local_results = executor.map(lambda link_data: self._local_scrape(link_data['url']), uncached)
+            for link_data, local_result in zip(uncached, local_results):
+                if local_result is not None:
+                    journal.record(link_data['url'], self.build_result(link_data, *local_result))
+                    record_funnel('extracted', 1, link_data.get('homepage', ''))
+                else:
+                    remaining.setdefault(canonicalize_url(link_data['url']), []).append(link_data)
+        if not remaining:
+            return []
+        duplicates = sum(len(group) - 1 for group in remaining.values())
+        if duplicates:
+            print(f"有 {duplicates} 个链接与其他链接规范化后相同，批量任务中只抓取一次")
         
-        return results, results_dir
-    
-    def save_interim_results(self, results, results_dir, current_count, total_count):
-        """每处理一个URL后保存中间结果"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        client = BatchScrapeClient()
+        urls = [group[0]['url'] for group in remaining.values()]
+        job_ids = []
+        for i in range(0, len(urls), self.batch_chunk_size):
+            chunk = urls[i:i + self.batch_chunk_size]
+            try:
+                job_id = client.start(chunk, self.scrape_params())
+                print(f"已提交批量抓取任务 {job_id}，包含 {len(chunk)} 个链接")
+                job_ids.append(job_id)
+            except Exception as e:
+                print(f"提交批量抓取任务出错: {str(e)}")
         
-        # 保存到Excel文件
-        excel_filename = os.path.join(results_dir, f"content_interim_results_{current_count}_of_{total_count}.xlsx")
+        for job_id in job_ids:
+            try:
+                for url, document in client.iter_documents(job_id):
+                    metadata = document.get("metadata") or {}
+                    if url not in remaining or metadata.get("error"):
+                        continue
+                    markdown_content = document.get("markdown", "")
+                    json_data = document.get("json") or {}
+                    for link_data in remaining.pop(url):
+                        self._remember_scrape(link_data['url'], markdown_content, metadata, json_data)
+                        journal.record(link_data['url'], self.build_result(link_data, markdown_content, metadata, json_data))
+                        record_funnel('extracted', 1, link_data.get('homepage', ''))
+                        EXTRACTIONS.inc(engine='firecrawl_batch', outcome='success')
+                        print(f"批量抓取完成: {link_data['url']}")
+            except Exception as e:
+                print(f"等待批量抓取任务 {job_id} 时出错: {str(e)}")
         
-        # 准备Excel数据
-        excel_data = []
-        for url, data in results.items():
-            row = {
-                "URL": url,
-                "来源": data.get("source", ""),
-                "备注": data.get("note", ""),
-                "验证分数": data.get("validation_score", 0),
-                "处理状态": "成功" if "error" not in data else "失败"
-            }
-            
-            # 添加提取的结构化数据
-            if "extract" in data and "error" not in data:
-                extract_data = data["extract"]
-                if "data" in extract_data:
-                    for key, value in extract_data["data"].items():
-                        row[key] = value
-            
-            # 添加错误信息(如果有)
-            if "error" in data:
-                row["错误信息"] = data["error"]
-            
-            # 添加元数据
-            if "metadata" in data:
-                for key, value in data["metadata"].items():
-                    row[f"元数据_{key}"] = value
-            
-            # 添加原始markdown的前500个字符作为预览
-            if "markdown" in data:
-                row["Markdown预览"] = data["markdown"][:500] + "..." if len(data["markdown"]) > 500 else data["markdown"]
+        unfinished = [link_data for group in remaining.values() for link_data in group]
+        if unfinished:
+            print(f"批量抓取任务中有 {len(unfinished)} 个链接未成功返回，改为逐个抓取")
+        return unfinished
+
+    def _extract_and_record(self, link_data, position, total, journal):
+        """提取一个链接的内容并追加到检查点日志（可在工作线程中调用）"""
+        url = link_data['url']
+        print(f"\n[{position}/{total}] 正在处理: {url}")
+        print(f"来源: {link_data['source']}, 备注: {link_data['note']}")
+        print(f"验证分数: {link_data['score']}")
+        
+        journal.record(url, self.extract_single(link_data))
+        
+        print("-" * 50)
+
+    def find_resumable_run(self, batch_id=None, timestamp=None):
+        """查找可以恢复的步骤3运行
+        
+        参数:
+            batch_id: 批次ID，如果指定则只查找处理该批次的运行
+            timestamp: 验证结果的时间戳，如果指定则只查找处理该时间戳的运行
+        
+        返回:
+            (结果目录, 运行信息)，找不到时返回 (None, None)
+        """
+        # 结果目录名带有时间戳，按名称倒序即从新到旧
+        for results_dir in sorted(glob.glob("extracted_content_*"), reverse=True):
+            path = journal_path(results_dir)
+            if not os.path.isdir(results_dir) or not os.path.exists(path):
+                continue
+            header = read_journal_header(path)
+            if batch_id is not None and header.get('batch_id') != batch_id:
+                continue
+            if timestamp is not None and header.get('timestamp') != timestamp:
+                continue
+            return results_dir, header
+        return None, None
+
+    @traced('ContentExtractor.extract_content_from_urls')
+    def extract_content_from_urls(self, valid_links, batch_id=None, timestamp=None, results_dir=None):
+        """从有效链接中提取内容
+        
+        参数:
+            valid_links: 有效链接列表
+            batch_id: 批次ID，记录在检查点日志中，恢复运行时据此重新加载有效链接
+            timestamp: 验证结果的时间戳，作用同batch_id
+            results_dir: 要恢复的运行的结果目录；指定时跳过已成功提取的链接，
+                只处理失败或尚未处理的链接，并与已有结果合并
+        """
+        if not valid_links:
+            print("没有有效链接可处理")
+            return {}
             
-            excel_data.append(row)
+        pending_links = valid_links
+        if results_dir:
+            # 恢复运行：跳过检查点日志中已成功提取的链接
+            header, done_results = read_journal(journal_path(results_dir))
+            done_urls = {url for url, data in done_results.items() if "error" not in data}
+            pending_links = [link_data for link_data in valid_links if link_data['url'] not in done_urls]
+            print(f"恢复运行 {results_dir}: 已成功提取 {len(valid_links) - len(pending_links)} 个链接，"
+                  f"剩余 {len(pending_links)} 个链接待处理")
+        else:
+            # 创建结果目录
+            results_dir = self.new_results_dir()
         
-        # 创建DataFrame并保存到Excel
-        df = pd.DataFrame(excel_data)
-        df.to_excel(excel_filename, index=False, engine='openpyxl')
+        # 每处理一个URL就向检查点日志追加一行，最终结果由日志一次性生成
+        journal = RunJournal(journal_path(results_dir), header={
+            'batch_id': batch_id,
+            'timestamp': timestamp,
+            'total': len(valid_links)
+        })
         
-        print(f"已处理 {current_count}/{total_count} 个URL，中间结果已保存到: {excel_filename}")
+        if self.mode == 'batch' and pending_links:
+            pending_links = self._extract_with_batch_jobs(pending_links, journal)
+        
+        # 请求速率和并发由共享限流器控制，不再每处理N个URL固定暂停
+        if self.workers <= 1 or len(pending_links) <= 1:
+            for i, link_data in enumerate(pending_links):
+                self._extract_and_record(link_data, i + 1, len(pending_links), journal)
+                print(f"已处理 {i+1}/{len(pending_links)} 个URL，进度已记录到: {journal.path}")
+        else:
+            print(f"使用 {min(self.workers, len(pending_links))} 个工作线程并发提取 {len(pending_links)} 个链接")
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = [
+                    executor.submit(self._extract_and_record, link_data, i + 1, len(pending_links), journal)
+                    for i, link_data in enumerate(pending_links)
+                ]
+                for completed, future in enumerate(as_completed(futures), 1):
+                    future.result()
+                    print(f"已处理 {completed}/{len(pending_links)} 个URL，进度已记录到: {journal.path}")
         
+        journal.close()
+        
+        if self.scrape_cache:
+            print(f"抓取缓存命中 {self.scrape_cache.hits} 个页面，命中率: {self.scrape_cache.hit_rate:.1%}")
+        
+        # 由检查点日志生成最终结果，按有效链接的顺序排列
+        header, journal_results = read_journal(journal.path)
+        results = {
+            link_data['url']: journal_results[link_data['url']]
+            for link_data in valid_links if link_data['url'] in journal_results
+        }
+        self.save_final_results(results, results_dir)
+        
+        return results, results_dir
+    
+    @traced('ContentExtractor.save_final_results', 'io')
     def save_final_results(self, results, results_dir):
         """保存最终结果到文件(JSON和Excel)"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -318,6 +480,11 @@ class ContentExtractor:
         df = pd.DataFrame(excel_data)
         df.to_excel(excel_filename, index=False, engine='openpyxl')
         
+        BYTES_WRITTEN.inc(
+            sum(os.path.getsize(path) for path in (full_filename, content_filename, excel_filename)),
+            target='results'
+        )
+        
         print(f"完整结果已保存到: {full_filename}")
         print(f"提取的内容已保存到: {content_filename}")
         print(f"最终Excel结果已保存到: {excel_filename}")
@@ -348,7 +515,7 @@ def main():
     print(f"准备处理 {len(valid_links)} 个有效链接")
     
     # 提取内容
-    results, results_dir = extractor.extract_content_from_urls(valid_links)
+    results, results_dir = extractor.extract_content_from_urls(valid_links, batch_id, timestamp)
     
     print(f"处理完成! 所有结果已保存到 {results_dir} 目录")
 
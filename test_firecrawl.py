@@ -6,6 +6,7 @@ from datetime import datetime
 import time
 import os
 from read_excel import read_urls_from_excel
+from run_journal import RunJournal, journal_path, read_journal
 
 app = FirecrawlApp(api_key=API_KEY)
 
@@ -21,6 +22,9 @@ def extract_content_from_urls(urls, tags=None):
     results_dir = f"results_{timestamp}"
     os.makedirs(results_dir, exist_ok=True)
     
+    # 每处理一个URL就向检查点日志追加一行，最终结果由日志一次性生成
+    journal = RunJournal(journal_path(results_dir), header={'total': len(urls)})
+    
     for i, url in enumerate(urls):
         print(f"\n[{i+1}/{len(urls)}] 正在处理: {url}")
         if url in tags:
@@ -127,8 +131,9 @@ def extract_content_from_urls(urls, tags=None):
         
         print("-" * 50)
         
-        # 每处理一个URL就保存一次结果
-        save_interim_results(results, results_dir, i+1, len(urls))
+        # 每处理一个URL就记录一次结果
+        journal.record(url, results[url])
+        print(f"已处理 {i+1}/{len(urls)} 个URL，进度已记录到: {journal.path}")
         
         # 每处理5个URL后暂停一下，避免API限制
         if (i + 1) % 5 == 0 and i + 1 < len(urls):
@@ -136,55 +141,14 @@ def extract_content_from_urls(urls, tags=None):
             print(f"已处理 {i+1} 个URL，暂停 {wait_time} 秒...")
             time.sleep(wait_time)
     
-    # 保存最终结果
+    journal.close()
+    
+    # 由检查点日志生成最终结果
+    header, results = read_journal(journal.path)
     save_final_results(results, results_dir)
     
     return results, results_dir
 
-def save_interim_results(results, results_dir, current_count, total_count):
-    """每处理一个URL后保存中间结果"""
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    
-    # 保存到Excel文件
-    excel_filename = os.path.join(results_dir, f"firecrawl_interim_results_{current_count}_of_{total_count}.xlsx")
-    
-    # 准备Excel数据
-    excel_data = []
-    for url, data in results.items():
-        row = {
-            "URL": url,
-            "标签": data.get("tag", ""),
-            "处理状态": "成功" if "error" not in data else "失败"
-        }
-        
-        # 添加提取的结构化数据
-        if "extract" in data and "error" not in data:
-            extract_data = data["extract"]
-            if "data" in extract_data:
-                for key, value in extract_data["data"].items():
-                    row[key] = value
-        
-        # 添加错误信息(如果有)
-        if "error" in data:
-            row["错误信息"] = data["error"]
-        
-        # 添加元数据
-        if "metadata" in data:
-            for key, value in data["metadata"].items():
-                row[f"元数据_{key}"] = value
-        
-        # 添加原始markdown的前500个字符作为预览
-        if "markdown" in data:
-            row["Markdown预览"] = data["markdown"][:500] + "..." if len(data["markdown"]) > 500 else data["markdown"]
-        
-        excel_data.append(row)
-    
-    # 创建DataFrame并保存到Excel
-    df = pd.DataFrame(excel_data)
-    df.to_excel(excel_filename, index=False, engine='openpyxl')
-    
-    print(f"已处理 {current_count}/{total_count} 个URL，中间结果已保存到: {excel_filename}")
-
 def save_final_results(results, results_dir):
     """保存最终结果到文件(JSON和Excel)"""
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -0,0 +1,36 @@
+import os
+import sys
+import threading
+import types
+from http.server import ThreadingHTTPServer
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import config  # noqa: F401
+except ImportError:
+    # config.py保存API密钥，不在仓库中；测试只需要以下几个直接读取的设置，其余使用各模块的默认值
+    config = types.ModuleType('config')
+    config.API_KEY = 'test-key'
+    config.DASHSCOPE_API_KEY = 'test-key'
+    config.REQUEST_TIMEOUT = 5
+    config.MAX_RETRIES = 3
+    config.BATCH_PAUSE_TIME = 0
+    sys.modules['config'] = config
+
+@pytest.fixture
+def serve():
+    """在本地随机端口启动http.server，serve(handler_class)返回服务地址，测试结束时关闭"""
+    servers = []
+
+    def start(handler_class):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), handler_class)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,36 @@
+import json
+import os
+from batch_log import BatchLog
+
+def _segment_path(log_dir):
+    return os.path.join(log_dir, 'segment_000001.jsonl')
+
+def test_line_written_without_catalog_entry_is_recovered(tmp_path):
+    log_dir = str(tmp_path / 'new_links_log')
+    writer = BatchLog(log_dir)
+    other_writer = BatchLog(log_dir)
+    writer.append({'batch_id': 'batch_1', 'timestamp': '2025-04-03 10:00:00'})
+    # 另一个进程追加了一行，但在登记到目录之前退出
+    with open(_segment_path(log_dir), 'ab') as f:
+        f.write((json.dumps({'batch_id': 'batch_2', 'timestamp': '2025-04-03 11:00:00'}) + '\n').encode('utf-8'))
+    # 已经打开日志的写入者在其后追加并登记
+    other_writer.append({'batch_id': 'batch_3', 'timestamp': '2025-04-03 12:00:00'})
+
+    for log in (writer, BatchLog(log_dir)):
+        assert log.find(batch_id='batch_2')['timestamp'] == '2025-04-03 11:00:00'
+        assert log.find(timestamp='2025-04-03 12:00:00')['batch_id'] == 'batch_3'
+
+def test_torn_line_is_skipped_and_next_append_starts_on_new_line(tmp_path):
+    log_dir = str(tmp_path / 'new_links_log')
+    log = BatchLog(log_dir)
+    log.append({'batch_id': 'batch_1', 'timestamp': 't'})
+    with open(_segment_path(log_dir), 'ab') as f:
+        f.write(b'{"batch_id": "batch_2", "tim')
+    log.append({'batch_id': 'batch_3', 'timestamp': 't'})
+
+    assert [entry['batch_id'] for entry in log.entries()] == ['batch_1', 'batch_3']
+    assert log.find(timestamp='t')['batch_id'] == 'batch_3'
+
+    # 目录丢失后重建
+    os.remove(os.path.join(log_dir, 'catalog.db'))
+    assert BatchLog(log_dir).find(batch_id='batch_1')['timestamp'] == 't'
@@ -0,0 +1,99 @@
+import json
+from http.server import BaseHTTPRequestHandler
+import pytest
+import requests
+from batch_scrape import BatchScrapeClient, BatchScrapeError
+from rate_limiter import AdaptiveRateLimiter
+
+def _document(url):
+    return {'markdown': f'# {url}', 'metadata': {'sourceURL': url}}
+
+class FakeFirecrawl(BaseHTTPRequestHandler):
+    """模拟Firecrawl批量抓取API：第一次查询返回分两页的部分结果，第二次查询返回全部结果"""
+    urls = []
+    polls = 0
+    final_status = 'completed'
+    submitted = None
+    auth_headers = []
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        type(self).auth_headers.append(self.headers.get('Authorization'))
+        length = int(self.headers['Content-Length'])
+        type(self).submitted = json.loads(self.rfile.read(length))
+        self._reply(200, {'success': True, 'id': 'job-1'})
+
+    def do_GET(self):
+        cls = type(self)
+        cls.auth_headers.append(self.headers.get('Authorization'))
+        base = f"http://{self.headers['Host']}/v1/batch/scrape/job-1"
+        if self.path == '/v1/batch/scrape/job-1':
+            cls.polls += 1
+            if cls.polls == 1:
+                self._reply(200, {'status': 'scraping', 'total': 3, 'completed': 2,
+                                  'data': [_document(cls.urls[0])], 'next': f"{base}?skip=1"})
+            else:
+                self._reply(200, {'status': cls.final_status, 'total': 3, 'completed': 3,
+                                  'data': [_document(url) for url in cls.urls], 'error': 'boom'})
+        elif self.path == '/v1/batch/scrape/job-1?skip=1':
+            self._reply(200, {'data': [_document(cls.urls[1])], 'next': None})
+        else:
+            self._reply(404, {'error': 'not found'})
+
+@pytest.fixture
+def firecrawl(serve):
+    handler = type('Handler', (FakeFirecrawl,), {
+        'urls': ['https://a.example/1', 'https://a.example/2', 'https://b.example/3'],
+        'polls': 0,
+        'auth_headers': [],
+    })
+    return handler, serve(handler)
+
+def _client(api_url, session=None):
+    client = BatchScrapeClient(api_key='test-key', api_url=api_url, poll_interval=0.01, timeout=10, session=session)
+    client.rate_limiter = AdaptiveRateLimiter('test', None, 4)
+    return client
+
+def test_submit_paginate_and_poll(firecrawl):
+    handler, api_url = firecrawl
+    session = requests.Session()
+    client = _client(api_url, session)
+
+    job_id = client.start(handler.urls, {'formats': ['markdown']})
+    documents = list(client.iter_documents(job_id))
+
+    assert job_id == 'job-1'
+    assert handler.submitted == {'formats': ['markdown'], 'urls': handler.urls}
+    # 第一次查询跟随next得到两个页面，第二次查询只返回新完成的第三个页面
+    assert [url for url, _ in documents] == handler.urls
+    assert handler.polls == 2
+    assert set(handler.auth_headers) == {'Bearer test-key'}
+    # 不修改调用方传入的session
+    assert 'Authorization' not in session.headers
+
+def test_failed_job_raises_after_returning_finished_pages(firecrawl):
+    handler, api_url = firecrawl
+    handler.final_status = 'failed'
+    client = _client(api_url)
+
+    documents = []
+    with pytest.raises(BatchScrapeError):
+        for url, _ in client.iter_documents(client.start(handler.urls)):
+            documents.append(url)
+    assert documents == handler.urls
+
+def test_http_error_is_raised(firecrawl):
+    _, api_url = firecrawl
+    client = _client(api_url)
+    with pytest.raises(Exception, match='status code 404'):
+        client.status('missing')
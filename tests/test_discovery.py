@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler
+from discovery import FeedDiscovery
+
+NOW = datetime.now(timezone.utc)
+# 最近10小时内每小时发布一篇文章
+ARTICLES = [(f"/noticia/{i}", NOW - timedelta(hours=10 - i)) for i in range(10)]
+
+class FakeSite(BaseHTTPRequestHandler):
+    """提供带lastmod的/sitemap.xml，其余路径返回404"""
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path != '/sitemap.xml':
+            self.send_response(404)
+            self.end_headers()
+            return
+        base = f"http://{self.headers['Host']}"
+        urls = ''.join(f"<url><loc>{base}{path}</loc><lastmod>{date.isoformat()}</lastmod></url>"
+                       for path, date in ARTICLES)
+        data = (f'<?xml version="1.0" encoding="UTF-8"?>'
+                f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>').encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/xml')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+def test_entries_over_limit_are_carried_to_next_poll(serve, tmp_path):
+    homepage = serve(FakeSite) + '/'
+    discovery = FeedDiscovery(db_file=str(tmp_path / 'state.db'))
+    discovery.max_entries = 4
+    try:
+        found = []
+        for _ in range(3):
+            entries, latest = discovery.discover(homepage)
+            # 条目按发布时间从新到旧排列
+            assert [entry['date'] for entry in entries] == sorted((entry['date'] for entry in entries), reverse=True)
+            found.extend(entry['url'] for entry in entries)
+            discovery.commit(homepage, latest)
+
+        paths = {url[len(homepage) - 1:] for url in found}
+        assert paths == {path for path, _ in ARTICLES}
+        assert latest == ARTICLES[-1][1]
+    finally:
+        discovery.close()
@@ -0,0 +1,82 @@
+from http.server import BaseHTTPRequestHandler
+import pytest
+import requests
+from html_links import HtmlLinkDiscovery, extract_anchors
+from http_client import decode_html
+
+ARTICLES = ''.join(
+    f'<li><a href="/noticias/{i}-precio-de-la-soja">Precio de la soja {i}</a></li>' for i in range(12)
+)
+
+class FakeSite(BaseHTTPRequestHandler):
+    """模拟新闻网站：服务端渲染的主页、需要JavaScript渲染的主页、非HTML响应和没有声明charset的GBK页面"""
+    pages = {
+        '/': ('text/html; charset=utf-8', f'''<html><body><ul>{ARTICLES}</ul>
+            <a href="https://otro-sitio.example/nota">站外链接</a>
+            <a href="javascript:void(0)">菜单</a></body></html>'''.encode('utf-8')),
+        '/spa': ('text/html', b'<html><body><div id="app"></div><a href="/login">Login</a></body></html>'),
+        '/feed.json': ('application/json', b'{"items": []}'),
+        '/gbk': ('text/html', '<html><head><meta charset="gbk"></head><body>农业新闻</body></html>'.encode('gbk')),
+    }
+    requests_seen = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        type(self).requests_seen.append(self.path)
+        if self.path not in self.pages:
+            self.send_response(404)
+            self.end_headers()
+            return
+        content_type, body = self.pages[self.path]
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+@pytest.fixture
+def site(serve):
+    handler = type('Handler', (FakeSite,), {'requests_seen': []})
+    return handler, serve(handler)
+
+@pytest.fixture
+def discovery(tmp_path):
+    engine = HtmlLinkDiscovery(db_file=str(tmp_path / 'homepage_state.db'), session=requests.Session())
+    yield engine
+    engine.close()
+
+def test_extract_anchors_resolves_relative_urls_and_keeps_longest_text():
+    html = '''<html><head><base href="https://site.example/agro/"></head><body>
+        <a href="nota-1?utm_source=x#top">Leer más</a>
+        <a href="nota-1"><span>Exportaciones de carne</span> récord</a>
+        <a href="../foto"><img alt="Cosecha de trigo"></a>
+        <a href="mailto:info@site.example">Contacto</a>
+    </body></html>'''
+    anchors = extract_anchors(html, 'https://site.example/')
+    assert anchors == {
+        'https://site.example/agro/nota-1': 'Exportaciones de carne récord',
+        'https://site.example/foto': 'Cosecha de trigo',
+    }
+
+def test_decode_html_uses_meta_charset_when_header_has_none(site):
+    _, base = site
+    response = requests.get(f'{base}/gbk')
+    assert '农业新闻' in decode_html(response)
+
+def test_fast_path_returns_same_site_links_with_texts(site, discovery):
+    _, base = site
+    anchors = discovery.discover(f'{base}/')
+    assert len(anchors) == 12
+    assert anchors[f'{base}/noticias/3-precio-de-la-soja'] == 'Precio de la soja 3'
+    assert not any('otro-sitio' in url for url in anchors)
+
+@pytest.mark.parametrize('path', ['/spa', '/feed.json', '/missing'])
+def test_fast_path_failure_is_remembered(site, discovery, path):
+    handler, base = site
+    assert discovery.discover(f'{base}{path}') is None
+    assert discovery._recently_failed(f'{base}{path}')
+    # 失败记录有效期内直接改用map_url，不再请求主页
+    assert discovery.discover(f'{base}{path}') is None
+    assert handler.requests_seen == [path]
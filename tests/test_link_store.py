@@ -0,0 +1,36 @@
+import json
+import pytest
+from link_store import JsonLinkHistoryStore, SqliteLinkHistoryStore
+from url_filter import canonicalize_url
+
+HOMEPAGE = 'https://site.example/'
+LEGACY_LINKS = [
+    'https://site.example/noticia-1#comments',
+    'https://Site.Example/noticia-2?b=2&a=1',
+    'https://site.example/noticia-3?utm_source=newsletter&id=7',
+]
+
+@pytest.fixture
+def legacy_file(tmp_path):
+    path = tmp_path / 'link_cache.json'
+    path.write_text(json.dumps({HOMEPAGE: LEGACY_LINKS}), encoding='utf-8')
+    return str(path)
+
+@pytest.fixture(params=['sqlite', 'json'])
+def store(request, tmp_path, legacy_file):
+    if request.param == 'sqlite':
+        store = SqliteLinkHistoryStore(str(tmp_path / 'link_cache.db'), legacy_cache_file=legacy_file)
+    else:
+        store = JsonLinkHistoryStore(legacy_file)
+    yield store
+    store.close()
+
+def test_legacy_links_match_their_canonical_form(store):
+    current = [canonicalize_url(url) for url in (
+        'https://site.example/noticia-1',
+        'https://site.example/noticia-2?a=1&b=2',
+        'https://site.example/noticia-3?id=7',
+        'https://site.example/noticia-4',
+    )]
+    assert store.count(HOMEPAGE) == 3
+    assert store.diff(HOMEPAGE, current) == ['https://site.example/noticia-4']
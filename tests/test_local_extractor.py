@@ -0,0 +1,124 @@
+from http.server import BaseHTTPRequestHandler
+import pytest
+import requests
+import config
+from local_extractor import (ExtractionRouter, LocalArticleExtractor, LocalExtractionEngine,
+                             LocalExtractionFailed)
+
+PARAGRAPHS = [
+    'La cosecha de soja en la provincia de Buenos Aires avanza a buen ritmo, con rindes superiores a los '
+    'esperados por los productores de la región pampeana, según el último informe semanal de la bolsa.',
+    'Los precios internacionales, sin embargo, se mantienen bajo presión por la fuerte oferta de Brasil y '
+    'por la menor demanda de China, lo que reduce los márgenes de los productores locales este año.',
+    'Los analistas esperan que las exportaciones alcancen un récord en el segundo trimestre si el clima '
+    'acompaña y la logística portuaria funciona con normalidad durante los próximos meses de campaña.',
+]
+
+NAVIGATION = ''.join(f'<li><a href="/seccion/{i}">Sección {i}</a></li>' for i in range(8))
+
+ARTICLE = f'''<html lang="es"><head>
+    <title>Soja: avanza la cosecha | Agro Diario</title>
+    <meta property="og:title" content="Soja: avanza la cosecha con buenos rindes">
+    <meta property="og:site_name" content="Agro Diario">
+    <meta name="description" content="Informe semanal de la cosecha de soja.">
+    <script type="application/ld+json">
+        {{"@type": "NewsArticle", "datePublished": "2025-04-02T10:00:00-03:00", "author": {{"name": "María Pérez"}}}}
+    </script>
+</head><body>
+    <header class="site-header"><ul class="menu">{NAVIGATION}</ul></header>
+    <article class="article-body">
+        <h1>Soja: avanza la cosecha</h1>
+        {''.join(f'<p>{text}</p>' for text in PARAGRAPHS)}
+        <div class="share-buttons"><a href="https://facebook.com/share">Compartir en Facebook</a></div>
+    </article>
+    <aside class="sidebar"><p>Lo más leído: {'noticia destacada del día, ' * 10}</p></aside>
+    <div class="comments"><p>{'Excelente nota, muchas gracias por la información. ' * 5}</p></div>
+    <footer>Copyright Agro Diario</footer>
+</body></html>'''
+
+LIST_PAGE = '''<html><head><title>Noticias | Agro Diario</title></head><body><div class="content"><ul>''' + ''.join(
+    f'<li><a href="/noticias/{i}">Precio de la soja y del maíz en el mercado de Rosario, jornada {i}</a>, '
+    f'hoy</li>' for i in range(30)
+) + '</ul></div></body></html>'
+
+class FakeSite(BaseHTTPRequestHandler):
+    """模拟新闻网站：服务端渲染的文章、文章列表页和需要JavaScript渲染的空页面"""
+    pages = {
+        '/nota': ARTICLE,
+        '/noticias': LIST_PAGE,
+        '/spa': '<html><head><title>App</title></head><body><div id="app"></div></body></html>',
+    }
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path not in self.pages:
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = self.pages[self.path].encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+@pytest.fixture
+def site(serve, monkeypatch):
+    monkeypatch.setattr(config, 'CONTENT_SCHEMA', {
+        'type': 'object',
+        'properties': {
+            'title': {'type': 'string'},
+            'content': {'type': 'string'},
+            'publish_date': {'type': 'string'},
+            'author': {'type': 'string'},
+            'source': {'type': 'string'},
+        },
+        'required': ['title', 'content'],
+    }, raising=False)
+    return serve(FakeSite)
+
+@pytest.fixture
+def extractor(monkeypatch):
+    monkeypatch.setattr(config, 'DOMAIN_MIN_INTERVAL', 0, raising=False)
+    return LocalArticleExtractor(session=requests.Session(), min_chars=300)
+
+def test_article_fields_and_paragraph_separated_content(site, extractor):
+    markdown, metadata, data = extractor.extract(f'{site}/nota')
+
+    assert data['title'] == 'Soja: avanza la cosecha con buenos rindes'
+    assert data['publish_date'] == '2025-04-02T10:00:00-03:00'
+    assert data['author'] == 'María Pérez'
+    assert data['source'] == 'Agro Diario'
+    # 正文按段落分隔，而不是连成一整段
+    assert data['content'].split('\n\n') == ['Soja: avanza la cosecha'] + PARAGRAPHS
+    assert markdown.split('\n\n') == ['# Soja: avanza la cosecha'] + PARAGRAPHS
+    assert metadata['language'] == 'es'
+    assert metadata['extractor'] == 'local'
+
+def test_boilerplate_is_left_out_of_content(site, extractor):
+    markdown, _, data = extractor.extract(f'{site}/nota')
+    for boilerplate in ('Sección', 'Compartir', 'Lo más leído', 'Excelente nota', 'Copyright'):
+        assert boilerplate not in data['content']
+        assert boilerplate not in markdown
+
+def test_list_page_fails_quality_check(site, extractor):
+    with pytest.raises(LocalExtractionFailed):
+        extractor.extract(f'{site}/noticias')
+
+def test_router_falls_back_to_firecrawl_for_failing_site(site, extractor, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'LOCAL_MIN_ATTEMPTS', 3, raising=False)
+    monkeypatch.setattr(config, 'LOCAL_PROBE_EVERY', 4, raising=False)
+    router = ExtractionRouter(db_file=str(tmp_path / 'routing.db'))
+    engine = LocalExtractionEngine(extractor, router)
+    try:
+        # 未通过检查的页面返回None，由调用方改用Firecrawl
+        assert [engine.try_extract(f'{site}/spa') for _ in range(3)] == [None] * 3
+        assert router.stats()['127.0.0.1'] == {'success_rate': 0.0, 'attempts': 3}
+        # 成功率过低后不再尝试本地提取，每LOCAL_PROBE_EVERY篇试一次
+        assert [router.use_local(f'{site}/spa') for _ in range(4)] == [False, False, False, True]
+        # 路由中跳过的文章不再请求页面
+        assert engine.try_extract(f'{site}/nota') is None
+    finally:
+        router.close()
@@ -0,0 +1,75 @@
+import threading
+from pipeline import StreamingPipeline
+
+HOMEPAGE = 'https://example.com/'
+LINKS = [f'https://example.com/noticia/{i}' for i in range(4)]
+
+class FakeMonitor:
+    def new_batch_id(self):
+        return 'batch_test'
+
+    def read_homepage_urls(self):
+        return {HOMEPAGE: {'source': 'example', 'note': ''}}
+
+    def check_for_new_links(self, max_workers=None, on_new_links=None, batch_id=None, urls_info=None):
+        on_new_links(HOMEPAGE, {'new_links': LINKS, 'source': 'example', 'note': '', 'timestamp': ''})
+        return batch_id
+
+class FakeValidator:
+    """第一个链接验证时抛出异常，第二个返回score为字符串的结果（is_extractable比较时出错）"""
+    def __init__(self):
+        self.saved = None
+
+    def resolve_link(self, link, homepage_url, link_text=""):
+        if link == LINKS[0]:
+            raise RuntimeError('验证失败')
+        if link == LINKS[1]:
+            return {'score': '85', 'is_valid': True, 'reason': ''}
+        return {'score': 90, 'is_valid': True, 'reason': ''}
+
+    def _save_valid_links(self, validation_results, batch_id=None):
+        self.saved = (validation_results, batch_id)
+
+class FakeExtractor:
+    """最后一个链接提取时抛出异常"""
+    workers = 2
+
+    def __init__(self, results_dir):
+        self.results_dir = results_dir
+        self.saved = None
+
+    @staticmethod
+    def is_extractable(validation):
+        return validation.get('is_valid', False) and validation.get('score', 0) >= 60
+
+    def extract_single(self, link_data):
+        if link_data['url'] == LINKS[3]:
+            raise RuntimeError('提取失败')
+        return {'extract': {'title': link_data['url']}, 'source': link_data['source']}
+
+    def new_results_dir(self):
+        return str(self.results_dir)
+
+    def save_final_results(self, results, results_dir):
+        self.saved = (results, results_dir)
+
+def test_worker_errors_do_not_stall_pipeline(tmp_path):
+    validator = FakeValidator()
+    extractor = FakeExtractor(tmp_path)
+    pipeline = StreamingPipeline(FakeMonitor(), validator, extractor,
+                                 queue_size=1, validation_workers=2, extraction_workers=2)
+    outcome = {}
+    runner = threading.Thread(target=lambda: outcome.update(result=pipeline.run()), daemon=True)
+    runner.start()
+    runner.join(timeout=10)
+    assert not runner.is_alive(), '工作线程出错后流水线没有结束'
+
+    assert outcome['result'] == ('batch_test', str(tmp_path))
+    results, results_dir = extractor.saved
+    assert list(results) == [LINKS[2], LINKS[3]]
+    assert 'error' not in results[LINKS[2]]
+    assert results[LINKS[3]]['error'] == '提取失败'
+    assert (tmp_path / 'journal.jsonl').exists()
+    validation_results, batch_id = validator.saved
+    assert batch_id == 'batch_test'
+    assert [link['url'] for link in validation_results[HOMEPAGE]['validated_links']] == LINKS[1:]
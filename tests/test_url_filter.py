@@ -0,0 +1,23 @@
+from url_filter import UrlFilter, canonicalize_url
+
+def test_canonicalize_drops_fragment_tracking_and_sorts_query():
+    assert canonicalize_url('https://Site.Example:443/nota?b=2&a=1&utm_source=x&fbclid=9#comments') == \
+        'https://site.example/nota?a=1&b=2'
+
+def test_canonicalize_keeps_original_query_encoding():
+    assert canonicalize_url('https://site.example/?q=soja+maiz&s=%C3%B1') == 'https://site.example/?q=soja+maiz&s=%C3%B1'
+    # 分享链接中HTML转义的分隔符保持不变
+    assert canonicalize_url('https://site.example/share?u=https%3A%2F%2Fa.example%2F1&amp;t=Hola%20mundo'
+                            '&amp;utm_medium=social') == \
+        'https://site.example/share?t=Hola%20mundo&amp;u=https%3A%2F%2Fa.example%2F1'
+
+def test_exclude_rules_are_case_sensitive():
+    url_filter = UrlFilter(exclude_patterns=[r'/Noticias/Archivo/'])
+    kept, stats = url_filter.apply([
+        'https://site.example/tag/soja',
+        'https://site.example/TAG/soja',
+        'https://site.example/Noticias/Archivo/1',
+        'https://site.example/noticias/archivo/2',
+    ])
+    assert kept == ['https://site.example/TAG/soja', 'https://site.example/noticias/archivo/2']
+    assert stats['excluded'] == 2
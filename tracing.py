@@ -0,0 +1,98 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# 未开启追踪时所有span共用的空上下文，几乎没有额外开销
+_NOOP = nullcontext()
+
+class Tracer:
+    def __init__(self):
+        """记录一次运行中的时间片段（span），导出为Chrome/Perfetto可打开的trace JSON
+
+        每个span是一个完整事件（ph为X），按线程分行显示；未开启时span()直接返回空上下文。
+        """
+        self.enabled = False
+        self._events = []
+        self._threads = {}
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._pid = os.getpid()
+
+    def enable(self):
+        self.enabled = True
+        self._origin = time.perf_counter()
+
+    def span(self, name, category='pipeline', **args):
+        """记录代码块的起止时间
+
+        参数:
+            name: 片段名称，例如 "Firecrawl.map_url"
+            category: 分类，例如 api、sleep、io、stage
+            args: 附加信息，例如url，显示在trace查看器的详情中
+        """
+        if not self.enabled:
+            return _NOOP
+        return self._record(name, category, args)
+
+    @contextmanager
+    def _record(self, name, category, args):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            finished = time.perf_counter()
+            thread = threading.current_thread()
+            event = {
+                'name': name,
+                'cat': category,
+                'ph': 'X',
+                'ts': round((started - self._origin) * 1e6, 1),
+                'dur': round((finished - started) * 1e6, 1),
+                'pid': self._pid,
+                'tid': thread.ident
+            }
+            if args:
+                event['args'] = {key: str(value) for key, value in args.items()}
+            with self._lock:
+                self._events.append(event)
+                self._threads.setdefault(thread.ident, thread.name)
+
+    def save(self, path):
+        """写入trace JSON（可在chrome://tracing或ui.perfetto.dev中打开）"""
+        with self._lock:
+            events = list(self._events)
+            threads = dict(self._threads)
+        metadata = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': self._pid, 'tid': tid, 'args': {'name': name}}
+            for tid, name in threads.items()
+        ]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': metadata + events, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+        print(f"追踪数据已保存到: {path}（共 {len(events)} 个片段）")
+        return path
+
+TRACER = Tracer()
+
+def span(name, category='pipeline', **args):
+    """全局追踪器的span"""
+    return TRACER.span(name, category, **args)
+
+def traced(name, category='stage'):
+    """装饰器：开启追踪时把整个函数调用记录为一个span"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not TRACER.enabled:
+                return func(*args, **kwargs)
+            with TRACER.span(name, category):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def traced_sleep(seconds, reason=''):
+    """time.sleep的替代，开启追踪时记录为sleep片段"""
+    with TRACER.span('sleep', 'sleep', reason=reason, seconds=seconds):
+        time.sleep(seconds)
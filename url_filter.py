@@ -0,0 +1,123 @@
+import re
+from functools import lru_cache
+from urllib.parse import urlsplit, urlunsplit, unquote_plus
+import config
+
+# 默认排除的路径片段（按子串匹配）
+DEFAULT_EXCLUDED_PATTERNS = [
+    '/tag/', '/category/', '/author/',
+    '/search/', '/page/', '/wp-content/',
+    '/wp-admin/', '/wp-includes/',
+    '/login', '/register', '/account',
+    '.jpg', '.jpeg', '.png', '.gif',
+    '.css', '.js', '.xml', '.pdf',
+    'javascript:'
+]
+
+# 规范化时去掉的跟踪参数
+TRACKING_PARAM_PREFIXES = ('utm_',)
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'dclid', 'yclid', 'msclkid', 'igshid',
+    'mc_cid', 'mc_eid', '_ga', '_gl', 'spm'
+}
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+def canonicalize_url(url):
+    """规范化URL
+
+    去掉片段(#...)和跟踪参数，协议和域名转为小写，去掉默认端口，其余查询参数按名称排序。
+    查询参数保持原有的编码和分隔符（包括HTML转义的&amp;），不重新编码，规范化后的链接仍指向同一资源。
+    非http(s)链接原样返回。
+    """
+    url = url.strip()
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS:
+        return url
+
+    netloc = (parts.hostname or '').lower()
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port and port != DEFAULT_PORTS[scheme]:
+        netloc = f"{netloc}:{port}"
+
+    separator = '&amp;' if '&amp;' in parts.query else '&'
+    query = []
+    for pair in parts.query.split(separator):
+        key = unquote_plus(pair.split('=', 1)[0]).lower()
+        if pair and key not in TRACKING_PARAMS and not key.startswith(TRACKING_PARAM_PREFIXES):
+            query.append(pair)
+    query.sort(key=lambda pair: pair.split('=', 1)[0])
+
+    return urlunsplit((scheme, netloc, parts.path or '/', separator.join(query), ''))
+
+def _strip_www(host):
+    return host[4:] if host.startswith('www.') else host
+
+class UrlFilter:
+    def __init__(self, exclude_patterns=(), include_patterns=()):
+        """初始化链接过滤器
+
+        默认排除规则按子串匹配，站点规则按正则匹配（都区分大小写）；所有排除规则编译为一个正则，
+        包含规则编译为另一个正则，每个链接只需各匹配一次。
+
+        参数:
+            exclude_patterns: 站点额外的排除规则（正则）
+            include_patterns: 站点的包含规则（正则），为空时不限制
+        """
+        excluded = [re.escape(pattern) for pattern in DEFAULT_EXCLUDED_PATTERNS] + list(exclude_patterns)
+        self.exclude_regex = re.compile('|'.join(f'(?:{pattern})' for pattern in excluded))
+        self.include_regex = None
+        if include_patterns:
+            self.include_regex = re.compile('|'.join(f'(?:{pattern})' for pattern in include_patterns))
+
+    def apply(self, links, homepage_url=None):
+        """规范化并过滤链接
+
+        返回:
+            (过滤后的链接列表, 统计信息)
+        """
+        homepage = canonicalize_url(homepage_url) if homepage_url else None
+        seen = set()
+        kept = []
+        stats = {'total': len(links), 'self': 0, 'duplicate': 0, 'excluded': 0, 'not_included': 0}
+
+        for link in links:
+            canonical = canonicalize_url(link)
+            if canonical == homepage:
+                stats['self'] += 1
+            elif canonical in seen:
+                stats['duplicate'] += 1
+            elif self.exclude_regex.search(canonical):
+                stats['excluded'] += 1
+            elif self.include_regex and not self.include_regex.search(canonical):
+                stats['not_included'] += 1
+            else:
+                kept.append(canonical)
+            seen.add(canonical)
+
+        stats['kept'] = len(kept)
+        return kept, stats
+
+def site_rules_for(homepage_url):
+    """查找主页对应的站点规则：先按完整主页URL匹配，再按域名匹配"""
+    rules = getattr(config, 'URL_FILTER_RULES', {})
+    if homepage_url in rules:
+        return rules[homepage_url]
+    host = _strip_www((urlsplit(homepage_url).hostname or '').lower())
+    for key, site_rules in rules.items():
+        if '://' not in key and _strip_www(key.lower()) == host:
+            return site_rules
+    return {}
+
+@lru_cache(maxsize=None)
+def filter_for_homepage(homepage_url):
+    """返回某个主页的链接过滤器（编译结果按主页缓存）"""
+    rules = site_rules_for(homepage_url)
+    return UrlFilter(
+        exclude_patterns=rules.get('exclude', ()),
+        include_patterns=rules.get('include', ())
+    )